@@ -1,10 +1,23 @@
-import torch
-import requests
 import io
+import logging
 import time
 from sqlalchemy.orm import Session
-from . import models
-from .routers.front_job import upload_bytes_to_supabase
+from . import metrics, models
+from .storage import read_url
+from .updates import is_update, apply_update
+from .routers.front_job import upload_bytes_to_storage
+
+# Workers zstd-compress model.pth before upload (RESULT_COMPRESSION in worker/main.py)
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+log = logging.getLogger(__name__)
+
+def decode_result(content: bytes) -> bytes:
+    """Returns the raw torch.save bytes of a result, decompressing zstd frames if needed."""
+    if not content.startswith(ZSTD_MAGIC):
+        return content # Uncompressed (older workers, RESULT_COMPRESSION=none)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(content)
 
 def aggregate_pytorch_weights(job_id: int, db: Session) -> str:
     """
@@ -17,7 +30,9 @@ def aggregate_pytorch_weights(job_id: int, db: Session) -> str:
     Returns:
         URL of the uploaded aggregated model
     """
-    print(f"🔄 Starting aggregation for Job {job_id}...")
+    import torch # Heavy: only the aggregation path pays for it (see app/main.py)
+
+    log.info("🔄 Starting aggregation", extra={"job_id": job_id})
     
     # 1. Get all completed subtasks for this job
     subtasks = db.query(models.Subtask).filter(
@@ -26,44 +41,48 @@ def aggregate_pytorch_weights(job_id: int, db: Session) -> str:
     ).all()
     
     if not subtasks:
-        print(f"❌ No completed subtasks found for aggregation.")
+        log.error("❌ No completed subtasks found for aggregation", extra={"job_id": job_id})
         raise Exception("No completed subtasks to aggregate")
     
     # 2. Download all model weights
+    # Workers may send deltas from the job's reference weights (see app/updates.py)
+    job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    reference = None
+    if job and job.reference_weights_url:
+        reference = torch.load(io.BytesIO(read_url(job.reference_weights_url, timeout=30)), map_location='cpu')
+
     model_weights = []
     
     for subtask in subtasks:
         if not subtask.result_file_url:
             continue
             
-        print(f"⬇️ Downloading result from {subtask.result_file_url}...")
-        
         # Validating download with retries
         success = False
         for attempt in range(3):
             try:
-                resp = requests.get(subtask.result_file_url, timeout=30)
-                if resp.status_code == 200:
-                    # Load the model weights
-                    weights = torch.load(io.BytesIO(resp.content), map_location='cpu')
-                    model_weights.append(weights)
-                    success = True
-                    break
-                else:
-                    print(f"⚠️  Status {resp.status_code}. Retrying...")
-                    time.sleep(1)
+                # Reads straight from storage when we own the URL, HTTP otherwise
+                content = read_url(subtask.result_file_url, timeout=30)
+                metrics.AGGREGATION_BYTES.inc(len(content), direction="read")
+                # Load the model weights
+                weights = torch.load(io.BytesIO(decode_result(content)), map_location='cpu')
+                if is_update(weights):
+                    weights = apply_update(weights, reference)
+                model_weights.append(weights)
+                success = True
+                break
             except Exception as e:
-                print(f"⚠️  Download error (Attempt {attempt+1}): {e}")
+                log.warning(f"⚠️ Download error (Attempt {attempt+1}): {e}", extra={"subtask_id": subtask.id})
                 time.sleep(1)
         
         if not success:
-            print(f"❌ Could not download weights for subtask {subtask.id}. Skipping.")
+            log.error("❌ Could not download weights, skipping subtask", extra={"subtask_id": subtask.id})
     
     if not model_weights:
         raise Exception("No model weights could be downloaded")
     
     # 3. Perform Federated Averaging
-    print(f"➗ Averaging weights from {len(model_weights)} models...")
+    log.info(f"➗ Averaging weights from {len(model_weights)} models", extra={"job_id": job_id})
     averaged_weights = {}
     
     # Get all keys from the first model
@@ -80,9 +99,9 @@ def aggregate_pytorch_weights(job_id: int, db: Session) -> str:
     torch.save(averaged_weights, final_bytes)
     final_bytes.seek(0)
     
-    # 5. Upload to Supabase
+    # 5. Upload to Storage
     file_path = f"jobs/{job_id}/final_model.pth"
-    final_url = upload_bytes_to_supabase(final_bytes.getvalue(), file_path, "application/octet-stream")
+    final_url = upload_bytes_to_storage(final_bytes.getvalue(), file_path, "application/octet-stream")
+    metrics.AGGREGATION_BYTES.inc(final_bytes.getbuffer().nbytes, direction="written")
     
-    print(f"✅ Aggregation complete! Final model uploaded to: {final_url}")
     return final_url
@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import re
+from datetime import datetime, timezone
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models
+from .storage import get_storage
+
+log = logging.getLogger(__name__)
+
+# ==========================================
+# CONTENT-ADDRESSED ARTIFACT STORE
+# ==========================================
+# Job files and chunks are stored under their SHA-256: cas/{sha256}.
+# Re-submitting the same train.py / requirements.txt / dataset reuses the
+# stored copy instead of uploading it again, and workers can recognise a file
+# they already hold from the hash in its URL.
+# The `artifacts` table keeps a refcount per hash so unreferenced files
+# can be garbage collected.
+#
+# put_artifact() skips the upload when the object exists, but the reference
+# is only counted later (register_artifact + commit), so GC can delete the
+# object in between. Two rules close that gap:
+#   - GC deletes the row (only if still unreferenced) and the object in one
+#     transaction, and register_artifact() increments with an UPDATE that
+#     waits for it. Once a reference is committed, the object is either
+#     safe from GC or already gone.
+#   - After committing, callers pass each artifact put_artifact() did not
+#     upload to restore_artifact(), which uploads it again if it is gone.
+
+CAS_PREFIX = "cas"
+HASH_BLOCK = 1024 * 1024
+SHA256_IN_URL = re.compile(rf"/{CAS_PREFIX}/([0-9a-f]{{64}})(?:$|\?)")
+
+
+def artifact_key(sha256: str) -> str:
+    return f"{CAS_PREFIX}/{sha256}"
+
+
+def sha256_from_url(url: str):
+    """Returns the content hash embedded in an artifact URL, or None."""
+    match = SHA256_IN_URL.search(url or "")
+    return match.group(1) if match else None
+
+
+def hash_file(file_obj) -> tuple:
+    """SHA-256 and size of a file object, read in blocks. Rewinds it afterwards."""
+    digest = hashlib.sha256()
+    size = 0
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(HASH_BLOCK), b""):
+        digest.update(block)
+        size += len(block)
+    file_obj.seek(0)
+    return digest.hexdigest(), size
+
+
+def put_artifact(data, content_type: str, upload=None) -> dict:
+    """
+    Stores bytes or a file object under its content hash, skipping the upload
+    if that hash is already in storage. Touches no DB, so it is safe to run
+    several of these concurrently in the threadpool.
+
+    `upload(data, key, content_type)` does the actual transfer (defaults to
+    storage.put); routers pass their retrying helper.
+    """
+    storage = get_storage()
+    if isinstance(data, (bytes, bytearray)):
+        sha256, size = hashlib.sha256(data).hexdigest(), len(data)
+    else:
+        sha256, size = hash_file(data)
+
+    key = artifact_key(sha256)
+    if storage.exists(key):
+        return {"sha256": sha256, "size": size, "url": storage.url_for(key), "uploaded": False}
+
+    if upload is None:
+        url = storage.put(key, data, content_type)
+    else:
+        url = upload(data, key, content_type)
+    return {"sha256": sha256, "size": size, "url": url, "uploaded": True}
+
+
+def _add_reference(db: Session, sha256: str) -> bool:
+    # One UPDATE (not read-then-write): blocks while GC is deleting the row, then finds it gone
+    result = db.execute(
+        update(models.Artifact)
+        .where(models.Artifact.sha256 == sha256)
+        .values(ref_count=models.Artifact.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def register_artifact(db: Session, sha256: str, size: int, content_type: str):
+    """Adds one reference to an artifact, creating its row on first use. Does not commit."""
+    if _add_reference(db, sha256):
+        return
+    try:
+        # Savepoint: a concurrent request may have inserted the same hash
+        with db.begin_nested():
+            db.add(models.Artifact(sha256=sha256, size=size, content_type=content_type, ref_count=1))
+    except IntegrityError:
+        _add_reference(db, sha256)
+
+
+def restore_artifact(artifact: dict, data, content_type: str, upload=None) -> bool:
+    """
+    Call after the reference to an artifact put_artifact() did not upload is
+    committed: uploads it again if GC deleted it in between. `data` is what
+    was passed to put_artifact() (a file object is rewound), or a callable
+    returning it. Returns True if it had to upload.
+    """
+    if artifact["uploaded"]:
+        return False
+    storage = get_storage()
+    key = artifact_key(artifact["sha256"])
+    if storage.exists(key):
+        return False
+
+    log.warning(f"⚠️ Artifact {artifact['sha256'][:12]} was garbage collected before it was referenced; uploading it again")
+    if callable(data):
+        data = data()
+    if hasattr(data, "seek"):
+        data.seek(0)
+    if upload is None:
+        storage.put(key, data, content_type)
+    else:
+        upload(data, key, content_type)
+    return True
+
+
+def release_artifact(db: Session, url: str):
+    """Drops one reference to the artifact behind url (no-op for non-CAS URLs). Does not commit."""
+    sha256 = sha256_from_url(url)
+    if not sha256:
+        return
+    # One UPDATE, like _add_reference: concurrent releases can't both read the same count
+    db.execute(
+        update(models.Artifact)
+        .where(models.Artifact.sha256 == sha256, models.Artifact.ref_count > 0)
+        .values(ref_count=models.Artifact.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_job_artifacts(db: Session, job: models.Job) -> bool:
+    """
+    Releases every artifact a job references (original files, reference
+    weights and chunks), once per job. Returns False if the job's artifacts
+    were already released. Does not commit.
+    """
+    # Mark the job first, only if unmarked: a second run (or a concurrent one,
+    # once this commits) finds it marked and releases nothing
+    claimed = db.execute(
+        update(models.Job)
+        .where(models.Job.id == job.id, models.Job.artifacts_released_at.is_(None))
+        .values(artifacts_released_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        return False
+    for url in (job.original_code_url, job.original_req_url, job.original_data_url, job.reference_weights_url):
+        release_artifact(db, url)
+    for subtask in job.subtasks:
+        release_artifact(db, subtask.chunk_file_url)
+    return True
+
+
+def collect_garbage(db: Session) -> int:
+    """Deletes artifacts nobody references any more. Returns how many were removed."""
+    storage = get_storage()
+    orphans = [sha256 for (sha256,) in
+               db.query(models.Artifact.sha256).filter(models.Artifact.ref_count <= 0).all()]
+    db.commit()
+
+    removed = 0
+    for sha256 in orphans:
+        # Row and object go in one transaction, and only if nobody referenced it
+        # since the query above (see the comment at the top)
+        try:
+            result = db.execute(
+                delete(models.Artifact)
+                .where(models.Artifact.sha256 == sha256, models.Artifact.ref_count <= 0)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                storage.delete(artifact_key(sha256))
+                removed += 1
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log.warning(f"⚠️ Could not delete artifact {sha256[:12]}: {e}")
+    return removed
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from starlette.concurrency import run_in_threadpool
+
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+# ==========================================
+# 1. CONFIGURATION
+# ==========================================
+# Response cache for the read endpoints the dashboard polls (job status, job
+# list, job result, online agents, wallet). A response is cached as its
+# serialized JSON plus an ETag. A request whose If-None-Match matches gets an
+# empty 304.
+#
+# Writes invalidate by tag ("job:12", "user:3:jobs", "agents"). Every tag has
+# a version number that is part of the cache key, so invalidating is one
+# increment. Entries under the old version are never read again; they expire
+# by TTL or LRU.
+#
+# CACHE_BACKEND selects where entries and tag versions live:
+#   "memory" -> This process (default). With several replicas, a write only
+#               invalidates the replica that handled it; others may serve
+#               the old response until its TTL runs out.
+#   "redis"  -> Shared by all replicas (REDIS_URL, needs the redis package)
+#   "none"   -> No caching (ETags and 304s still work)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+# Online agents change with every heartbeat, which doesn't invalidate (it would
+# empty the cache several times a second), so this one only expires
+CACHE_AGENTS_TTL_SECONDS = float(os.getenv("CACHE_AGENTS_TTL_SECONDS", "5"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "gridx:cache:")
+
+# Browsers may keep the response but must revalidate it (If-None-Match) every time
+CACHE_CONTROL = "no-cache"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+# ==========================================
+# 2. BACKENDS
+# ==========================================
+class Cache:
+    """Common interface for every cache backend."""
+
+    name = "base"
+    remote = False # Calls do network I/O (kept off the event loop)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raise NotImplementedError
+
+    def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        raise NotImplementedError
+
+    def versions(self, tags: List[str]) -> List[int]:
+        """Current version of each tag (0 if never invalidated)."""
+        raise NotImplementedError
+
+    def bump(self, tags: List[str]) -> None:
+        """Invalidates every entry cached under these tags."""
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        """Entries held, if the backend knows cheaply."""
+        return None
+
+
+class NullCache(Cache):
+    name = "none"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return None
+
+    def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        pass
+
+    def versions(self, tags: List[str]) -> List[int]:
+        return [0] * len(tags)
+
+    def bump(self, tags: List[str]) -> None:
+        pass
+
+
+class MemoryCache(Cache):
+    """LRU of at most max_entries entries, each valid for its TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict() # key -> (expires, entry)
+        self.tag_versions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, entry)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def versions(self, tags: List[str]) -> List[int]:
+        return [self.tag_versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags: List[str]) -> None:
+        with self.lock:
+            for tag in tags:
+                self.tag_versions[tag] = self.tag_versions.get(tag, 0) + 1
+
+    def size(self) -> Optional[int]:
+        return len(self.entries)
+
+
+class RedisCache(Cache):
+    """
+    Entries and tag versions in Redis, shared by every replica. Redis errors
+    are logged and treated as misses, so an outage costs DB queries, not requests.
+    """
+
+    name = "redis"
+    remote = True
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = CACHE_KEY_PREFIX):
+        # Imported here so memory / none setups don't need the redis package
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.errors = (redis.RedisError,)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            value = self.client.get(self.prefix + "r:" + key)
+        except self.errors as e:
+            log.warning(f"⚠️ Cache read failed: {e}")
+            return None
+        if value is None:
+            return None
+        etag, _, body = value.partition(b"\n")
+        return CachedResponse(body, etag.decode())
+
+    def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        try:
+            self.client.set(self.prefix + "r:" + key, entry.etag.encode() + b"\n" + entry.body, px=int(ttl * 1000))
+        except self.errors as e:
+            log.warning(f"⚠️ Cache write failed: {e}")
+
+    def versions(self, tags: List[str]) -> List[int]:
+        try:
+            values = self.client.mget([self.prefix + "v:" + tag for tag in tags])
+        except self.errors as e:
+            log.warning(f"⚠️ Cache read failed: {e}")
+            return [-1] * len(tags) # A key nothing was stored under: a miss
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, tags: List[str]) -> None:
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for tag in tags:
+                pipe.incr(self.prefix + "v:" + tag)
+            pipe.execute()
+        except self.errors as e:
+            # Other replicas keep serving the old response until its TTL
+            log.error(f"❌ Cache invalidation failed for {tags}: {e}")
+
+
+# ==========================================
+# 3. FACTORY
+# ==========================================
+BACKENDS = {
+    "memory": MemoryCache,
+    "redis": RedisCache,
+    "none": NullCache,
+}
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Cache:
+    """Returns the configured cache backend, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if CACHE_BACKEND not in BACKENDS:
+                    raise ValueError(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}'")
+                _cache = BACKENDS[CACHE_BACKEND]()
+                log.info(f"🗄️ Response cache backend: {_cache.name}")
+    return _cache
+
+
+def set_cache(cache: Optional[Cache]):
+    """Swap the active backend (used by tests and benchmarks)."""
+    global _cache
+    _cache = cache
+
+
+# ==========================================
+# 4. INVALIDATION
+# ==========================================
+def invalidate(*tags: str):
+    """Call after committing a write that changes what these tags' endpoints return."""
+    if not tags:
+        return
+    get_cache().bump(list(tags))
+    for tag in tags:
+        metrics.CACHE_INVALIDATIONS.inc(tag=tag.split(":", 1)[0])
+
+
+def job_tags(job_id: int, owner_id: Optional[int] = None) -> List[str]:
+    """Job status / result, plus the owner's job list when its status or URLs changed."""
+    tags = [f"job:{job_id}"]
+    if owner_id is not None:
+        tags.append(f"user:{owner_id}:jobs")
+    return tags
+
+
+def invalidate_job(job_id: int, owner_id: Optional[int] = None):
+    invalidate(*job_tags(job_id, owner_id))
+
+
+# ==========================================
+# 5. RESPONSES
+# ==========================================
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def serialize(value: Any, model: Any = None) -> CachedResponse:
+    """The JSON FastAPI would have sent (validated through response_model when there is one)."""
+    if model is not None:
+        adapter = _adapters.get(model)
+        if adapter is None:
+            adapter = _adapters[model] = TypeAdapter(model)
+        body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    else:
+        body = json.dumps(jsonable_encoder(value), ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+    return CachedResponse(body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def to_response(request: Request, entry: CachedResponse, name: str) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": CACHE_CONTROL}
+    if not_modified(request, entry.etag):
+        metrics.CACHE_NOT_MODIFIED.inc(cache=name)
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def cache_key(cache: Cache, name: str, params: Iterable, tags: List[str]) -> str:
+    versions = cache.versions(tags) if tags else []
+    return ":".join([name, *map(str, params)]) + "@" + ".".join(map(str, versions))
+
+
+def respond(request: Request, name: str, params: Iterable, tags: List[str], build: Callable[[], Any],
+            model: Any = None, ttl: float = CACHE_TTL_SECONDS) -> Response:
+    """
+    Serves name(params) from the cache, or calls build() (the endpoint's
+    query), caches its serialized result and serves that. Exceptions from
+    build() (404, 403...) pass through and are not cached.
+    """
+    cache = get_cache()
+    key = cache_key(cache, name, params, tags)
+    entry = cache.get(key)
+    if entry is None:
+        metrics.CACHE_REQUESTS.inc(cache=name, result="miss")
+        entry = serialize(build(), model)
+        cache.set(key, entry, ttl)
+    else:
+        metrics.CACHE_REQUESTS.inc(cache=name, result="hit")
+    return to_response(request, entry, name)
+
+
+async def respond_async(request: Request, name: str, params: Iterable, tags: List[str], build,
+                        model: Any = None, ttl: float = CACHE_TTL_SECONDS) -> Response:
+    """respond() for async endpoints: build is a coroutine function."""
+    cache = get_cache()
+
+    async def call(fn, *args):
+        return await run_in_threadpool(fn, *args) if cache.remote else fn(*args)
+
+    key = await call(cache_key, cache, name, params, tags)
+    entry = await call(cache.get, key)
+    if entry is None:
+        metrics.CACHE_REQUESTS.inc(cache=name, result="miss")
+        entry = serialize(await build(), model)
+        await call(cache.set, key, entry, ttl)
+    else:
+        metrics.CACHE_REQUESTS.inc(cache=name, result="hit")
+    return to_response(request, entry, name)
@@ -0,0 +1,57 @@
+import io
+import logging
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# ==========================================
+# CHUNK ENCODINGS
+# ==========================================
+# How the splitter stores each chunk (CHUNK_FORMAT in front_job.py):
+#   "csv"     -> plain text, what train.py reads directly (default)
+#   "parquet" -> columnar + zstd, smallest download for numeric data
+#   "arrow"   -> Arrow IPC file, uncompressed so workers can memory-map it
+# Workers always write a data.csv next to the columnar file, so existing
+# train.py scripts keep working.
+# parquet/arrow need pyarrow; without it we fall back to CSV.
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+
+def resolve_format(requested: str) -> str:
+    """Returns the format we can actually produce for `requested`."""
+    requested = (requested or "csv").lower()
+    if requested not in CONTENT_TYPES:
+        log.warning(f"⚠️ Unknown CHUNK_FORMAT '{requested}', using csv")
+        return "csv"
+    if requested != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            log.warning(f"⚠️ CHUNK_FORMAT={requested} needs pyarrow, using csv")
+            return "csv"
+    return requested
+
+
+def encode_chunk(df: "pd.DataFrame", fmt: str) -> tuple:
+    """Serializes a DataFrame slice. Returns (bytes, content_type)."""
+    buffer = io.BytesIO()
+
+    if fmt == "parquet":
+        df.to_parquet(buffer, index=False, compression="zstd")
+    elif fmt == "arrow":
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_file(buffer, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        df.to_csv(buffer, index=False)
+
+    return buffer.getvalue(), CONTENT_TYPES[fmt]
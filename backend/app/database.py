@@ -1,20 +1,85 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, literal
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import logging
 import os
 from pathlib import Path
 
+log = logging.getLogger(__name__)
+
 # 1. Use absolute path to database file in backend directory
 # This ensures all scripts use the same database
 BASE_DIR = Path(__file__).parent
 DATABASE_PATH = BASE_DIR / "sql_app.db"
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+# DATABASE_URL overrides it (benchmarks point this at a throwaway file)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DATABASE_PATH}")
+
+# Connection pool, per engine. Pool + overflow covers FastAPI's 40 threadpool
+# threads (SQLAlchemy's default 5 + 10 makes the 16th concurrent sync request
+# wait for a connection). Sync sessions still keep their connection until the
+# response is serialized, which needs a thread too, so past ~40 concurrent
+# requests the sync routes can stall until DB_POOL_TIMEOUT; the async routes
+# don't take threads (bench_agent_polls.py).
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# SQLite: how long a writer waits for the lock before "database is locked"
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+# The async engine's requests wait for a connection without holding a thread,
+# so its pool only needs to cover what the database can do in parallel. SQLite
+# runs one writer at a time and makes the others sleep and retry, so a few
+# connections beat many (bench_agent_polls.py, 10 agents: poll p99 0.2s with
+# 4, 1.5s with 40).
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "4" if IS_SQLITE else str(DB_POOL_SIZE)))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "0" if IS_SQLITE else str(DB_MAX_OVERFLOW)))
+
+# The hot agent endpoints and status reads run on an async engine (see
+# routers/hot_paths.py) unless ASYNC_DB=false. Needs aiosqlite (sqlite) or
+# asyncpg (postgresql).
+ASYNC_DB = os.getenv("ASYNC_DB", "true").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+
+def async_url(url: str) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://..."""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def pool_args(url: str, size: int = DB_POOL_SIZE, overflow: int = DB_MAX_OVERFLOW) -> dict:
+    # In-memory SQLite keeps its own single-connection pool
+    if url.startswith("sqlite") and (":memory:" in url or url.partition("://")[2] in ("", "/")):
+        return {}
+    return {"pool_size": size, "max_overflow": overflow, "pool_timeout": DB_POOL_TIMEOUT}
+
+
+def use_wal(engine):
+    """
+    WAL lets readers (polls, status reads) run while a writer commits, so the
+    pool's connections can actually work in parallel on one SQLite file.
+    """
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
 
 # 2. THE ENGINE
 # CRITICAL: 'check_same_thread': False is required for SQLite only!
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT} if IS_SQLITE else {},
+    **pool_args(SQLALCHEMY_DATABASE_URL)
 )
+if IS_SQLITE:
+    use_wal(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -26,4 +91,72 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# 3b. SCHEMA UPGRADES
+# create_all() only creates missing tables; it never changes existing ones. So
+# a sql_app.db from an older version lacks the columns added since (e.g.
+# subtasks.chunk_format) and every query touching them fails. On startup we
+# add each missing column as a nullable column, with the model's default for
+# existing rows when it is a constant. Running it again is a no-op.
+def add_missing_columns(bind, metadata) -> list:
+    """ALTER TABLE ... ADD COLUMN for model columns the database lacks. Returns "table.column" names added."""
+    dialect = bind.dialect
+    quote = dialect.identifier_preparer.quote
+    added = []
+
+    inspector = inspect(bind)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue # create_all() makes it whole
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or column.primary_key:
+                continue
+            ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=dialect)}"
+            # Only constants: SQLite can't ADD COLUMN with a default like CURRENT_TIMESTAMP
+            if column.default is not None and column.default.is_scalar:
+                default = literal(column.default.arg, column.type).compile(
+                    dialect=dialect, compile_kwargs={"literal_binds": True})
+                ddl += f" DEFAULT {default}"
+            try:
+                with bind.begin() as conn:
+                    conn.exec_driver_sql(ddl)
+            except DBAPIError:
+                # Another process (uvicorn --workers) may have just added it
+                if column.name not in {c["name"] for c in inspect(bind).get_columns(table.name)}:
+                    raise
+                continue
+            log.info(f"🛠️ Added column {table.name}.{column.name}")
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+# 4. THE ASYNC ENGINE
+# Same database, same pool sizing. Handlers using it run on the event loop
+# instead of taking a threadpool thread for the whole request.
+async_engine = None
+AsyncSessionLocal = None
+
+if ASYNC_DB:
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_engine = create_async_engine(
+            async_url(SQLALCHEMY_DATABASE_URL),
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT} if IS_SQLITE else {},
+            **pool_args(SQLALCHEMY_DATABASE_URL, ASYNC_DB_POOL_SIZE, ASYNC_DB_MAX_OVERFLOW)
+        )
+        if IS_SQLITE:
+            use_wal(async_engine.sync_engine)
+        # expire_on_commit=False: reading an attribute after commit must not need a query
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    except ImportError as e:
+        log.warning(f"⚠️ ASYNC_DB is on but its driver is missing ({e}); using the sync engine only")
+        ASYNC_DB = False
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,278 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# ==========================================
+# STRUCTURED LOGGING
+# ==========================================
+# A log call only builds the record and puts it on a bounded queue. One
+# listener thread formats it (JSON lines by default) and writes stdout, so a
+# slow log consumer can't stall request handlers. When the queue is full the
+# record is dropped and counted (gridx_log_records_dropped_total); the handler
+# never blocks.
+#
+# Every line has ts, level, logger, msg and service. It also carries the
+# correlation IDs bound for the current request or task (request_id, agent_id,
+# job_id, subtask_id) and any extra={...} fields of the call. Workers send
+# their IDs as X-Agent-ID / X-Job-ID / X-Subtask-ID headers, so backend and
+# worker lines for one subtask can be joined.
+#
+# High-frequency events (heartbeats, empty polls) are sampled per
+# LOG_SAMPLE_RATES through sampled(), before a record is built. A kept line
+# carries "sample_rate" so counts can be scaled back.
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()        # json | text
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records buffered before dropping
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "heartbeat=0.01,poll=0.01")
+
+# Incoming header -> context field
+CORRELATION_HEADERS = {
+    b"x-request-id": "request_id",
+    b"x-agent-id": "agent_id",
+    b"x-job-id": "job_id",
+    b"x-subtask-id": "subtask_id",
+}
+
+_context: contextvars.ContextVar = contextvars.ContextVar("gridx_log_context", default={})
+_sample_rates: Dict[str, float] = {}
+
+# LogRecord attributes that are not extra={...} fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "context"}
+
+
+def parse_sample_rates(text: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+_sample_rates.update(parse_sample_rates(LOG_SAMPLE_RATES))
+
+
+def sampled(event: str) -> Optional[dict]:
+    """
+    Sampling for high-frequency events, decided before the LogRecord is built
+    (building it is most of a log call's cost):
+        if keep := logs.sampled("heartbeat"):
+            log.info("💓 Heartbeat", extra={**keep, "status": status})
+    Returns the extra fields to log with, or None to skip this one.
+    """
+    rate = _sample_rates.get(event, 1.0)
+    if rate >= 1.0:
+        return {"event": event}
+    if rate <= 0 or random.random() >= rate:
+        return None
+    return {"event": event, "sample_rate": rate}
+
+
+def set_sample_rate(event: str, rate: float):
+    _sample_rates[event] = min(1.0, max(0.0, rate))
+
+
+# ==========================================
+# 1. CORRELATION IDS
+# ==========================================
+def bind(**fields):
+    """
+    Adds fields to the current context. FastAPI runs each request (and each
+    sync handler) in its own copy of the context, so this never leaks into
+    other requests.
+    """
+    merged = dict(_context.get())
+    merged.update({name: value for name, value in fields.items() if value is not None})
+    return _context.set(merged)
+
+
+@contextmanager
+def bound(**fields):
+    """bind() for a block, for threads that outlive one task (the splitter)."""
+    token = bind(**fields)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def context() -> dict:
+    return _context.get()
+
+
+class LogContextMiddleware:
+    """
+    Plain ASGI middleware: binds the request's correlation IDs from its
+    headers (X-Request-ID is generated when missing) and echoes X-Request-ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        fields = {}
+        for name, value in scope["headers"]:
+            field = CORRELATION_HEADERS.get(name)
+            if field:
+                fields[field] = value.decode("latin-1")[:128]
+        request_id = fields.setdefault("request_id", uuid.uuid4().hex[:16])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        token = bind(**fields)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _context.reset(token)
+
+
+# ==========================================
+# 2. HANDLER (caller side: enqueue only)
+# ==========================================
+class ContextQueueHandler(QueueHandler):
+    """QueueHandler that snapshots the correlation IDs and never blocks."""
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE):
+        # SimpleQueue is implemented in C and takes no Python-level locks; the
+        # bound is checked with qsize(), so it can overshoot by a few records.
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread; only resolve what can't wait:
+        # the message arguments, the traceback and this thread's context.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.context = _context.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            from . import metrics
+            metrics.LOG_RECORDS_DROPPED.inc()
+            return
+        self.queue.put_nowait(record)
+
+
+# ==========================================
+# 3. FORMATTERS (listener thread)
+# ==========================================
+class JsonFormatter(logging.Formatter):
+    def __init__(self, static: Optional[dict] = None):
+        super().__init__()
+        self.static = static or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+            **self.static,
+            **getattr(record, "context", {}),
+        }
+        entry.update({key: value for key, value in record.__dict__.items() if key not in _RESERVED})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development (LOG_FORMAT=text)."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {**getattr(record, "context", {}),
+                  **{key: value for key, value in record.__dict__.items() if key not in _RESERVED}}
+        if fields:
+            line += "  " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+# ==========================================
+# 4. SETUP
+# ==========================================
+class StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time (tests and benchmarks swap it)."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+
+_handler: Optional[ContextQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(service: str, stream=None, fmt: str = None, level: str = None,
+                  sample_rates: Optional[Dict[str, float]] = None, queue_size: int = None) -> ContextQueueHandler:
+    """Routes the root logger through the queue. Idempotent; returns the handler."""
+    global _handler, _listener
+    with _setup_lock:
+        if _handler is not None:
+            return _handler
+
+        output = logging.StreamHandler(stream) if stream is not None else StdoutHandler()
+        output.setFormatter(JsonFormatter({"service": service}) if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+
+        handler = ContextQueueHandler(queue_size or LOG_QUEUE_SIZE)
+        if sample_rates is not None:
+            _sample_rates.clear()
+            _sample_rates.update(sample_rates)
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level or LOG_LEVEL)
+        # Lines carry no file/line or process name, so skip finding them for every
+        # record (the logging HOWTO's "Optimization" section)
+        logging._srcfile = None
+        logging.logMultiprocessing = False
+
+        _listener = QueueListener(handler.queue, output)
+        _listener.start()
+        atexit.register(shutdown_logging) # Flush what is still queued
+        _handler = handler
+        return handler
+
+
+def shutdown_logging():
+    """Stops the listener after it has written everything queued so far."""
+    global _handler, _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            logging.getLogger().removeHandler(_handler)
+        _handler = _listener = None
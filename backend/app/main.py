@@ -13,8 +13,17 @@ load_dotenv(env_file)
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .database import engine, Base
+from . import database
 # Import the routers we created
-from .routers import front_auth, front_job, sellers, agent
+# Keep module-level imports light: torch and pandas are imported inside the
+# aggregation / splitting code and the storage client is created on first use,
+# so API replicas start fast (benchmarks/bench_startup.py measures this).
+from .routers import front_auth, front_job, sellers, agent, files, debug, hot_paths, metrics as metrics_router
+from .metrics import MetricsMiddleware
+from . import logs, profiling
+
+# JSON lines on stdout through a background queue (LOG_FORMAT, LOG_LEVEL, LOG_SAMPLE_RATES; see app/logs.py)
+logs.setup_logging("backend")
 
 # ==========================================
 # 1. INITIALIZE DATABASE
@@ -22,6 +31,8 @@ from .routers import front_auth, front_job, sellers, agent
 # This automatically creates the tables (Users, Agents, Jobs, Subtasks)
 # inside sql_app.db if they don't exist yet.
 Base.metadata.create_all(bind=engine)
+# ...and adds the columns newer versions introduced to an existing database
+database.add_missing_columns(engine, Base.metadata)
 
 # ==========================================
 # 2. SETUP APP & SECURITY
@@ -39,11 +50,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route, exported at /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Correlation IDs (X-Request-ID, X-Agent-ID, X-Job-ID, X-Subtask-ID) on every log line of a request
+app.add_middleware(logs.LogContextMiddleware)
+
+# Opt-in request profiling (PROFILING=true, see app/profiling.py):
+# SQL / storage time per request, slow request & query log, GET /debug/profiles
+if profiling.PROFILING:
+    profiling.install(engine)
+    if database.async_engine is not None:
+        profiling.install(database.async_engine.sync_engine)
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 # ==========================================
 # 3. PLUG IN THE ROUTERS
 # ==========================================
 # This keeps your code clean. We import logic from other files and "mount" them here.
 
+# Async heartbeat / request_task / complete_task / status reads (ASYNC_DB, see
+# app/routers/hot_paths.py). Mounted first, so they win over the sync versions.
+if database.ASYNC_DB:
+    app.include_router(hot_paths.router, tags=["Async: Hot Paths"])
+
 # Frontend Routes (For the Website)
 app.include_router(front_auth.router, prefix="/auth", tags=["Frontend: Auth"])
 app.include_router(front_job.router, prefix="/jobs", tags=["Frontend: Jobs"])
@@ -52,6 +82,16 @@ app.include_router(sellers.router, prefix="/stats", tags=["Frontend: Dashboard"]
 # Agent Routes (For the Python Scripts on Laptops)
 app.include_router(agent.router, prefix="/agent", tags=["Agent: Operations"])
 
+# Static file server (only active when STORAGE_BACKEND is "local" or "memory")
+app.include_router(files.router, prefix="/files", tags=["Storage: Files"])
+
+# Prometheus scrape endpoint (see app/metrics.py)
+app.include_router(metrics_router.router, tags=["Monitoring"])
+
+# Last request profiles (only with PROFILING=true)
+if profiling.PROFILING:
+    app.include_router(debug.router, prefix="/debug", tags=["Debug"])
+
 # ==========================================
 # 4. ROOT ENDPOINT (Health Check)
 # ==========================================
@@ -0,0 +1,316 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Tuple
+
+# ==========================================
+# METRICS (Prometheus text format, GET /metrics)
+# ==========================================
+# Everything here is an in-process counter updated where the event happens,
+# so a scrape only formats numbers; it never runs a query per metric.
+# Two exceptions, both cheap:
+#   * subtask queue sizes are tracked from state changes in this process and
+#     re-synced from the database (one GROUP BY) at most every
+#     METRICS_RESYNC_SECONDS, so replicas and restarts converge
+#   * online agents are counted from the heartbeats this process has seen
+# No prometheus_client dependency: the exposition format is a few lines of text.
+
+METRICS_RESYNC_SECONDS = float(os.getenv("METRICS_RESYNC_SECONDS", "60"))
+# Same window the seller dashboard uses for "online" (routers/sellers.py)
+AGENT_ONLINE_SECONDS = float(os.getenv("AGENT_ONLINE_SECONDS", "300"))
+
+# Seconds; covers a 5 ms API call up to a multi-minute aggregation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+SUBTASK_STATES = ("PENDING", "RUNNING", "COMPLETED", "CANCELLED", "FAILED")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.lock = threading.Lock()
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{_format_labels(key, extra)} {_format_value(value)}" for name, key, extra, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, (), value) for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, callback: Optional[Callable[[], Dict[LabelKey, float]]] = None):
+        super().__init__(name, help_text)
+        self.values: Dict[LabelKey, float] = {}
+        self.callback = callback # Computed at scrape time instead of set()
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(_label_key(labels), 0)
+
+    def samples(self):
+        if self.callback is not None:
+            return [(self.name, key, (), value) for key, value in self.callback().items()]
+        with self.lock:
+            return [(self.name, key, (), value) for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelKey, list] = {} # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self.series.get(_label_key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.series.items()}
+        samples = []
+        for key, series in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, (("le", _format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), series[-1]))
+            samples.append((f"{self.name}_count", key, (), cumulative))
+        return samples
+
+
+REGISTRY = []
+
+
+def register(metric: Metric) -> Metric:
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# ==========================================
+# 1. API
+# ==========================================
+REQUEST_SECONDS = register(Histogram("gridx_http_request_duration_seconds", "API request latency by route"))
+
+# ==========================================
+# 2. SCHEDULING
+# ==========================================
+SUBTASKS = register(Gauge("gridx_subtasks", "Subtasks by state"))
+TASK_CLAIM_SECONDS = register(Histogram("gridx_task_claim_seconds", "Time to find and lock a subtask in /agent/request_task"))
+SUBTASK_STATE_SECONDS = register(Histogram("gridx_subtask_state_seconds", "Time a subtask spent in a state before leaving it"))
+SUBTASK_PHASE_SECONDS = register(Histogram("gridx_subtask_phase_seconds", "Worker-reported time per subtask phase (app/timings.py)"))
+
+# ==========================================
+# 3. AGGREGATION & SPLITTING
+# ==========================================
+AGGREGATION_SECONDS = register(Histogram("gridx_aggregation_duration_seconds", "FedAvg duration per job"))
+AGGREGATION_BYTES = register(Counter("gridx_aggregation_bytes_total", "Bytes read (worker results) and written (final model) by aggregation"))
+SPLIT_SECONDS = register(Histogram("gridx_split_duration_seconds", "Dataset split duration per job"))
+SPLIT_ROWS = register(Counter("gridx_split_rows_total", "Rows split into chunks"))
+SPLIT_BYTES = register(Counter("gridx_split_bytes_total", "Encoded chunk bytes produced by the splitter"))
+
+# ==========================================
+# 4. STORAGE
+# ==========================================
+STORAGE_UPLOAD_SECONDS = register(Histogram("gridx_storage_upload_duration_seconds", "Backend uploads to storage, including retries"))
+STORAGE_UPLOAD_RETRIES = register(Counter("gridx_storage_upload_retries_total", "Failed storage upload attempts that were retried or gave up"))
+
+# ==========================================
+# 5. AGENTS
+# ==========================================
+_agent_heartbeats: Dict[str, Tuple[float, str]] = {} # agent id -> (monotonic time, status)
+_agents_lock = threading.Lock()
+
+
+def agent_seen(agent_id: str, status: str):
+    with _agents_lock:
+        _agent_heartbeats[agent_id] = (time.monotonic(), status)
+
+
+def _online_agents() -> Dict[LabelKey, float]:
+    cutoff = time.monotonic() - AGENT_ONLINE_SECONDS
+    counts: Dict[LabelKey, float] = {}
+    with _agents_lock:
+        for agent_id, (seen, status) in list(_agent_heartbeats.items()):
+            if seen < cutoff:
+                del _agent_heartbeats[agent_id] # Offline; forget it until it comes back
+                continue
+            key = _label_key({"status": status})
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+AGENTS_ONLINE = register(Gauge("gridx_agents_online", "Agents that sent a heartbeat within AGENT_ONLINE_SECONDS", callback=_online_agents))
+
+
+# ==========================================
+# 6. SUBTASK STATE TRACKING
+# ==========================================
+_last_resync = 0.0
+
+
+def subtask_moved(old: Optional[str], new: str, count: int = 1):
+    """Records `count` subtasks leaving `old` (None for new rows) and entering `new`."""
+    if count <= 0:
+        return
+    if old:
+        SUBTASKS.inc(-count, state=old)
+    SUBTASKS.inc(count, state=new)
+
+
+def resync_subtasks(db, force: bool = False):
+    """Replaces the tracked queue sizes with the database's, at most every METRICS_RESYNC_SECONDS."""
+    global _last_resync
+    now = time.monotonic()
+    if not force and _last_resync and now - _last_resync < METRICS_RESYNC_SECONDS:
+        return
+    _last_resync = now
+
+    from sqlalchemy import func
+    from . import models
+    counts = dict(db.query(models.Subtask.status, func.count(models.Subtask.id)).group_by(models.Subtask.status).all())
+    for state in set(SUBTASK_STATES) | set(counts):
+        SUBTASKS.set(counts.get(state, 0), state=state)
+
+
+def seconds_since(moment) -> Optional[float]:
+    """Age of a DB timestamp (naive values are UTC, as SQLite returns them)."""
+    if moment is None:
+        return None
+    from datetime import datetime, timezone
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (datetime.now(timezone.utc) - moment).total_seconds())
+
+
+# ==========================================
+# 7. REQUEST LATENCY MIDDLEWARE
+# ==========================================
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware overhead) timing every HTTP request.
+    Labels use the route template ("/jobs/{job_id}"), never the raw path,
+    so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status_code = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status_code[0],
+            )
+
+
+# ==========================================
+# 8. LOGGING
+# ==========================================
+LOG_RECORDS_DROPPED = register(Counter("gridx_log_records_dropped_total", "Log records dropped because the log queue was full (app/logs.py)"))
+
+
+# ==========================================
+# 9. RESPONSE CACHE
+# ==========================================
+# Hit rate per cached endpoint:
+#   sum by (cache) (rate(gridx_cache_requests_total{result="hit"}[5m])) / sum by (cache) (rate(gridx_cache_requests_total[5m]))
+CACHE_REQUESTS = register(Counter("gridx_cache_requests_total", "Cached endpoint lookups by result (hit / miss, app/cache.py)"))
+CACHE_NOT_MODIFIED = register(Counter("gridx_cache_not_modified_total", "304 responses sent for a matching If-None-Match"))
+CACHE_INVALIDATIONS = register(Counter("gridx_cache_invalidations_total", "Cache tag invalidations by tag kind (job, user, agents)"))
+
+
+def _cache_entries() -> Dict[LabelKey, float]:
+    from .cache import get_cache
+    size = get_cache().size()
+    return {} if size is None else {_label_key({}): size}
+
+
+CACHE_ENTRIES = register(Gauge("gridx_cache_entries", "Responses held by the in-process cache", callback=_cache_entries))
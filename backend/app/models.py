@@ -57,10 +57,18 @@ class Job(Base):
     original_code_url = Column(String)
     original_req_url = Column(String)
     original_data_url = Column(String)
+
+    # UPDATE ENCODING (see app/updates.py)
+    reference_weights_url = Column(String, nullable=True) # Shared initialization, optional
+    update_encoding = Column(String, default="full")      # full | delta | fp16 | int8 | topk
+    update_topk_ratio = Column(Float, default=0.01)
     
     # AGGREGATION
     final_result_url = Column(String, nullable=True)
 
+    # GARBAGE COLLECTION (see app/artifacts.py): set once the job's artifact references are dropped
+    artifacts_released_at = Column(DateTime(timezone=True), nullable=True)
+
     owner_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -81,9 +89,42 @@ class Subtask(Base):
     
     status = Column(String, default="PENDING")
     chunk_file_url = Column(String)
+    chunk_format = Column(String, default="csv") # csv | parquet | arrow
     result_file_url = Column(String, nullable=True)
+    # Reported by the worker after a direct-to-storage upload
+    result_size = Column(Integer, nullable=True)
+    result_sha256 = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True) # Claimed by an agent
     completed_at = Column(DateTime(timezone=True), nullable=True)
+    failures = Column(Integer, default=0) # Runs reported through /agent/fail_task
+
+    # PHASE TIMINGS (reported by the worker, see app/timings.py)
+    queue_wait_seconds = Column(Float, nullable=True)
+    download_seconds = Column(Float, nullable=True)
+    dependencies_seconds = Column(Float, nullable=True)
+    container_start_seconds = Column(Float, nullable=True)
+    training_seconds = Column(Float, nullable=True)
+    upload_seconds = Column(Float, nullable=True)
+    peak_memory_bytes = Column(Integer, nullable=True)
+    cpu_seconds = Column(Float, nullable=True)
 
     # RELATIONSHIPS
     job = relationship("Job", back_populates="subtasks")
-    assigned_agent = relationship("Agent", back_populates="subtasks")
\ No newline at end of file
+    assigned_agent = relationship("Agent", back_populates="subtasks")
+
+
+# ==========================================
+# 5. ARTIFACTS TABLE (Content-addressed files)
+# ==========================================
+class Artifact(Base):
+    __tablename__ = "artifacts"
+
+    sha256 = Column(String, primary_key=True, index=True) # Stored at cas/{sha256}
+    size = Column(Integer)
+    content_type = Column(String, nullable=True)
+
+    # How many job files / chunks point at this blob. 0 = safe to delete.
+    ref_count = Column(Integer, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,399 @@
+import asyncio
+import contextvars
+import cProfile
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from typing import Optional
+
+from fastapi.routing import APIRoute
+
+# ==========================================
+# REQUEST PROFILING (opt-in, PROFILING=true)
+# ==========================================
+# Answers "where did this request's time go?" without attaching a debugger:
+#   * every request: SQL query count and time (SQLAlchemy cursor events),
+#     storage call count and time, handler time vs. time spent outside the
+#     handler (request parsing, response validation / serialization, middleware)
+#   * a PROFILE_SAMPLE_RATE fraction of requests also get stacks: a sampling
+#     profiler (PROFILE_MODE=sampler, a few % overhead) or cProfile
+#     (PROFILE_MODE=cprofile, exact call counts, much slower)
+#   * slow requests (SLOW_REQUEST_MS) and slow queries (SLOW_QUERY_MS) are
+#     logged with their stack
+#   * GET /debug/profiles returns the last PROFILE_HISTORY profiles; the same
+#     statement run many times in one request (an N+1) shows up in
+#     "repeated_queries"
+# Exposes SQL text and code paths, so keep it off on public deployments.
+
+PROFILING = os.getenv("PROFILING", "false").lower() == "true"
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampler").lower()          # sampler | cprofile | none (SQL/storage only)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.1"))  # Fraction of requests that get stacks
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "100"))
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "15"))                     # Stacks / functions kept per profile
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+REPEATED_QUERY_THRESHOLD = int(os.getenv("REPEATED_QUERY_THRESHOLD", "5"))
+
+APP_DIR = str(Path(__file__).parent)
+THIS_FILE = str(Path(__file__))
+
+log = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("gridx_profile", default=None)
+_profiles: deque = deque(maxlen=PROFILE_HISTORY)
+
+
+class Profile:
+    """Everything measured for one request. Handlers run in the threadpool; the
+    context variable holding this object is copied there, so SQL and storage
+    hooks find it from any thread the request uses."""
+
+    def __init__(self, method: str, path: str, sampled: bool):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.sampled = sampled
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.total_seconds = 0.0
+        self.handler_seconds = 0.0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.queries = {}  # statement -> [count, seconds]
+        self.storage_calls = 0
+        self.storage_seconds = 0.0
+        self.stacks = Counter()  # Collapsed stack -> samples (sampler)
+        self.functions = None    # Top functions (cprofile)
+
+    def add_query(self, statement: str, seconds: float):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        entry = self.queries.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def repeated_queries(self) -> list:
+        repeated = [
+            {"statement": statement, "count": count, "ms": round(seconds * 1000, 2)}
+            for statement, (count, seconds) in self.queries.items() if count >= REPEATED_QUERY_THRESHOLD
+        ]
+        return sorted(repeated, key=lambda entry: entry["count"], reverse=True)
+
+    def to_dict(self) -> dict:
+        handler = self.handler_seconds
+        queries = sorted(self.queries.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "total_ms": round(self.total_seconds * 1000, 2),
+            "handler_ms": round(handler * 1000, 2),
+            "sql_ms": round(self.sql_seconds * 1000, 2),
+            "storage_ms": round(self.storage_seconds * 1000, 2),
+            # Handler time not spent waiting on the database or storage
+            "python_ms": round(max(0.0, handler - self.sql_seconds - self.storage_seconds) * 1000, 2),
+            # Body parsing, dependencies, response validation and serialization, middleware
+            "outside_handler_ms": round(max(0.0, self.total_seconds - handler) * 1000, 2),
+            "sql_count": self.sql_count,
+            "storage_calls": self.storage_calls,
+            "queries": [
+                {"statement": statement, "count": count, "ms": round(seconds * 1000, 2)}
+                for statement, (count, seconds) in queries[:PROFILE_TOP]
+            ],
+            "repeated_queries": self.repeated_queries(),
+            "sampled": self.sampled,
+            "stacks": [
+                {"stack": stack, "samples": samples, "ms": round(samples * PROFILE_SAMPLE_INTERVAL * 1000, 1)}
+                for stack, samples in self.stacks.most_common(PROFILE_TOP)
+            ],
+            "functions": self.functions,
+        }
+
+
+def current() -> Optional[Profile]:
+    return _current.get()
+
+
+def recent(limit: int = 20) -> list:
+    """Newest first."""
+    return list(reversed(_profiles))[:max(0, limit)]
+
+
+def clear():
+    _profiles.clear()
+
+
+# ==========================================
+# 1. STACK SAMPLER
+# ==========================================
+class StackSampler:
+    """
+    One daemon thread that, while any sampled handler is running, reads every
+    registered thread's stack via sys._current_frames() each
+    PROFILE_SAMPLE_INTERVAL. Handlers pay nothing per call; the cost is the
+    sampler thread's GIL time.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.threads = {}  # thread id -> Profile
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def register(self, profile: Profile):
+        with self.lock:
+            self.threads[threading.get_ident()] = profile
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="gridx-profiler", daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def unregister(self):
+        # Holding the lock means no sample is being written once this returns
+        with self.lock:
+            self.threads.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            if not self.threads:
+                self.wake.wait()
+                self.wake.clear()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, profile in self.threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profile.stacks[collapse_stack(frame)] += 1
+
+
+def collapse_stack(frame) -> str:
+    """'outer;...;inner' from the profiled handler down, as flame graph tools expect."""
+    names = []
+    while frame is not None and frame.f_code is not _call_handler.__code__:
+        code = frame.f_code
+        names.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+SAMPLER = StackSampler()
+
+
+def top_functions(profiler: cProfile.Profile, limit: int = PROFILE_TOP) -> list:
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True) # By cumulative time
+    functions = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in rows:
+        if filename == THIS_FILE or "lsprof" in name:
+            continue
+        functions.append({
+            "function": f"{Path(filename).name}:{line}({name})" if line else name,
+            "calls": calls,
+            "own_ms": round(own * 1000, 2),
+            "cumulative_ms": round(cumulative * 1000, 2),
+        })
+        if len(functions) >= limit:
+            break
+    return functions
+
+
+# ==========================================
+# 2. HANDLER TIMING (route class)
+# ==========================================
+def _call_handler(profile: Profile, endpoint, args, kwargs):
+    """Runs a sync handler in its threadpool thread, with stacks if the request was sampled."""
+    profiler = None
+    if profile.sampled and PROFILE_MODE == "sampler":
+        SAMPLER.register(profile)
+    elif profile.sampled and PROFILE_MODE == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        return endpoint(*args, **kwargs)
+    finally:
+        profile.handler_seconds += time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            profile.functions = top_functions(profiler)
+        elif profile.sampled and PROFILE_MODE == "sampler":
+            SAMPLER.unregister()
+
+
+def profiled(endpoint):
+    """
+    Wraps an endpoint so its own run time is measured. Async endpoints share
+    the event loop thread with other requests, so they get timing but no stacks.
+    Without an active profile this is a single context variable lookup.
+    """
+    if getattr(endpoint, "_profiled", False):
+        return endpoint # include_router() rebuilds routes with the same route class
+    if asyncio.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.handler_seconds += time.perf_counter() - start
+        async_wrapper._profiled = True
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        return _call_handler(profile, endpoint, args, kwargs)
+    wrapper._profiled = True
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route class for the API routers: APIRouter(route_class=ProfiledRoute)."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+
+# ==========================================
+# 3. SQL & STORAGE HOOKS
+# ==========================================
+def app_stack(limit: int = 8) -> str:
+    """Innermost frames from our own code: the line that issued the query, and its callers."""
+    frames = [frame for frame in traceback.extract_stack()[:-1]
+              if frame.filename.startswith(APP_DIR) and frame.filename != THIS_FILE]
+    return "".join(traceback.format_list(frames[-limit:])).rstrip()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("gridx_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("gridx_query_start")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    profile = _current.get()
+    if profile is not None:
+        profile.add_query(statement, seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        where = f" during {profile.method} {profile.path}" if profile else ""
+        log.warning(f"🐢 Slow query ({seconds * 1000:.0f} ms){where}: {' '.join(statement.split())}\n{app_stack()}",
+                    extra={"sql_ms": round(seconds * 1000, 2)})
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("gridx_query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def install(engine):
+    """Attaches the query hooks to an engine (idempotent)."""
+    from sqlalchemy import event
+
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+STORAGE_METHODS = ("put", "get", "exists", "size", "sha256", "delete", "presign")
+
+
+def _timed(method):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            profile.storage_calls += 1
+            profile.storage_seconds += time.perf_counter() - start
+    return wrapper
+
+
+def instrument_storage(storage, force: bool = False):
+    """Times the storage backend's calls per request. Wraps methods on the
+    instance, so isinstance() checks against the backend class still work."""
+    if (PROFILING or force) and storage is not None and not getattr(storage, "_profiled", False):
+        for name in STORAGE_METHODS:
+            setattr(storage, name, _timed(getattr(storage, name)))
+        storage._profiled = True
+    return storage
+
+
+# ==========================================
+# 4. MIDDLEWARE
+# ==========================================
+def report_slow(profile: Profile):
+    data = profile.to_dict()
+    lines = [
+        f"🐢 Slow request {profile.method} {profile.path} -> {profile.status}: {data['total_ms']:.0f} ms "
+        f"(handler {data['handler_ms']:.0f} ms: SQL {data['sql_ms']:.0f} ms in {profile.sql_count} queries, "
+        f"storage {data['storage_ms']:.0f} ms in {profile.storage_calls} calls; "
+        f"outside handler {data['outside_handler_ms']:.0f} ms)"
+    ]
+    for entry in data["repeated_queries"]:
+        lines.append(f"   🔁 {entry['count']}x ({entry['ms']:.0f} ms): {' '.join(entry['statement'].split())[:200]}")
+    if data["stacks"]:
+        lines.append(f"   hottest stack ({data['stacks'][0]['samples']} samples): {data['stacks'][0]['stack']}")
+    elif data["functions"]:
+        lines += [f"   {f['cumulative_ms']:>8.1f} ms  {f['function']}" for f in data["functions"][:5]]
+    elif not profile.sampled:
+        lines.append("   (not sampled for stacks; raise PROFILE_SAMPLE_RATE to get them)")
+    log.warning("\n".join(lines), extra={"total_ms": data["total_ms"], "sql_count": profile.sql_count})
+
+
+class ProfilingMiddleware:
+    """Plain ASGI middleware, like MetricsMiddleware: opens a Profile per HTTP
+    request, then keeps it in the GET /debug/profiles history."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            return await self.app(scope, receive, send)
+
+        sampled = PROFILE_MODE in ("sampler", "cprofile") and random.random() < PROFILE_SAMPLE_RATE
+        profile = Profile(scope["method"], scope["path"], sampled)
+        token = _current.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            profile.total_seconds = time.perf_counter() - profile.start
+            profile.route = getattr(scope.get("route"), "path", None)
+            _profiles.append(profile)
+            if profile.total_seconds * 1000 >= SLOW_REQUEST_MS:
+                report_slow(profile)
@@ -1,13 +1,174 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timezone
+import logging
+import os
+import random
 import time
-from .. import database, models, schemas
+from .. import cache, database, logs, metrics, models, profiling, schemas, timings
 from ..aggregation import aggregate_pytorch_weights
-from .front_job import upload_bytes_to_supabase
+from ..storage import get_storage
+from .front_job import upload_bytes_to_storage
 
 
-router = APIRouter()
+router = APIRouter(route_class=profiling.ProfiledRoute)
+log = logging.getLogger(__name__)
+
+# How long a presigned result upload URL stays valid (seconds)
+RESULT_UPLOAD_TTL = int(os.getenv("RESULT_UPLOAD_TTL", "3600"))
+# A subtask that fails this many times fails its job (see fail_task)
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+
+def result_key_for(job_id: int, task_id: int) -> str:
+    # Path: jobs/{job_id}/results/{task_id}_model.pth
+    return f"jobs/{job_id}/results/{task_id}_model.pth"
+
+
+# ==========================================
+# SHARED BY THE SYNC AND ASYNC ENDPOINTS
+# ==========================================
+# Everything here works on loaded rows; the DB access itself lives in the
+# endpoints (below, and the async versions in hot_paths.py).
+
+# CLAIMING
+# A poll picks at random among the CLAIM_WINDOW oldest PENDING subtasks, so
+# concurrent agents rarely go for the same row. The claim is a conditional
+# UPDATE (only if still PENDING); a poll that loses one anyway tries another
+# it hasn't lost yet, up to CLAIM_ATTEMPTS times.
+CLAIM_WINDOW = int(os.getenv("CLAIM_WINDOW", "32"))
+CLAIM_ATTEMPTS = 3
+
+def claim_candidates(lost: set):
+    """SELECT of the PENDING subtasks a poll chooses from, minus the ones it already lost."""
+    query = select(models.Subtask).where(models.Subtask.status == "PENDING")
+    if lost:
+        query = query.where(models.Subtask.id.not_in(lost))
+    return query.order_by(models.Subtask.id).limit(CLAIM_WINDOW)
+
+def pick_candidate(candidates: list):
+    return random.choice(candidates) if candidates else None
+
+def claim_statement(subtask_id: int, agent_id: str):
+    """Marks the subtask RUNNING for agent_id; matches no row if someone else claimed it first."""
+    return (
+        update(models.Subtask)
+        .where(models.Subtask.id == subtask_id, models.Subtask.status == "PENDING")
+        .values(status="RUNNING", assigned_to=agent_id, started_at=datetime.now(timezone.utc))
+    )
+
+
+def observe_claim(subtask, claim_start: float):
+    metrics.TASK_CLAIM_SECONDS.observe(time.perf_counter() - claim_start, result="claimed")
+    metrics.subtask_moved("PENDING", "RUNNING")
+    pending_seconds = metrics.seconds_since(subtask.created_at)
+    if pending_seconds is not None:
+        metrics.SUBTASK_STATE_SECONDS.observe(pending_seconds, state="PENDING")
+
+
+def task_instructions(job, subtask) -> dict:
+    """The request_task response for a claimed subtask."""
+    # PRESIGN THE RESULT UPLOAD
+    # The agent PUTs model.pth straight to storage, so the file never passes through us.
+    # If presigning fails the agent falls back to /agent/upload_result.
+    result_key = result_key_for(job.id, subtask.id)
+    try:
+        result_upload_url = get_storage().presign(result_key, method="PUT", expires_in=RESULT_UPLOAD_TTL)
+    except Exception as e:
+        log.warning(f"⚠️ Could not presign result upload: {e}")
+        result_upload_url = None
+
+    log.info("🚀 Subtask assigned")
+    
+    return {
+        "task_id": subtask.id,
+        "job_id": job.id,
+        "code_url": job.original_code_url,      # The Python Script
+        "requirements_url": job.original_req_url, # The Pip packages
+        "chunk_data_url": subtask.chunk_file_url,  # The specific slice of data
+        "chunk_format": subtask.chunk_format or "csv",
+        "result_upload_url": result_upload_url,
+        "result_key": result_key if result_upload_url else None,
+        "reference_url": job.reference_weights_url,
+        "update_encoding": job.update_encoding or "full",
+        "update_topk_ratio": job.update_topk_ratio
+    }
+
+
+def check_result_upload(subtask, data: schemas.TaskComplete):
+    """
+    For direct-to-storage uploads: the object must exist and match the size
+    and hash the agent reported, otherwise 409. The subtask stays RUNNING
+    until the agent gives it back through fail_task, which requeues it.
+    Talks to storage, so the async endpoint runs it on the threadpool.
+    """
+    if not data.result_key or data.result_key != result_key_for(subtask.job_id, subtask.id):
+        return # No direct upload, or a foreign key apply_completion rejects
+    if subtask.assigned_to != data.agent_id:
+        return # apply_completion rejects it; don't touch storage for it
+
+    storage = get_storage()
+    size = storage.size(data.result_key)
+    if size is None:
+        raise HTTPException(status_code=409, detail="Result was not uploaded")
+    if data.result_size is not None and size != data.result_size:
+        raise HTTPException(status_code=409, detail=f"Uploaded result is {size} bytes, expected {data.result_size}")
+    if data.result_sha256 and storage.sha256(data.result_key) != data.result_sha256.lower():
+        raise HTTPException(status_code=409, detail="Uploaded result does not match its SHA-256")
+
+
+def apply_completion(subtask, data: schemas.TaskComplete) -> str:
+    """Checks the agent's report and marks the subtask COMPLETED. Returns its previous status."""
+    # Security Check: Ensure this agent was actually the one assigned
+    if subtask.assigned_to != data.agent_id:
+        raise HTTPException(status_code=400, detail="This task was not assigned to you")
+    if subtask.status == "CANCELLED":
+        raise HTTPException(status_code=409, detail="This task was cancelled")
+
+    # RESOLVE THE RESULT LOCATION
+    # Direct-to-storage uploads send the key; only accept the key we presigned.
+    result_url = data.result_url
+    if data.result_key:
+        if data.result_key != result_key_for(subtask.job_id, subtask.id):
+            raise HTTPException(status_code=400, detail="Result key does not match this task")
+        result_url = get_storage().url_for(data.result_key)
+
+    # UPDATE SUBTASK STATUS
+    previous_status = subtask.status
+    subtask.status = "COMPLETED"
+    subtask.result_file_url = result_url
+    subtask.result_size = data.result_size
+    subtask.result_sha256 = data.result_sha256
+    subtask.completed_at = datetime.now(timezone.utc)
+    timings.record_timings(subtask, data.timings, data.peak_memory_bytes, data.cpu_seconds)
+    return previous_status
+
+
+def observe_completion(subtask, previous_status: str):
+    metrics.subtask_moved(previous_status, "COMPLETED")
+    if previous_status == "RUNNING" and subtask.started_at is not None:
+        metrics.SUBTASK_STATE_SECONDS.observe(metrics.seconds_since(subtask.started_at), state="RUNNING")
+    for phase in timings.PHASES:
+        seconds = getattr(subtask, timings.phase_column(phase))
+        if seconds is not None:
+            metrics.SUBTASK_PHASE_SECONDS.observe(seconds, phase=phase)
+
+
+def aggregate_job(parent_job, db: Session):
+    """Runs FedAvg for a finished job and stores the final model URL (failures are logged)."""
+    try:
+        aggregation_start = time.perf_counter()
+        final_url = aggregate_pytorch_weights(parent_job.id, db)
+        metrics.AGGREGATION_SECONDS.observe(time.perf_counter() - aggregation_start, result="ok")
+        parent_job.final_result_url = final_url
+        db.commit()  # Commit the job status and final URL
+        cache.invalidate_job(parent_job.id, parent_job.owner_id)
+        log.info("✅ Aggregation complete", extra={"final_result_url": final_url})
+    except Exception as e:
+        metrics.AGGREGATION_SECONDS.observe(time.perf_counter() - aggregation_start, result="error")
+        log.exception(f"❌ Aggregation Failed: {e}")
+
 
 @router.post("/register")
 def register_agent(data: schemas.AgentRegister, db: Session = Depends(database.get_db)):
@@ -17,14 +178,14 @@ def register_agent(data: schemas.AgentRegister, db: Session = Depends(database.g
     
     # 1. FIND THE HUMAN OWNER
     # We use the email provided by the script to find the User ID
+    logs.bind(agent_id=data.id)
     raw_email = data.email
     clean_email = raw_email.strip().strip('"').strip("'").lower()
-    print(f"DEBUG: Registering agent with email: '{clean_email}' (Original: '{raw_email}')")
     
     owner = db.query(models.User).filter(models.User.email == clean_email).first()
-    print(f"DEBUG: Owner found: {owner}")
     
     if not owner:
+        log.warning("Agent registration for unknown owner email", extra={"email": clean_email})
         # If the email doesn't exist, the agent can't register
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
@@ -47,6 +208,9 @@ def register_agent(data: schemas.AgentRegister, db: Session = Depends(database.g
         agent.last_heartbeat = current_time
         
         db.commit()
+        cache.invalidate("agents")
+        metrics.agent_seen(data.id, "IDLE")
+        log.info("🔗 Agent re-registered", extra={"owner_id": owner.id})
         return {"message": f"Welcome back, Agent {data.id}", "status": "linked"}
 
     else:
@@ -63,6 +227,9 @@ def register_agent(data: schemas.AgentRegister, db: Session = Depends(database.g
         
         db.add(new_agent)
         db.commit()
+        cache.invalidate("agents")
+        metrics.agent_seen(data.id, "IDLE")
+        log.info("🆕 Agent registered", extra={"owner_id": owner.id})
         return {"message": f"New Agent {data.id} registered!", "status": "created"}
 
 
@@ -71,6 +238,7 @@ def report_heartbeat(beat: schemas.AgentHeartbeat, db: Session = Depends(databas
     """
     Updates the 'last_heartbeat' timestamp and status of an agent.
     """
+    logs.bind(agent_id=beat.id)
     # 1. Find the agent in the DB
     agent = db.query(models.Agent).filter(models.Agent.id == beat.id).first()
 
@@ -84,8 +252,24 @@ def report_heartbeat(beat: schemas.AgentHeartbeat, db: Session = Depends(databas
 
     # 4. Save changes
     db.commit()
+    metrics.agent_seen(beat.id, beat.status)
+    if keep := logs.sampled("heartbeat"):
+        log.info("💓 Heartbeat", extra={**keep, "status": beat.status, "running_tasks": len(beat.running_tasks or [])})
 
-    return {"message": "Heartbeat received", "server_time": agent.last_heartbeat}
+    # 5. TELL THE AGENT WHICH OF ITS TASKS TO DROP
+    # Anything no longer RUNNING on this agent (job cancelled, finished by another agent, ...)
+    cancel_tasks = []
+    if beat.running_tasks:
+        still_running = {
+            subtask.id for subtask in db.query(models.Subtask).filter(
+                models.Subtask.id.in_(beat.running_tasks),
+                models.Subtask.status == "RUNNING",
+                models.Subtask.assigned_to == beat.id
+            )
+        }
+        cancel_tasks = [task_id for task_id in beat.running_tasks if task_id not in still_running]
+
+    return {"message": "Heartbeat received", "server_time": agent.last_heartbeat, "cancel_tasks": cancel_tasks}
 
 # In routers/agent.py
 
@@ -95,48 +279,116 @@ def request_task(data: schemas.TaskRequest, db: Session = Depends(database.get_d
     Agent asks: "Is there any work?"
     Server checks for PENDING subtasks.
     """
-    
-    # 1. FIND A PENDING SUBTASK
-    # We lock the first one we find that hasn't been started yet
+    logs.bind(agent_id=data.agent_id)
+    claim_start = time.perf_counter()
+
+    # 1. FIND A PENDING SUBTASK AND CLAIM IT
     # (Optional: You could filter by GPU requirements here later)
-    subtask = db.query(models.Subtask).filter(
-        models.Subtask.status == "PENDING"
-    ).first()
+    # The claim only succeeds if the row is still PENDING: another request
+    # may have claimed it since we read it (see CLAIMING above)
+    lost = set()
+    for _ in range(CLAIM_ATTEMPTS):
+        subtask = pick_candidate(db.execute(claim_candidates(lost)).scalars().all())
+        if not subtask:
+            break
+        # Get the parent Job to access the Code/Req URLs (before the UPDATE takes the write lock)
+        job = subtask.job
+        agent = db.query(models.Agent).filter(models.Agent.id == data.agent_id).first()
+
+        subtask_id = subtask.id
+        if db.execute(claim_statement(subtask_id, data.agent_id)).rowcount == 1:
+            break
+        db.rollback() # Another agent got it first (expires the rows we read)
+        lost.add(subtask_id)
+    else:
+        subtask = None
 
     # 2. IF NO WORK, RETURN EMPTY
     if not subtask:
+        metrics.TASK_CLAIM_SECONDS.observe(time.perf_counter() - claim_start, result="empty")
+        if keep := logs.sampled("poll"):
+            log.info("💤 No pending subtask", extra=keep)
         return {"task_id": None}
 
-    # 3. IF WORK FOUND: ASSIGN IT TO AGENT
-    # Get the parent Job to access the Code/Req URLs
-    job = subtask.job 
-    
     # Check if parent job is valid (sanity check)
     if not job:
+        db.rollback()
         return {"task_id": None}
+    logs.bind(job_id=job.id, subtask_id=subtask.id)
 
-    # 4. UPDATE DATABASE (Lock the task)
-    subtask.status = "RUNNING"
-    subtask.assigned_to = data.agent_id
-    subtask.assigned_agent_id = data.agent_id # Redundant but safe if you have this col
-    
-    # Also update the Agent status to BUSY
-    agent = db.query(models.Agent).filter(models.Agent.id == data.agent_id).first()
+    # 3. Also update the Agent status to BUSY
     if agent:
         agent.status = "BUSY"
 
     db.commit()
+    observe_claim(subtask, claim_start)
 
-    # 5. RETURN THE INSTRUCTIONS
-    print(f"🚀 Assigning Subtask {subtask.id} to Agent {data.agent_id}")
-    
-    return {
-        "task_id": subtask.id,
-        "job_id": job.id,
-        "code_url": job.original_code_url,      # The Python Script
-        "requirements_url": job.original_req_url, # The Pip packages
-        "chunk_data_url": subtask.chunk_file_url  # The specific slice of data
-    }
+    # 4. RETURN THE INSTRUCTIONS (with a presigned result upload)
+    return task_instructions(job, subtask)
+
+@router.post("/fail_task")
+def fail_task(data: schemas.TaskFailed, db: Session = Depends(database.get_db)):
+    """
+    Agent reports a task that did not succeed (timeout, limit, crash, or a
+    result that never reached storage) instead of completing it. Nothing of
+    the run is kept: the subtask goes back to PENDING for another agent, or
+    after TASK_MAX_ATTEMPTS failures it fails, and so does its job.
+    """
+    logs.bind(agent_id=data.agent_id, subtask_id=data.task_id)
+    subtask = db.query(models.Subtask).filter(models.Subtask.id == data.task_id).first()
+    if not subtask:
+        raise HTTPException(status_code=404, detail="Subtask not found")
+    logs.bind(job_id=subtask.job_id)
+    if subtask.status != "RUNNING":
+        raise HTTPException(status_code=409, detail="This task is no longer running")
+    if subtask.assigned_to != data.agent_id:
+        raise HTTPException(status_code=400, detail="This task was not assigned to you")
+
+    failures = (subtask.failures or 0) + 1
+    requeue = failures < TASK_MAX_ATTEMPTS
+    new_status = "PENDING" if requeue else "FAILED"
+    # Only if still RUNNING: the job may have been cancelled meanwhile
+    moved = db.execute(
+        update(models.Subtask)
+        .where(models.Subtask.id == subtask.id, models.Subtask.status == "RUNNING",
+               models.Subtask.assigned_to == data.agent_id)
+        .values(status=new_status, failures=failures,
+                assigned_to=None if requeue else data.agent_id,
+                started_at=None if requeue else subtask.started_at,
+                completed_at=None if requeue else datetime.now(timezone.utc))
+    ).rowcount
+    if not moved:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="This task is no longer running")
+
+    # The job can't complete without this subtask: stop handing out the rest
+    job = db.query(models.Job).filter(models.Job.id == subtask.job_id).first()
+    cancelled = {}
+    if not requeue and job:
+        for state in ("PENDING", "RUNNING"):
+            cancelled[state] = db.query(models.Subtask).filter(
+                models.Subtask.job_id == job.id,
+                models.Subtask.status == state
+            ).update({"status": "CANCELLED"}, synchronize_session=False)
+        job.status = "FAILED"
+
+    agent = db.query(models.Agent).filter(models.Agent.id == data.agent_id).first()
+    if agent:
+        agent.status = "IDLE"
+        agent.last_heartbeat = datetime.now(timezone.utc)
+    db.commit()
+
+    if job:
+        cache.invalidate_job(job.id, job.owner_id)
+    metrics.subtask_moved("RUNNING", new_status)
+    for state, count in cancelled.items():
+        metrics.subtask_moved(state, "CANCELLED", count)
+    extra = {"reason": data.reason, "failures": failures, "detail": (data.message or "")[-500:]}
+    if requeue:
+        log.warning("⚠️ Subtask failed, back to PENDING", extra=extra)
+    else:
+        log.error("❌ Subtask failed too often, job FAILED", extra=extra)
+    return {"task_id": subtask.id, "status": new_status, "failures": failures}
 
 @router.post("/upload_result")
 async def upload_result(
@@ -155,15 +407,17 @@ async def upload_result(
         
     # Optional: Verify agent_id matches subtask.assigned_to 
     
-    # 2. Read File
-    file_bytes = await file.read()
-    
-    # 3. Upload to Supabase
-    # Path: jobs/{job_id}/results/{task_id}_model.pth
-    file_path = f"jobs/{subtask.job_id}/results/{task_id}_model.pth"
+    # 2. Upload to Storage
+    # Stream the spooled upload in chunks from the threadpool instead of read()-ing it
+    # into memory and blocking the event loop.
+    file_path = result_key_for(subtask.job_id, task_id)
+    # Hand the DB connection back before the slow part. Holding it while we wait for a
+    # threadpool slot deadlocks under load: the threadpool's requests wait for
+    # connections that requests like this one hold (found with bench_scheduler.py).
+    db.close()
     
     # We use application/octet-stream for .pth files
-    url = upload_bytes_to_supabase(file_bytes, file_path, "application/octet-stream")
+    url = await run_in_threadpool(upload_bytes_to_storage, file.file, file_path, "application/octet-stream")
     
     return {"url": url}
 
@@ -178,19 +432,16 @@ def complete_task(data: schemas.TaskComplete, db: Session = Depends(database.get
     """
     
     # 1. FIND THE SUBTASK
+    logs.bind(agent_id=data.agent_id, subtask_id=data.task_id)
     subtask = db.query(models.Subtask).filter(models.Subtask.id == data.task_id).first()
     
     if not subtask:
         raise HTTPException(status_code=404, detail="Subtask not found")
-        
-    # Security Check: Ensure this agent was actually the one assigned
-    if subtask.assigned_to != data.agent_id:
-        raise HTTPException(status_code=400, detail="This task was not assigned to you")
+    logs.bind(job_id=subtask.job_id)
 
-    # 2. UPDATE SUBTASK STATUS
-    subtask.status = "COMPLETED"
-    subtask.result_file_url = data.result_url
-    subtask.completed_at = datetime.now(timezone.utc)
+    # 2. CHECK THE REPORT & UPDATE SUBTASK STATUS
+    check_result_upload(subtask, data)
+    previous_status = apply_completion(subtask, data)
     
     # 3. FREE THE AGENT
     agent = db.query(models.Agent).filter(models.Agent.id == data.agent_id).first()
@@ -201,6 +452,8 @@ def complete_task(data: schemas.TaskComplete, db: Session = Depends(database.get
     # CRITICAL: Commit the status update BEFORE checking if all tasks are done
     # Otherwise the query won't see this task as COMPLETED yet!
     db.commit()
+    cache.invalidate(f"job:{subtask.job_id}") # Its progress changed
+    observe_completion(subtask, previous_status)
 
     # 4. CHECK IF PARENT JOB IS DONE
     # We count how many subtasks are NOT completed yet for this job
@@ -209,27 +462,18 @@ def complete_task(data: schemas.TaskComplete, db: Session = Depends(database.get
         models.Subtask.status != "COMPLETED"
     ).count()
     
-    print(f"🔍 Job {subtask.job_id}: {remaining_tasks} tasks remaining")
+    log.info("✅ Subtask completed", extra={"remaining_subtasks": remaining_tasks})
     
     if remaining_tasks == 0:
         # All tasks are done! Mark the Job as COMPLETED.
         parent_job = db.query(models.Job).filter(models.Job.id == subtask.job_id).first()
         if parent_job:
             parent_job.status = "COMPLETED"
-            print(f"🎉 Job {parent_job.id} is fully COMPLETE!")
+            log.info("🎉 Job complete, starting aggregation")
             
             # TRIGGER AGGREGATION
-            try:
-                print(f"🔄 Starting aggregation for job {parent_job.id}...")
-                final_url = aggregate_pytorch_weights(parent_job.id, db)
-                parent_job.final_result_url = final_url
-                db.commit()  # Commit the job status and final URL
-                print(f"✅ Aggregation complete! Final model: {final_url}")
-            except Exception as e:
-                print(f"❌ Aggregation Failed: {e}")
-                import traceback
-                traceback.print_exc()
+            aggregate_job(parent_job, db)
         else:
-            print(f"⚠️  Parent job {subtask.job_id} not found!")
+            log.warning("⚠️ Parent job not found")
     
     return {"message": "Task marked as completed. Good job!"}
\ No newline at end of file
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Query
+from .. import profiling
+
+router = APIRouter()
+
+
+@router.get("/profiles")
+def get_profiles(limit: int = Query(20, ge=1, le=1000), min_ms: float = 0, route: str = None):
+    """
+    Last request profiles, newest first (only mounted with PROFILING=true).
+    Filter with ?min_ms=500 for slow ones or ?route=/agent/request_task.
+    """
+    profiles = [p for p in profiling.recent(profiling.PROFILE_HISTORY)
+                if p.total_seconds * 1000 >= min_ms and (route is None or p.route == route)]
+    return {
+        "mode": profiling.PROFILE_MODE,
+        "sample_rate": profiling.PROFILE_SAMPLE_RATE,
+        "slow_request_ms": profiling.SLOW_REQUEST_MS,
+        "slow_query_ms": profiling.SLOW_QUERY_MS,
+        "profiles": [p.to_dict() for p in profiles[:limit]],
+    }
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import tempfile
+from .. import profiling
+from ..storage import get_storage, verify_signature, LocalStorage, MemoryStorage, StorageError
+
+router = APIRouter(route_class=profiling.ProfiledRoute)
+
+# ==========================================
+# STATIC FILE SERVER FOR LOCAL/MEMORY STORAGE
+# ==========================================
+# When STORAGE_BACKEND is "local" or "memory", the URLs we hand to workers
+# point here instead of Supabase, so the whole pipeline runs on one box.
+
+def _served_storage():
+    storage = get_storage()
+    if not isinstance(storage, (LocalStorage, MemoryStorage)):
+        raise HTTPException(status_code=404, detail="File serving is only enabled for local storage")
+    return storage
+
+
+def _check_signature(key: str, method: str, expires: int = None, sig: str = None):
+    """Signature is optional for GET (public bucket semantics), mandatory otherwise."""
+    if sig is None and method == "GET":
+        return
+    if sig is None or expires is None or not verify_signature(key, method, expires, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+
+
+def _parse_range(header: str, size: int):
+    """Single "bytes=start-end" range -> (start, end) inclusive, or None if unusable."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, _, end = header[len("bytes="):].partition("-")
+    try:
+        if start == "":
+            # Suffix range: the last N bytes
+            return max(size - int(end), 0), size - 1
+        return int(start), min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+
+
+def _memory_response(storage: MemoryStorage, key: str, range_header: str = None):
+    """Memory backend: same Range behaviour FileResponse gives the local one."""
+    data = storage.get(key)
+    byte_range = _parse_range(range_header, len(data))
+    if byte_range is None:
+        return StreamingResponse(storage.stream(key), media_type="application/octet-stream",
+                                 headers={"Accept-Ranges": "bytes", "Content-Length": str(len(data))})
+    start, end = byte_range
+    if start >= len(data) or start > end:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{len(data)}"})
+    return Response(data[start:end + 1], status_code=206, media_type="application/octet-stream",
+                    headers={"Accept-Ranges": "bytes", "Content-Range": f"bytes {start}-{end}/{len(data)}"})
+
+
+@router.get("/{key:path}")
+def download_file(key: str, request: Request, expires: int = None, sig: str = None):
+    storage = _served_storage()
+    _check_signature(key, "GET", expires, sig)
+
+    try:
+        if not storage.exists(key):
+            raise HTTPException(status_code=404, detail="File not found")
+        if isinstance(storage, LocalStorage):
+            # FileResponse streams from disk and handles Range requests for us
+            return FileResponse(storage.path_for(key))
+        return _memory_response(storage, key, request.headers.get("range"))
+    except StorageError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.put("/{key:path}")
+async def upload_file(key: str, request: Request, expires: int = None, sig: str = None):
+    """
+    Presigned upload target (the local stand-in for a Supabase signed upload URL).
+    Workers PUT their result here directly instead of going through /agent/upload_result.
+    """
+    storage = _served_storage()
+    _check_signature(key, "PUT", expires, sig)
+
+    # Spool the body in chunks so a large upload never sits fully in memory
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        size = spool.tell()
+        spool.seek(0)
+        try:
+            url = await run_in_threadpool(storage.put, key, spool, request.headers.get("content-type", "application/octet-stream"))
+        except StorageError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return {"key": key, "size": size, "url": url}
@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
-from .. import models, database, schemas
+from .. import cache, models, database, profiling, schemas
 
-router = APIRouter()
+router = APIRouter(route_class=profiling.ProfiledRoute)
 
 @router.post("/register", response_model=schemas.UserResponse)
 def register_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
@@ -58,13 +58,17 @@ def login_user(user_credentials: schemas.UserLogin, db: Session = Depends(databa
     return user
 
 @router.get("/wallet/{user_id}")
-def get_wallet_balance(user_id: int, db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-        
-    return {
-        "user_id": user.id,
-        "credits": user.credits,
-        "role": user.role
-    }
\ No newline at end of file
+def get_wallet_balance(user_id: int, request: Request, db: Session = Depends(database.get_db)):
+    # Cached (app/cache.py): whatever changes credits must call cache.invalidate(f"user:{user_id}:wallet")
+    def build():
+        user = db.query(models.User).filter(models.User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+            
+        return {
+            "user_id": user.id,
+            "credits": user.credits,
+            "role": user.role
+        }
+
+    return cache.respond(request, "wallet", (user_id,), [f"user:{user_id}:wallet"], build)
\ No newline at end of file
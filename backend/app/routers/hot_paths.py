@@ -0,0 +1,201 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timedelta, timezone
+from typing import List
+import logging
+import time
+from .. import cache, database, logs, metrics, models, profiling, schemas
+from . import agent
+
+# ==========================================
+# ASYNC HOT PATHS
+# ==========================================
+# Async versions of the endpoints every agent hits all the time (heartbeat,
+# request_task, complete_task) and the status reads dashboards poll. They use
+# the async engine (database.get_async_db), so a request waiting on the
+# database doesn't hold one of the threadpool's 40 threads; with sync
+# handlers, a few hundred polling agents queue for a thread even when the
+# database is idle.
+#
+# main.py mounts this router before the others when ASYNC_DB is on, so these
+# routes take precedence over the sync ones in agent.py / front_job.py /
+# sellers.py (which stay as the ASYNC_DB=false path). Request handling that
+# doesn't touch the database is shared with agent.py.
+#
+# Anything blocking stays off the event loop: presigning (a network call on
+# Supabase) and aggregation (torch) run on the threadpool.
+
+router = APIRouter(route_class=profiling.ProfiledRoute)
+log = logging.getLogger(__name__)
+
+
+@router.post("/agent/heartbeat")
+async def report_heartbeat(beat: schemas.AgentHeartbeat, db: AsyncSession = Depends(database.get_async_db)):
+    """Async version of agent.report_heartbeat."""
+    logs.bind(agent_id=beat.id)
+    agent_row = await db.get(models.Agent, beat.id)
+    if not agent_row:
+        raise HTTPException(status_code=404, detail="Agent not registered")
+
+    agent_row.last_heartbeat = datetime.now(timezone.utc)
+    agent_row.status = beat.status
+    await db.commit()
+    metrics.agent_seen(beat.id, beat.status)
+    if keep := logs.sampled("heartbeat"):
+        log.info("💓 Heartbeat", extra={**keep, "status": beat.status, "running_tasks": len(beat.running_tasks or [])})
+
+    # Tasks no longer RUNNING on this agent (job cancelled, finished elsewhere, ...)
+    cancel_tasks = []
+    if beat.running_tasks:
+        still_running = set((await db.execute(
+            select(models.Subtask.id).where(
+                models.Subtask.id.in_(beat.running_tasks),
+                models.Subtask.status == "RUNNING",
+                models.Subtask.assigned_to == beat.id
+            )
+        )).scalars())
+        cancel_tasks = [task_id for task_id in beat.running_tasks if task_id not in still_running]
+
+    return {"message": "Heartbeat received", "server_time": agent_row.last_heartbeat, "cancel_tasks": cancel_tasks}
+
+
+@router.post("/agent/request_task", response_model=schemas.TaskResponse)
+async def request_task(data: schemas.TaskRequest, db: AsyncSession = Depends(database.get_async_db)):
+    """
+    Async version of agent.request_task (same claim: a random pick among the
+    oldest PENDING subtasks, then a conditional UPDATE, see agent.CLAIMING).
+    """
+    logs.bind(agent_id=data.agent_id)
+    claim_start = time.perf_counter()
+
+    lost = set()
+    for _ in range(agent.CLAIM_ATTEMPTS):
+        subtask = agent.pick_candidate((await db.execute(agent.claim_candidates(lost))).scalars().all())
+        if not subtask:
+            break
+        # Read before the UPDATE: from there until commit we hold SQLite's write lock
+        job = await db.get(models.Job, subtask.job_id)
+        agent_row = await db.get(models.Agent, data.agent_id)
+
+        subtask_id = subtask.id
+        claimed = await db.execute(agent.claim_statement(subtask_id, data.agent_id))
+        if claimed.rowcount == 1:
+            break
+        await db.rollback() # Another agent got it first (expires the rows we read)
+        lost.add(subtask_id)
+    else:
+        subtask = None
+
+    if not subtask:
+        metrics.TASK_CLAIM_SECONDS.observe(time.perf_counter() - claim_start, result="empty")
+        if keep := logs.sampled("poll"):
+            log.info("💤 No pending subtask", extra=keep)
+        return {"task_id": None}
+
+    if not job:
+        await db.rollback()
+        return {"task_id": None}
+    logs.bind(job_id=job.id, subtask_id=subtask.id)
+
+    if agent_row:
+        agent_row.status = "BUSY"
+
+    await db.commit()
+    agent.observe_claim(subtask, claim_start)
+
+    # Presigning is a network call on Supabase
+    return await run_in_threadpool(agent.task_instructions, job, subtask)
+
+
+def finish_job(job_id: int):
+    """Marks the job COMPLETED and aggregates it, on a threadpool thread with a sync session."""
+    db = database.SessionLocal()
+    try:
+        parent_job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if not parent_job:
+            log.warning("⚠️ Parent job not found")
+            return
+        parent_job.status = "COMPLETED"
+        log.info("🎉 Job complete, starting aggregation")
+        agent.aggregate_job(parent_job, db)
+    finally:
+        db.close()
+
+
+@router.post("/agent/complete_task")
+async def complete_task(data: schemas.TaskComplete, db: AsyncSession = Depends(database.get_async_db)):
+    """Async version of agent.complete_task."""
+    logs.bind(agent_id=data.agent_id, subtask_id=data.task_id)
+    subtask = await db.get(models.Subtask, data.task_id)
+    if not subtask:
+        raise HTTPException(status_code=404, detail="Subtask not found")
+    logs.bind(job_id=subtask.job_id)
+
+    await run_in_threadpool(agent.check_result_upload, subtask, data)
+    previous_status = agent.apply_completion(subtask, data)
+
+    agent_row = await db.get(models.Agent, data.agent_id)
+    if agent_row:
+        agent_row.status = "IDLE"
+        agent_row.last_heartbeat = datetime.now(timezone.utc)
+
+    # Commit BEFORE counting, so this subtask counts as COMPLETED
+    await db.commit()
+    cache.invalidate(f"job:{subtask.job_id}") # Its progress changed
+    agent.observe_completion(subtask, previous_status)
+
+    remaining_tasks = await db.scalar(
+        select(func.count()).select_from(models.Subtask).where(
+            models.Subtask.job_id == subtask.job_id,
+            models.Subtask.status != "COMPLETED"
+        )
+    )
+    log.info("✅ Subtask completed", extra={"remaining_subtasks": remaining_tasks})
+
+    if remaining_tasks == 0:
+        await run_in_threadpool(finish_job, subtask.job_id)
+
+    return {"message": "Task marked as completed. Good job!"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: int, request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    """Async version of front_job.get_job_status (same cache entries)."""
+    return await cache.respond_async(request, "job_status", (job_id,), [f"job:{job_id}"],
+                                     lambda: job_status(job_id, db))
+
+
+async def job_status(job_id: int, db: AsyncSession) -> dict:
+    job = await db.get(models.Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    total_subtasks, completed_subtasks = (await db.execute(
+        select(func.count(), func.count().filter(models.Subtask.status == "COMPLETED"))
+        .where(models.Subtask.job_id == job_id)
+    )).one()
+
+    return {
+        "id": job.id,
+        "title": job.title,
+        "status": job.status,
+        "created_at": job.created_at,
+        "final_result_url": job.final_result_url,
+        "total_subtasks": total_subtasks,
+        "completed_subtasks": completed_subtasks
+    }
+
+
+@router.get("/stats/agents/online", response_model=List[schemas.AgentList])
+async def get_online_agents(request: Request, db: AsyncSession = Depends(database.get_async_db)):
+    """Async version of sellers.get_online_agents (same cache entries)."""
+    async def build():
+        five_mins_ago = datetime.now(timezone.utc) - timedelta(minutes=5)
+        return (await db.execute(
+            select(models.Agent).where(models.Agent.last_heartbeat >= five_mins_ago)
+        )).scalars().all()
+
+    return await cache.respond_async(request, "agents_online", (), ["agents"], build,
+                                     model=List[schemas.AgentList], ttl=cache.CACHE_AGENTS_TTL_SECONDS)
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+from .. import database, metrics, profiling
+
+router = APIRouter(route_class=profiling.ProfiledRoute)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(db: Session = Depends(database.get_db)):
+    """
+    Prometheus scrape endpoint. Formats in-process counters; queue sizes are
+    re-synced from the database at most every METRICS_RESYNC_SECONDS.
+    """
+    metrics.resync_subtasks(db)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,27 +1,30 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
 from typing import List
 from sqlalchemy.orm import Session
-from .. import database, models, schemas
+from .. import cache, database, models, profiling, schemas, timings
 from datetime import datetime, timedelta, timezone
 
-router = APIRouter()
+router = APIRouter(route_class=profiling.ProfiledRoute)
 
 @router.get("/agents/online", response_model=List[schemas.AgentList])
-def get_online_agents(db: Session = Depends(database.get_db)):
+def get_online_agents(request: Request, db: Session = Depends(database.get_db)):
     """
     Returns a list of all agents that have sent a heartbeat recently.
+    Cached for CACHE_AGENTS_TTL_SECONDS (see app/cache.py).
     """
-    # 1. Define "Online"
-    # If an agent hasn't pinged in 5 minutes, we consider them OFFLINE.
-    five_mins_ago = datetime.now(timezone.utc) - timedelta(minutes=5)
-    
-    # 2. Query the DB
-    # We want agents who have updated their 'last_heartbeat' recently
-    active_agents = db.query(models.Agent).filter(
-        models.Agent.last_heartbeat >= five_mins_ago
-    ).all()
+    def build():
+        # 1. Define "Online"
+        # If an agent hasn't pinged in 5 minutes, we consider them OFFLINE.
+        five_mins_ago = datetime.now(timezone.utc) - timedelta(minutes=5)
+        
+        # 2. Query the DB
+        # We want agents who have updated their 'last_heartbeat' recently
+        return db.query(models.Agent).filter(
+            models.Agent.last_heartbeat >= five_mins_ago
+        ).all()
 
-    return active_agents
+    return cache.respond(request, "agents_online", (), ["agents"], build,
+                         model=List[schemas.AgentList], ttl=cache.CACHE_AGENTS_TTL_SECONDS)
 
 
 @router.get("/seller-tasks/{user_id}", response_model=schemas.SellerTaskResponse)
@@ -52,4 +55,24 @@ def get_user_agents(user_id: int, db: Session = Depends(database.get_db)):
     return {
         "user_id": user_id,
         "agents": agents
-    }
\ No newline at end of file
+    }
+
+@router.get("/agents/{agent_id}/timings")
+def get_agent_timings(agent_id: str, limit: int = 100, db: Session = Depends(database.get_db)):
+    """
+    Phase timings of the agent's most recent completed subtasks (see app/timings.py):
+    is this machine slow to download, to set up, or to compute?
+    """
+    if not db.query(models.Agent).filter(models.Agent.id == agent_id).first():
+        raise HTTPException(status_code=404, detail="Agent not found")
+
+    subtasks = db.query(models.Subtask).filter(
+        models.Subtask.assigned_to == agent_id,
+        models.Subtask.status == "COMPLETED"
+    ).order_by(models.Subtask.completed_at.desc()).limit(max(1, min(limit, 1000))).all()
+
+    return {
+        "agent_id": agent_id,
+        "summary": timings.summarize(subtasks),
+        "subtasks": [timings.subtask_timings(subtask) for subtask in subtasks],
+    }
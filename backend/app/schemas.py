@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 
 class UserCreate(BaseModel):
@@ -41,7 +41,7 @@ class JobResponse(BaseModel):
 
 class AgentList(BaseModel):
     id: str           # e.g. "agent_550e..."
-    status: str       # IDLE, BUSY, OFFLINE
+    status: str       # IDLE, BUSY, WARMING, OFFLINE
     gpu_model: Optional[str] = "Unknown"
     ram_total: Optional[str] = "Unknown"
     last_heartbeat: datetime
@@ -51,7 +51,8 @@ class AgentList(BaseModel):
 
 class AgentHeartbeat(BaseModel):
     id: str           # The Agent's ID (e.g., "agent_550e...")
-    status: str       # Current state: "IDLE" or "BUSY" (or "WORKING")
+    status: str       # Current state: "IDLE" or "BUSY" (or "WORKING"), "WARMING" while starting up
+    running_tasks: List[int] = []  # Subtasks the agent currently holds (checked for cancellation)
 
 class AgentRegister(BaseModel):
     id: str             # The UUID generated by the script (e.g. "agent_550e...")
@@ -72,11 +73,37 @@ class TaskResponse(BaseModel):
     code_url: str | None = None
     requirements_url: str | None = None
     chunk_data_url: str | None = None
+    chunk_format: str | None = "csv"  # csv | parquet | arrow (worker still gets a data.csv)
+
+    # Presigned URL the agent PUTs model.pth to (skips /agent/upload_result)
+    result_upload_url: str | None = None
+    result_key: str | None = None
+
+    # Send a delta from these weights instead of the full model (see app/updates.py)
+    reference_url: str | None = None
+    update_encoding: str | None = "full"
+    update_topk_ratio: float | None = 0.01
 
 class TaskComplete(BaseModel):
     agent_id: str
     task_id: int
-    result_url: str  # The Supabase URL where the agent uploaded the result
+    result_url: Optional[str] = None  # The storage URL where the agent uploaded the result
+
+    # Direct-to-storage uploads report the key instead of a URL
+    result_key: Optional[str] = None
+    result_size: Optional[int] = None
+    result_sha256: Optional[str] = None
+
+    # Where the time went on the worker (see app/timings.py), plus sandbox resource usage
+    timings: Optional[Dict[str, float]] = None
+    peak_memory_bytes: Optional[int] = None
+    cpu_seconds: Optional[float] = None
+
+class TaskFailed(BaseModel):
+    agent_id: str
+    task_id: int
+    reason: str                    # timeout | cpu_limit | disk_limit | error | upload_failed | ...
+    message: Optional[str] = None  # Last log lines or the exception, for the job owner
 
 class JobResultResponse(BaseModel):
     job_id: int
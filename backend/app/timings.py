@@ -0,0 +1,82 @@
+from typing import Dict, List, Optional
+
+# ==========================================
+# SUBTASK PHASE TIMINGS
+# ==========================================
+# Workers measure where each subtask's time goes and report it in
+# complete_task. It is stored on the Subtask ({phase}_seconds columns) and
+# summarized per job (GET /jobs/{id}/timings) and per agent
+# (GET /stats/agents/{id}/timings):
+#   queue_wait      -> downloaded, waiting for a free slot on the worker (prefetch)
+#   download        -> code, requirements, data chunk (and reference weights)
+#   dependencies    -> dependency image / venv lookup or build
+#   container_start -> sandbox start (warm pool reuse, fresh container or process)
+#   training        -> the job's train.py
+#   upload          -> compressing and uploading the result
+# "pending" (created -> claimed by an agent) is measured by the backend itself.
+
+PHASES = ("queue_wait", "download", "dependencies", "container_start", "training", "upload")
+
+
+def phase_column(phase: str) -> str:
+    return f"{phase}_seconds"
+
+
+def record_timings(subtask, timings: Optional[Dict[str, float]], peak_memory_bytes: Optional[int], cpu_seconds: Optional[float]):
+    """Copies a worker's report onto the subtask, ignoring unknown phases and bogus values."""
+    for phase, seconds in (timings or {}).items():
+        if phase in PHASES and seconds is not None and seconds >= 0:
+            setattr(subtask, phase_column(phase), float(seconds))
+    if peak_memory_bytes is not None and peak_memory_bytes >= 0:
+        subtask.peak_memory_bytes = int(peak_memory_bytes)
+    if cpu_seconds is not None and cpu_seconds >= 0:
+        subtask.cpu_seconds = float(cpu_seconds)
+
+
+def pending_seconds(subtask) -> Optional[float]:
+    if subtask.created_at is None or subtask.started_at is None:
+        return None
+    return max(0.0, (subtask.started_at - subtask.created_at).total_seconds())
+
+
+def subtask_timings(subtask) -> dict:
+    phases = {"pending": pending_seconds(subtask)}
+    phases.update({phase: getattr(subtask, phase_column(phase)) for phase in PHASES})
+    return {
+        "task_id": subtask.id,
+        "job_id": subtask.job_id,
+        "agent_id": subtask.assigned_to,
+        "status": subtask.status,
+        "phases": phases,
+        "peak_memory_bytes": subtask.peak_memory_bytes,
+        "cpu_seconds": subtask.cpu_seconds,
+    }
+
+
+def summarize(subtasks: List) -> dict:
+    """
+    Per phase: how many subtasks reported it, mean / max seconds and its share of
+    the reported total. The share says whether to work on transfers, setup or compute.
+    """
+    rows = [subtask_timings(subtask) for subtask in subtasks]
+    phases = {}
+    for phase in ("pending",) + PHASES:
+        values = [row["phases"][phase] for row in rows if row["phases"][phase] is not None]
+        phases[phase] = {
+            "count": len(values),
+            "mean_seconds": round(sum(values) / len(values), 3) if values else None,
+            "max_seconds": round(max(values), 3) if values else None,
+            "total_seconds": round(sum(values), 3),
+        }
+    worker_total = sum(phases[phase]["total_seconds"] for phase in PHASES)
+    for phase in PHASES:
+        phases[phase]["share"] = round(phases[phase]["total_seconds"] / worker_total, 3) if worker_total else None
+
+    memory = [row["peak_memory_bytes"] for row in rows if row["peak_memory_bytes"] is not None]
+    cpu = [row["cpu_seconds"] for row in rows if row["cpu_seconds"] is not None]
+    return {
+        "subtasks": len(rows),
+        "phases": phases,
+        "peak_memory_bytes": max(memory) if memory else None,
+        "cpu_seconds": round(sum(cpu), 3) if cpu else None,
+    }
@@ -0,0 +1,57 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import torch
+
+# ==========================================
+# MODEL-UPDATE ENCODINGS
+# ==========================================
+# A job can ship reference weights (the shared initialization) and pick how
+# workers send their results (Job.update_encoding):
+#   "full"  -> the whole state_dict (default, no reference needed)
+#   "delta" -> trained - reference, fp32 (lossless)
+#   "fp16"  -> delta in half precision
+#   "int8"  -> delta quantized to int8, one scale per tensor
+#   "topk"  -> only the largest |delta| entries (Job.update_topk_ratio per tensor)
+# Workers encode inside the sandbox (worker/update_codec.py). Here we decode
+# the payload back into a full state_dict before FedAvg.
+# torch is imported on first decode, so the API can import UPDATE_ENCODINGS
+# without loading it.
+
+UPDATE_ENCODINGS = ("full", "delta", "fp16", "int8", "topk")
+UPDATE_MARKER = "__gridx_update__"
+
+
+def is_update(payload) -> bool:
+    """True if a loaded result is an encoded update rather than a plain state_dict."""
+    return isinstance(payload, dict) and UPDATE_MARKER in payload
+
+
+def decode_tensor(entry: dict, reference: "torch.Tensor") -> "torch.Tensor":
+    import torch
+
+    kind = entry["kind"]
+    if kind == "full":
+        return entry["tensor"]
+
+    if kind == "delta":
+        delta = entry["tensor"].float()
+    elif kind == "int8":
+        delta = entry["tensor"].float() * entry["scale"]
+    elif kind == "topk":
+        delta = torch.zeros(reference.numel(), dtype=torch.float32)
+        delta[entry["indices"].long()] = entry["values"].float()
+        delta = delta.view(entry["shape"])
+    else:
+        raise ValueError(f"Unknown update entry kind: {kind}")
+    return (reference.float() + delta).to(reference.dtype)
+
+
+def apply_update(payload: dict, reference: dict) -> dict:
+    """Rebuilds the worker's full state_dict from an encoded update and the job's reference weights."""
+    if reference is None:
+        raise ValueError("Encoded update received but the job has no reference weights")
+    return {
+        name: decode_tensor(entry, reference.get(name))
+        for name, entry in payload["tensors"].items()
+    }
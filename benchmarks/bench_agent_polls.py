@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Agent Poll Throughput Benchmark (sync vs. async DB)
+Runs the backend under uvicorn once with ASYNC_DB=false (every route is a sync
+handler on the 40-thread pool) and once with ASYNC_DB=true (heartbeat,
+request_task, complete_task and status reads on the async engine, see
+app/routers/hot_paths.py), each on a fresh SQLite file, and drives it with
+closed-loop simulated agents: poll /agent/request_task, complete whatever it
+hands out, heartbeat every --heartbeat-every polls, repeat without sleeping.
+
+For each concurrency level (--levels) it reports polls/s, p50/p99 poll
+latency, errors (timeouts, 5xx) and rejected requests (4xx, e.g. completing
+a subtask that was also handed to another agent); "max sustained" is the best
+polls/s of a level with no errors and p99 under --slo-ms. Load comes from --clients processes so the
+load generator isn't the bottleneck.
+
+Usage: python benchmarks/bench_agent_polls.py [--levels 50,200,500,1000] [--seconds 10]
+                                              [--pending 2000] [--modes sync,async] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import PROJECT_ROOT, free_port, percentiles
+
+EMAIL = "polls@gridx.bench"
+
+
+# ==========================================
+# 1. BACKEND PER MODE
+# ==========================================
+def seed(database_url: str, agents: int, pending: int):
+    """Owner, agents and PENDING subtasks, written directly like bench_scheduler.py does."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import models
+    from app.database import Base
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        owner = models.User(email=EMAIL, password="bench")
+        db.add(owner)
+        db.flush()
+        # An old heartbeat, so the status read only lists agents that beat during the run
+        stale = datetime.now(timezone.utc) - timedelta(days=1)
+        db.add_all([models.Agent(id=f"agent-{i}", owner_id=owner.id, status="IDLE", last_heartbeat=stale)
+                    for i in range(agents)])
+        job = models.Job(title="polls", status="RUNNING", owner_id=owner.id,
+                         original_code_url="http://bench/train.py", original_req_url="http://bench/requirements.txt")
+        db.add(job)
+        db.flush()
+        db.add_all([models.Subtask(job_id=job.id, status="PENDING", chunk_file_url="http://bench/chunk.csv")
+                    for _ in range(pending)])
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def start_server(mode: str, workdir: str, port: int, log_path: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "ASYNC_DB": "true" if mode == "async" else "false",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "STORAGE_BACKEND": "memory",
+        "LOCAL_STORAGE_URL": f"http://127.0.0.1:{port}/files",
+    })
+    log_file = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=str(PROJECT_ROOT / "backend"), env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+
+    import httpx
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"{mode} backend exited, see {log_path}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{mode} backend did not start within 60s")
+
+
+# ==========================================
+# 2. LOAD (one process per --clients)
+# ==========================================
+async def _drive(base_url: str, first_agent: int, agents: int, seconds: float, heartbeat_every: int,
+                 status_job: int, timeout: float) -> dict:
+    import httpx
+
+    samples = {"poll": [], "complete": [], "heartbeat": [], "status": []}
+    errors = {} # Timeouts, connection errors and 5xx: the backend didn't keep up
+    rejected = {} # 4xx, e.g. completing a subtask that was handed to two agents
+    claimed = []
+    limits = httpx.Limits(max_connections=agents, max_keepalive_connections=agents)
+
+    async def call(client, kind: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            errors[f"{kind} {type(e).__name__}"] = errors.get(f"{kind} {type(e).__name__}", 0) + 1
+            return None
+        samples[kind].append(time.perf_counter() - start)
+        if resp.status_code >= 400:
+            bucket = errors if resp.status_code >= 500 else rejected
+            bucket[f"{kind} {resp.status_code}"] = bucket.get(f"{kind} {resp.status_code}", 0) + 1
+            return None
+        return resp.json()
+
+    async def agent(client, agent_id: str, deadline: float):
+        polls = 0
+        while time.perf_counter() < deadline:
+            task = await call(client, "poll", "POST", "/agent/request_task", json={"agent_id": agent_id})
+            polls += 1
+            if task and task.get("task_id"):
+                claimed.append(task["task_id"])
+                await call(client, "complete", "POST", "/agent/complete_task",
+                           json={"agent_id": agent_id, "task_id": task["task_id"]})
+            if polls % heartbeat_every == 0:
+                await call(client, "heartbeat", "POST", "/agent/heartbeat",
+                           json={"id": agent_id, "status": "IDLE", "running_tasks": []})
+                await call(client, "status", "GET", f"/jobs/{status_job}")
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(*(agent(client, f"agent-{first_agent + i}", deadline) for i in range(agents)))
+    return {"samples": samples, "errors": errors, "rejected": rejected, "claimed": claimed}
+
+
+def drive(*args) -> dict:
+    return asyncio.run(_drive(*args))
+
+
+def run_level(pool, base_url: str, concurrency: int, args, status_job: int) -> dict:
+    clients = max(1, min(args.clients, concurrency))
+    shares = [concurrency // clients + (1 if i < concurrency % clients else 0) for i in range(clients)]
+    firsts = [sum(shares[:i]) for i in range(clients)]
+
+    start = time.perf_counter()
+    futures = [pool.submit(drive, base_url, first, share, args.seconds, args.heartbeat_every, status_job,
+                           args.request_timeout) for first, share in zip(firsts, shares)]
+    parts = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    samples = {kind: [value for part in parts for value in part["samples"][kind]] for kind in parts[0]["samples"]}
+    errors, rejected = {}, {}
+    for part in parts:
+        for key, count in part["errors"].items():
+            errors[key] = errors.get(key, 0) + count
+        for key, count in part["rejected"].items():
+            rejected[key] = rejected.get(key, 0) + count
+    claimed = [task_id for part in parts for task_id in part["claimed"]]
+
+    return {
+        "concurrency": concurrency,
+        "polls_per_second": round(len(samples["poll"]) / elapsed, 1),
+        "requests_per_second": round(sum(len(values) for values in samples.values()) / elapsed, 1),
+        "poll": percentiles(samples["poll"]),
+        "complete": percentiles(samples["complete"]),
+        "heartbeat": percentiles(samples["heartbeat"]),
+        "status": percentiles(samples["status"]),
+        "errors": errors,
+        "rejected": rejected,
+        "claimed": len(claimed),
+        "duplicate_claims": len(claimed) - len(set(claimed)),
+    }
+
+
+def run_mode(mode: str, args, levels: list) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"gridx_polls_{mode}_")
+    port = free_port()
+    status_job = seed(f"sqlite:///{os.path.join(workdir, 'bench.db')}", max(levels), args.pending)
+    log_path = os.path.join(workdir, "backend.log")
+    server = start_server(mode, workdir, port, log_path)
+    print(f"🔧 {mode}: backend on :{port} (log {log_path})")
+
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=args.clients) as pool:
+            for concurrency in levels:
+                level = run_level(pool, f"http://127.0.0.1:{port}", concurrency, args, status_job)
+                results.append(level)
+                errors = sum(level["errors"].values())
+                print(f"   {concurrency:>5} agents: {level['polls_per_second']:>8.1f} polls/s "
+                      f"({level['requests_per_second']:.0f} req/s)  poll p50 {level['poll'].get('p50_ms', 0):>8.1f} ms  "
+                      f"p99 {level['poll'].get('p99_ms', 0):>8.1f} ms  errors {errors}  "
+                      f"rejected {sum(level['rejected'].values())}  duplicate claims {level['duplicate_claims']}")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill() # Still working through a backlog of abandoned requests
+            server.wait()
+
+    sustained = [level for level in results
+                 if not level["errors"] and level["poll"].get("p99_ms", float("inf")) <= args.slo_ms]
+    best = max(sustained, key=lambda level: level["polls_per_second"], default=None)
+    return {
+        "levels": results,
+        "max_sustained_polls_per_second": best["polls_per_second"] if best else 0,
+        "max_sustained_at_concurrency": best["concurrency"] if best else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="50,200,500,1000", help="Concurrent agents per step")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each step")
+    parser.add_argument("--pending", type=int, default=2000, help="PENDING subtasks to hand out (claims + completions)")
+    parser.add_argument("--heartbeat-every", type=int, default=5, help="Heartbeat + status read every N polls")
+    parser.add_argument("--clients", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help="Load generator processes")
+    parser.add_argument("--slo-ms", type=float, default=5000.0,
+                        help="p99 poll latency a level must stay under (workers poll every 10s)")
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    backend_dir = str(PROJECT_ROOT / "backend")
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    os.environ.setdefault("DATABASE_URL", "sqlite://") # Only the models are imported here
+
+    levels = [int(level) for level in args.levels.split(",")]
+    print(f"📡 {args.levels} agents x {args.seconds:g}s per step, {args.pending} pending subtasks, "
+          f"{args.clients} client processes")
+    report = {"args": vars(args), "modes": {}}
+    for mode in args.modes.split(","):
+        report["modes"][mode] = run_mode(mode, args, levels)
+
+    print("🏁 Max sustained polls/s (no errors, p99 <= %g ms):" % args.slo_ms)
+    for mode, result in report["modes"].items():
+        print(f"   {mode:<6} {result['max_sustained_polls_per_second']:>8.1f}"
+              f"  (at {result['max_sustained_at_concurrency']} agents)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Dashboard Read Cache Benchmark
+Runs the backend under uvicorn with CACHE_BACKEND=none and =memory (see
+app/cache.py), each on a fresh SQLite file with one job of --subtasks subtasks
+and --jobs jobs in the owner's list, and drives it with --dashboards
+closed-loop clients that poll what the dashboard polls: job status, the job
+list, online agents and the wallet. Meanwhile one simulated agent claims and
+completes a subtask --writes-per-second times a second, so status entries are
+invalidated the way they are in production.
+
+The "etag" mode is memory plus clients that send If-None-Match and get 304s.
+For each mode: reads/s, p50/p99 per endpoint, 304 share and the hit rate
+from /metrics.
+
+Usage: python benchmarks/bench_cache.py [--dashboards 50] [--seconds 10] [--writes-per-second 5]
+                                        [--modes none,memory,etag] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import PROJECT_ROOT, free_port, percentiles
+
+EMAIL = "dashboard@gridx.bench"
+AGENTS = 20
+CACHE_BACKENDS = {"none": "none", "memory": "memory", "etag": "memory"}
+
+
+# ==========================================
+# 1. BACKEND PER MODE
+# ==========================================
+def seed(database_url: str, jobs: int, subtasks: int) -> tuple:
+    """Owner, agents, the owner's jobs and the first job's PENDING subtasks; returns (owner id, job id)."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import models
+    from app.database import Base
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        owner = models.User(email=EMAIL, password="bench", credits=100.0)
+        db.add(owner)
+        db.flush()
+        db.add_all([models.Agent(id=f"agent-{i}", owner_id=owner.id, status="IDLE") for i in range(AGENTS)])
+        all_jobs = [models.Job(title=f"job {i}", status="RUNNING", owner_id=owner.id,
+                               original_code_url="http://bench/train.py",
+                               original_req_url="http://bench/requirements.txt",
+                               original_data_url="http://bench/data.csv") for i in range(jobs)]
+        db.add_all(all_jobs)
+        db.flush()
+        db.add_all([models.Subtask(job_id=all_jobs[0].id, status="PENDING", chunk_file_url="http://bench/chunk.csv")
+                    for _ in range(subtasks)])
+        db.commit()
+        return owner.id, all_jobs[0].id
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def start_server(mode: str, workdir: str, port: int, log_path: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "CACHE_BACKEND": CACHE_BACKENDS[mode],
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "STORAGE_BACKEND": "memory",
+        "LOCAL_STORAGE_URL": f"http://127.0.0.1:{port}/files",
+    })
+    log_file = open(log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=str(PROJECT_ROOT / "backend"), env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+
+    import httpx
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"{mode} backend exited, see {log_path}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{mode} backend did not start within 60s")
+
+
+def hit_rate(metrics_text: str) -> dict:
+    """Hit rate per cached endpoint from gridx_cache_requests_total."""
+    counts = {}
+    for name, result, value in re.findall(
+            r'gridx_cache_requests_total\{cache="([^"]+)",result="([^"]+)"\} ([0-9.e+]+)', metrics_text):
+        counts.setdefault(name, {"hit": 0.0, "miss": 0.0})[result] = float(value)
+    return {name: round(c["hit"] / (c["hit"] + c["miss"]), 3) for name, c in counts.items() if c["hit"] + c["miss"]}
+
+
+# ==========================================
+# 2. LOAD
+# ==========================================
+async def drive(base_url: str, mode: str, args, owner_id: int, job_id: int) -> dict:
+    import httpx
+
+    endpoints = {
+        "status": f"/jobs/{job_id}",
+        "list": f"/jobs/list/{owner_id}",
+        "agents": "/stats/agents/online",
+        "wallet": f"/auth/wallet/{owner_id}",
+    }
+    samples = {kind: [] for kind in endpoints}
+    not_modified = {"count": 0}
+    errors = {}
+    writes = {"count": 0}
+    limits = httpx.Limits(max_connections=args.dashboards + 1, max_keepalive_connections=args.dashboards + 1)
+
+    async def dashboard(client, deadline: float):
+        etags = {}
+        while time.perf_counter() < deadline:
+            for kind, url in endpoints.items():
+                headers = {"If-None-Match": etags[url]} if mode == "etag" and url in etags else {}
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(url, headers=headers)
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    continue
+                samples[kind].append(time.perf_counter() - start)
+                if resp.status_code == 304:
+                    not_modified["count"] += 1
+                elif resp.status_code >= 400:
+                    errors[f"{kind} {resp.status_code}"] = errors.get(f"{kind} {resp.status_code}", 0) + 1
+                elif "etag" in resp.headers:
+                    etags[url] = resp.headers["etag"]
+
+    async def writer(client, deadline: float):
+        interval = 1.0 / args.writes_per_second
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            task = (await client.post("/agent/request_task", json={"agent_id": "agent-0"})).json()
+            if task.get("task_id"):
+                await client.post("/agent/complete_task", json={"agent_id": "agent-0", "task_id": task["task_id"]})
+                writes["count"] += 1
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.request_timeout) as client:
+        # Agents show up as online for the whole run
+        for i in range(AGENTS):
+            await client.post("/agent/heartbeat", json={"id": f"agent-{i}", "status": "IDLE"})
+        deadline = time.perf_counter() + args.seconds
+        start = time.perf_counter()
+        tasks = [dashboard(client, deadline) for _ in range(args.dashboards)]
+        if args.writes_per_second > 0:
+            tasks.append(writer(client, deadline))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        metrics_text = (await client.get("/metrics")).text
+
+    reads = sum(len(values) for values in samples.values())
+    return {
+        "reads_per_second": round(reads / elapsed, 1),
+        "endpoints": {kind: percentiles(values) for kind, values in samples.items()},
+        "not_modified_share": round(not_modified["count"] / reads, 3) if reads else 0,
+        "hit_rate": hit_rate(metrics_text),
+        "completions": writes["count"],
+        "errors": errors,
+    }
+
+
+def run_mode(mode: str, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"gridx_cache_{mode}_")
+    port = free_port()
+    owner_id, job_id = seed(f"sqlite:///{os.path.join(workdir, 'bench.db')}", args.jobs, args.subtasks)
+    log_path = os.path.join(workdir, "backend.log")
+    server = start_server(mode, workdir, port, log_path)
+    try:
+        return asyncio.run(drive(f"http://127.0.0.1:{port}", mode, args, owner_id, job_id))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dashboards", type=int, default=50, help="Concurrent polling dashboards")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--writes-per-second", type=float, default=5.0, help="Subtask completions per second")
+    parser.add_argument("--jobs", type=int, default=50, help="Jobs in the owner's list")
+    parser.add_argument("--subtasks", type=int, default=1000, help="Subtasks of the polled job")
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--modes", default="none,memory,etag")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    backend_dir = str(PROJECT_ROOT / "backend")
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    os.environ.setdefault("DATABASE_URL", "sqlite://") # Only the models are imported here
+
+    print(f"📡 {args.dashboards} dashboards x {args.seconds:g}s, {args.writes_per_second:g} completions/s, "
+          f"{args.jobs} jobs, {args.subtasks} subtasks")
+    report = {"args": vars(args), "modes": {}}
+    for mode in args.modes.split(","):
+        result = run_mode(mode, args)
+        report["modes"][mode] = result
+        print(f"   {mode:<7} {result['reads_per_second']:>8.1f} reads/s  "
+              + "  ".join(f"{kind} p50 {stats.get('p50_ms', 0):.1f} / p99 {stats.get('p99_ms', 0):.1f} ms"
+                          for kind, stats in result["endpoints"].items())
+              + f"  304s {result['not_modified_share']:.0%}  errors {sum(result['errors'].values())}")
+        if result["hit_rate"]:
+            print("           hit rate: " + ", ".join(f"{name} {rate:.0%}" for name, rate in result["hit_rate"].items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Chunk Format Benchmark
+Compares the chunk encodings the splitter can produce (CHUNK_FORMAT) on a
+numeric dataset: bytes a worker downloads, encode time on the backend, and
+load time on the worker (including materializing data.csv for train.py).
+
+Usage: python benchmarks/bench_chunk_formats.py [--rows 1000000] [--cols 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import PROJECT_ROOT
+
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+import pandas as pd
+from app.chunk_formats import encode_chunk
+from worker.utils import materialize_csv
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def load(path, fmt):
+    """What a worker-side script would do to get a table into memory."""
+    if fmt == "csv":
+        return pd.read_csv(path)
+    import pyarrow as pa
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path)
+    # Arrow IPC: memory-mapped, zero-copy
+    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    print(f"🧪 Numeric dataset: {args.rows} rows x {args.cols} float columns")
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.random((args.rows, args.cols)), columns=[f"f{i}" for i in range(args.cols)])
+
+    workdir = tempfile.mkdtemp(prefix="gridx_formats_")
+    report = {}
+    for fmt in ("csv", "parquet", "arrow"):
+        encode_s, (data, _) = timed(lambda: encode_chunk(df, fmt), repeat=1)
+        path = os.path.join(workdir, f"chunk.{fmt}")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        load_s, _ = timed(lambda: load(path, fmt))
+        entry = {
+            "bytes": len(data),
+            "encode_s": round(encode_s, 3),
+            "load_s": round(load_s, 3),
+        }
+        if fmt != "csv":
+            csv_s, _ = timed(lambda: materialize_csv(path, fmt, os.path.join(workdir, "data.csv")), repeat=1)
+            entry["materialize_csv_s"] = round(csv_s, 3)
+        report[fmt] = entry
+
+    csv_bytes = report["csv"]["bytes"]
+    for fmt, entry in report.items():
+        ratio = entry["bytes"] / csv_bytes
+        print(f"   {fmt:8s} {entry['bytes'] / 1e6:8.1f} MB ({ratio:5.1%} of csv)  "
+              f"encode {entry['encode_s']:.3f}s  load {entry['load_s']:.3f}s"
+              + (f"  data.csv {entry['materialize_csv_s']:.3f}s" if "materialize_csv_s" in entry else ""))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
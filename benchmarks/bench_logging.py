@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Logging Overhead Benchmark
+What a log line costs the thread that writes it, and what logging adds to a
+request, for the old print() path vs. app/logs.py.
+
+Part 1: caller-side cost per call (--threads writers, --calls each):
+  print        -> print() to stdout (what the hot paths used to do)
+  sync_json    -> logging.StreamHandler + JsonFormatter on the calling thread
+  queue_json   -> app/logs.py: enqueue only; a listener thread formats and writes
+  sampled_out  -> a heartbeat / poll line sampled away by logs.sampled()
+against a fast sink (/dev/null) or a slow one (--sink slow: a pipe drained at
+--sink-mbps, like a busy container log driver). print() blocks once the pipe
+is full; the queue drops and counts instead.
+
+Part 2: per-request latency of POST /agent/heartbeat and an empty
+/agent/request_task poll through the real app with logging off (level
+WARNING), sampled (LOG_SAMPLE_RATES default) and everything logged. The
+configs take turns in blocks of requests so drift (the database growing,
+caches warming) is shared between them.
+
+Usage: python benchmarks/bench_logging.py [--threads 8] [--calls 20000] [--sink devnull|slow]
+                                          [--requests 2000] [--json out.json]
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import configure_backend
+
+
+# ==========================================
+# 1. SINKS
+# ==========================================
+class SlowPipe:
+    """A pipe whose reader drains at most `mbps` MB/s; writes block when its 64 KB buffer is full."""
+
+    def __init__(self, mbps: float):
+        read_fd, write_fd = os.pipe()
+        self.writer = io.TextIOWrapper(os.fdopen(write_fd, "wb", buffering=0), encoding="utf-8", write_through=True)
+        self.bytes_per_second = mbps * 1024 * 1024
+        threading.Thread(target=self._drain, args=(read_fd,), daemon=True).start()
+
+    def _drain(self, read_fd: int):
+        while True:
+            data = os.read(read_fd, 16384)
+            if not data:
+                return
+            time.sleep(len(data) / self.bytes_per_second)
+
+
+def open_sink(kind: str, mbps: float):
+    if kind == "slow":
+        return SlowPipe(mbps).writer
+    return open(os.devnull, "w")
+
+
+# ==========================================
+# 2. CALLER-SIDE COST
+# ==========================================
+def micro_percentiles(samples: list) -> dict:
+    """Like common.percentiles, in µs (a log call is far below its 0.01 ms resolution)."""
+    ordered = sorted(samples)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e6, 2)
+
+    return {"p50_us": at(0.50), "p95_us": at(0.95), "p99_us": at(0.99), "max_us": at(1.0),
+            "mean_us": round(sum(ordered) / len(ordered) * 1e6, 2)}
+
+
+def run_writers(emit, threads: int, calls: int) -> dict:
+    """Runs `emit(i)` calls on `threads` threads; returns per-call latency percentiles and throughput."""
+    samples = [[] for _ in range(threads)]
+
+    def writer(index: int):
+        own = samples[index]
+        for i in range(calls):
+            start = time.perf_counter()
+            emit(i)
+            own.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=writer, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    flat = [value for own in samples for value in own]
+    stats = micro_percentiles(flat)
+    stats["calls_per_second"] = round(len(flat) / elapsed)
+    return stats
+
+
+def caller_cost(app_logs, threads: int, calls: int, sink_kind: str, mbps: float) -> dict:
+    results = {}
+    fields = {"job_id": 12, "subtask_id": 345, "agent_id": "agent-7"}
+
+    # print(): the old path
+    sink = open_sink(sink_kind, mbps)
+    real_stdout = sys.stdout
+    sys.stdout = sink
+    try:
+        results["print"] = run_writers(lambda i: print(f"🚀 Assigning Subtask {i} to Agent agent-7"), threads, calls)
+    finally:
+        sys.stdout = real_stdout
+
+    def logger_with(handler, name: str) -> logging.Logger:
+        logger = logging.getLogger(f"bench.{name}")
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        return logger
+
+    # Synchronous JSON: formatting and the write happen on the caller's thread
+    handler = logging.StreamHandler(open_sink(sink_kind, mbps))
+    handler.setFormatter(app_logs.JsonFormatter({"service": "backend"}))
+    logger = logger_with(handler, "sync")
+    with app_logs.bound(**fields):
+        results["sync_json"] = run_writers(lambda i: logger.info("🚀 Subtask assigned", extra={"n": i}), threads, calls)
+
+    # Queue: only enqueue on the caller's thread
+    def heartbeat(logger):
+        if keep := app_logs.sampled("heartbeat"):
+            logger.info("💓 Heartbeat", extra=keep)
+
+    app_logs.set_sample_rate("heartbeat", 0.0)
+    for mode in ("queue_json", "sampled_out"):
+        output = logging.StreamHandler(open_sink(sink_kind, mbps))
+        output.setFormatter(app_logs.JsonFormatter({"service": "backend"}))
+        handler = app_logs.ContextQueueHandler(app_logs.LOG_QUEUE_SIZE)
+        listener = logging.handlers.QueueListener(handler.queue, output)
+        listener.start()
+        logger = logger_with(handler, mode)
+        if mode == "queue_json":
+            emit = lambda i: logger.info("🚀 Subtask assigned", extra={"n": i})
+        else:
+            emit = lambda i: heartbeat(logger)
+        with app_logs.bound(**fields):
+            results[mode] = run_writers(emit, threads, calls)
+        drain_start = time.perf_counter()
+        listener.stop() # Returns once everything queued has been written
+        results[mode]["dropped"] = handler.dropped
+        results[mode]["drain_seconds"] = round(time.perf_counter() - drain_start, 3)
+    return results
+
+
+# ==========================================
+# 3. PER-REQUEST COST
+# ==========================================
+def request_cost(app_logs, requests: int, block: int = 100) -> dict:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    client.post("/auth/register", json={"email": "bench@gridx.com", "password": "x"})
+    client.post("/agent/register", json={"id": "agent-1", "email": "bench@gridx.com"})
+
+    root = logging.getLogger()
+    default_rates = app_logs.parse_sample_rates(app_logs.LOG_SAMPLE_RATES)
+    configs = {
+        "off": (logging.WARNING, default_rates),
+        "sampled": (logging.INFO, default_rates),
+        "all": (logging.INFO, {event: 1.0 for event in default_rates}),
+    }
+    endpoints = (("/agent/heartbeat", {"id": "agent-1", "status": "IDLE"}),
+                 ("/agent/request_task", {"agent_id": "agent-1"}))
+    for endpoint, body in endpoints:
+        for _ in range(100):
+            client.post(endpoint, json=body) # Warm up
+
+    samples = {(endpoint, name): [] for endpoint, _ in endpoints for name in configs}
+    for _ in range(max(1, requests // block)):
+        for name, (level, rates) in configs.items():
+            root.setLevel(level)
+            for event, rate in rates.items():
+                app_logs.set_sample_rate(event, rate)
+            for endpoint, body in endpoints:
+                own = samples[(endpoint, name)]
+                for _ in range(block):
+                    start = time.perf_counter()
+                    client.post(endpoint, json=body, headers={"X-Agent-ID": "agent-1"})
+                    own.append(time.perf_counter() - start)
+    root.setLevel(logging.INFO)
+
+    results = {}
+    for (endpoint, name), own in samples.items():
+        results.setdefault(endpoint, {})[name] = micro_percentiles(own)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent writer threads")
+    parser.add_argument("--calls", type=int, default=20000, help="Log calls per thread")
+    parser.add_argument("--sink", choices=("devnull", "slow"), default="devnull")
+    parser.add_argument("--sink-mbps", type=float, default=1.0, help="Drain rate of --sink slow")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint and config (0 to skip)")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    workdir, _ = configure_backend(storage="memory")
+    from app import logs as app_logs
+
+    # Route the app's own logging into the sink before app.main sets up stdout
+    app_logs.setup_logging("backend", stream=open_sink(args.sink, args.sink_mbps))
+
+    print(f"🪵 {args.threads} threads x {args.calls} calls, sink: {args.sink}"
+          + (f" ({args.sink_mbps:g} MB/s)" if args.sink == "slow" else ""))
+    report = {"args": vars(args), "caller": caller_cost(app_logs, args.threads, args.calls, args.sink, args.sink_mbps)}
+    for mode, stats in report["caller"].items():
+        extra = f", dropped {stats['dropped']}, drained in {stats['drain_seconds']}s" if "dropped" in stats else ""
+        print(f"   {mode:<12} mean {stats['mean_us']:>8.2f} µs  p99 {stats['p99_us']:>9.1f} µs  "
+              f"max {stats['max_us'] / 1000:>8.1f} ms  {stats['calls_per_second']:>9,} calls/s{extra}")
+
+    if args.requests:
+        print(f"🌐 {args.requests} requests per endpoint and config")
+        report["requests"] = request_cost(app_logs, args.requests)
+        for endpoint, configs in report["requests"].items():
+            baseline = configs["off"]["p50_us"]
+            print(f"   {endpoint} p50: " + ", ".join(
+                f"{name} {stats['p50_us']:.0f} µs ({stats['p50_us'] - baseline:+.0f})" for name, stats in configs.items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.stdout.flush()
+    os._exit(0) # Skip waiting on the slow sink's drain thread
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+End-to-End Pipeline Benchmark
+One job through the whole system: POST /jobs/upload -> split -> dispatch ->
+execution on real worker processes -> aggregation -> final_result_url.
+
+The backend runs in-process (temp SQLite database, local storage). The workers
+are `python -m worker.main` subprocesses using the process executor (default)
+or Docker. The dataset is synthetic numeric CSV (--dataset-mb, 1 MB to GBs,
+streamed, never held in memory here). The generated train.py saves a random
+state_dict of --model-mb.
+
+The JSON report has:
+  * wall time per stage: upload, split, execute (dispatch + run), aggregate
+  * peak RSS of the backend process and of each worker (VmHWM), plus the
+    sandboxes' peak memory as reported by the workers
+  * bytes moved at each hop: dataset in, chunks stored, results, final model
+  * the workers' per-phase timings (GET /jobs/{id}/timings)
+  * the git commit and arguments, so runs can be compared across commits
+
+Usage: python benchmarks/bench_pipeline.py [--dataset-mb 100] [--model-mb 10] [--workers 2]
+                                           [--executor process|docker] [--json out.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import PROJECT_ROOT, configure_backend, start_backend, SyntheticCSV
+
+EMAIL = "pipeline@gridx.bench"
+
+TRAIN_PY = """\
+import torch
+
+# Read the chunk like a real job would, then save a model of the requested size
+rows = 0
+with open("data.csv") as f:
+    for rows, _ in enumerate(f):
+        pass
+torch.manual_seed(rows)
+torch.save({{"weight": torch.randn({floats})}}, "model.pth")
+print(f"rows={{rows}}")
+"""
+
+
+def peak_rss_bytes(pid="self") -> int:
+    """VmHWM (peak resident set) of a process, Linux only; 0 if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def start_workers(count: int, base_url: str, executor: str, workdir: str) -> list:
+    workers = []
+    for index in range(count):
+        env = dict(
+            os.environ,
+            BACKEND_URL=base_url,
+            AGENT_ID=f"bench-worker-{index}",
+            WORKER_EMAIL=EMAIL,
+            EXECUTOR=executor,
+            WORKER_SLOTS="1",
+            ARTIFACT_CACHE_DIR=os.path.join(workdir, f"worker{index}_cache"),
+            PROCESS_VENV_ROOT=os.path.join(workdir, "venvs"),
+        )
+        log = open(os.path.join(workdir, f"worker{index}.log"), "w")
+        process = subprocess.Popen([sys.executable, "-m", "worker.main"], cwd=PROJECT_ROOT, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+        workers.append((process, log))
+    return workers
+
+
+def wait_for_workers(client, count: int, timeout: float = 600):
+    """Until every worker heartbeats IDLE (i.e. it has finished WARMING)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        agents = client.get("/stats/agents/online").json()
+        ready = [a for a in agents if a["id"].startswith("bench-worker-") and a["status"] == "IDLE"]
+        if len(ready) >= count:
+            return
+        time.sleep(0.5)
+    raise RuntimeError(f"Workers not ready within {timeout}s")
+
+
+def watch_job(client, job_id: int, timeout: float) -> dict:
+    """Polls GET /jobs/{id}; returns when splitting and the whole job ended (perf_counter timestamps)."""
+    marks = {}
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        now = time.perf_counter()
+        if job["status"] in ("ERROR", "CANCELLED"):
+            raise RuntimeError(f"Job ended {job['status']}")
+        if "split" not in marks and job["status"] != "PROCESSING":
+            marks["split"] = now
+        if job.get("final_result_url"):
+            marks.setdefault("split", now)
+            marks["done"] = now
+            return marks
+        time.sleep(0.05)
+    raise RuntimeError(f"Job did not finish within {timeout}s (stages done: {list(marks)})")
+
+
+def aggregation_seconds() -> float:
+    """
+    FedAvg runs inside the last /agent/complete_task, in the same commit that marks
+    the job COMPLETED, so polling cannot see it; the backend's histogram can.
+    """
+    from app import metrics
+
+    return sum(series[-1] for series in metrics.AGGREGATION_SECONDS.series.values())
+
+
+def human_bytes(value) -> str:
+    value = float(value or 0)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.1f} {unit}" if unit != "B" else f"{int(value)} B"
+        value /= 1024
+
+
+def stored_size(url: str) -> int:
+    """Size of a file we stored, looked up on local storage by its URL."""
+    from app.storage import get_storage
+
+    storage = get_storage()
+    key = storage.key_from_url(url) if url else None
+    return storage.path_for(key).stat().st_size if key else 0
+
+
+def transfer_report(job_id: int, dataset_bytes: int, code_bytes: int) -> dict:
+    from app import database, models
+
+    db = database.SessionLocal()
+    try:
+        job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        subtasks = db.query(models.Subtask).filter(models.Subtask.job_id == job_id).all()
+        chunk_bytes = sum(stored_size(s.chunk_file_url) for s in subtasks)
+        result_bytes = sum(stored_size(s.result_file_url) for s in subtasks)
+        return {
+            "upload_bytes": dataset_bytes + code_bytes, # Multipart framing not included
+            "chunk_bytes": chunk_bytes,
+            # Each worker downloads its chunk plus train.py / requirements.txt
+            "worker_download_bytes": chunk_bytes + code_bytes * len(subtasks),
+            "result_bytes": result_bytes,
+            "final_model_bytes": stored_size(job.final_result_url),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-mb", type=float, default=100, help="Synthetic CSV size (MB)")
+    parser.add_argument("--model-mb", type=float, default=10, help="state_dict size each subtask saves (MB)")
+    parser.add_argument("--workers", type=int, default=2, help="Local worker processes (the job has 5 subtasks)")
+    parser.add_argument("--executor", choices=("process", "docker"), default="process")
+    parser.add_argument("--timeout", type=float, default=3600, help="Give up on the job after this long")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    workdir, port = configure_backend()
+    start_backend(port)
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"🚀 Backend up at {base_url} (workdir: {workdir})")
+
+    import httpx
+
+    client = httpx.Client(base_url=base_url, timeout=None)
+    user_id = client.post("/auth/register", json={"email": EMAIL, "password": "bench"}).json()["id"]
+
+    # 1. Workers (startup is reported separately, not as part of the job)
+    start = time.perf_counter()
+    workers = start_workers(args.workers, base_url, args.executor, workdir)
+    try:
+        wait_for_workers(client, args.workers)
+        worker_startup = time.perf_counter() - start
+        print(f"🤖 {args.workers} {args.executor} worker(s) ready in {worker_startup:.1f}s")
+
+        # 2. The job
+        dataset = SyntheticCSV(int(args.dataset_mb * 1024 * 1024))
+        code = TRAIN_PY.format(floats=max(1, int(args.model_mb * 1024 * 1024 // 4))).encode()
+        print(f"📤 Uploading {args.dataset_mb:g} MB dataset, {args.model_mb:g} MB model per subtask...")
+        start = time.perf_counter()
+        resp = client.post("/jobs/upload", data={"title": "pipeline-bench", "user_id": str(user_id)}, files={
+            "file_code": ("train.py", code, "text/x-python"),
+            "file_req": ("requirements.txt", b"", "text/plain"),
+            "file_data": ("data.csv", dataset, "text/csv"),
+        })
+        resp.raise_for_status()
+        job_id = resp.json()["job_id"]
+        uploaded = time.perf_counter()
+
+        marks = watch_job(client, job_id, args.timeout)
+        timings = client.get(f"/jobs/{job_id}/timings").json()
+
+        # 3. Peak memory, read before the workers go away
+        worker_rss = {f"worker{i}": peak_rss_bytes(process.pid) for i, (process, _) in enumerate(workers)}
+    finally:
+        for process, log in workers:
+            process.terminate()
+        for process, log in workers:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+    aggregate = aggregation_seconds()
+    stages = {
+        "upload": uploaded - start,
+        "split": marks["split"] - uploaded,
+        "execute": max(0.0, marks["done"] - marks["split"] - aggregate), # Dispatch, downloads, training, result uploads
+        "aggregate": aggregate,
+    }
+    report = {
+        "commit": git_commit(),
+        "args": {k: v for k, v in vars(args).items() if k != "json"},
+        "job_id": job_id,
+        "worker_startup_s": round(worker_startup, 3),
+        "stages_s": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+        "total_s": round(marks["done"] - start, 3),
+        "peak_rss_bytes": {
+            "backend": peak_rss_bytes(), # This process: backend + the benchmark's own client
+            **worker_rss,
+            "sandbox_max": timings["summary"]["peak_memory_bytes"],
+        },
+        "bytes": transfer_report(job_id, dataset.sent, len(code)),
+        "worker_phases": {phase: entry["mean_seconds"] for phase, entry in timings["summary"]["phases"].items()},
+        "worker_logs": workdir,
+    }
+
+    print(f"✅ Job {job_id} done in {report['total_s']}s: " +
+          ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in report["stages_s"].items()))
+    print("   peak RSS: " + ", ".join(f"{name} {human_bytes(value)}"
+                                     for name, value in report["peak_rss_bytes"].items()))
+    print("   bytes   : " + ", ".join(f"{name} {human_bytes(value)}" for name, value in report["bytes"].items()))
+    print("   worker phases (mean): " + ", ".join(f"{phase} {seconds:.2f}s"
+                                                  for phase, seconds in report["worker_phases"].items() if seconds is not None))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    sys.stdout.flush()
+    os._exit(0) # uvicorn runs in a daemon thread
+
+
+if __name__ == "__main__":
+    main()
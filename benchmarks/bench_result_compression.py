@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Result Compression Benchmark
+Bytes on the wire for the model.pth a worker uploads, raw vs zstd
+(RESULT_COMPRESSION_LEVEL), for a few typical state_dicts. It also reports the
+worker's compress time and the backend's decompress time. Results go through
+the same helpers the worker and aggregation use.
+
+Usage: python benchmarks/bench_result_compression.py [--levels 1,3,9,19] [--json out.json]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import PROJECT_ROOT
+
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import torch
+from torch import nn
+from app.aggregation import decode_result
+from worker.utils import compress_file
+
+
+def linear():
+    # What the example train.py scripts produce
+    return nn.Linear(10, 1)
+
+
+def mlp():
+    return nn.Sequential(nn.Linear(784, 512), nn.ReLU(), nn.Linear(512, 256), nn.ReLU(), nn.Linear(256, 10))
+
+
+def cnn():
+    return nn.Sequential(
+        nn.Conv2d(3, 64, 3, padding=1), nn.BatchNorm2d(64), nn.ReLU(),
+        nn.Conv2d(64, 128, 3, padding=1), nn.BatchNorm2d(128), nn.ReLU(),
+        nn.Conv2d(128, 256, 3, padding=1), nn.BatchNorm2d(256), nn.ReLU(),
+        nn.Conv2d(256, 512, 3, padding=1), nn.BatchNorm2d(512), nn.ReLU(),
+        nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(512, 100),
+    )
+
+
+MODELS = {"linear": linear, "mlp": mlp, "cnn": cnn}
+
+
+def train_a_little(model, steps=20):
+    """A few SGD steps so the weights look like a subtask's output, not a fresh init."""
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.01)
+    first = next(model.parameters())
+    shape = (8, 3, 32, 32) if first.dim() == 4 else (8, first.shape[1])
+    for _ in range(steps):
+        optimizer.zero_grad()
+        model(torch.randn(shape)).pow(2).mean().backward()
+        optimizer.step()
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,3,9,19", help="zstd levels to try")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",")]
+
+    torch.manual_seed(0)
+    workdir = tempfile.mkdtemp(prefix="gridx_results_")
+    report = {}
+
+    for name, build in MODELS.items():
+        model = train_a_little(build())
+        for dtype in (torch.float32, torch.float16):
+            label = f"{name}/{str(dtype).replace('torch.', '')}"
+            state = {k: v.to(dtype) if v.is_floating_point() else v for k, v in model.state_dict().items()}
+            raw_path = os.path.join(workdir, "model.pth")
+            torch.save(state, raw_path)
+            raw = os.path.getsize(raw_path)
+
+            entry = {"params": sum(p.numel() for p in model.parameters()), "raw_bytes": raw, "zstd": {}}
+            for level in levels:
+                packed_path = raw_path + ".zst"
+                start = time.perf_counter()
+                compress_file(raw_path, packed_path, level)
+                compress_s = time.perf_counter() - start
+
+                with open(packed_path, "rb") as f:
+                    packed = f.read()
+                start = time.perf_counter()
+                restored = torch.load(io.BytesIO(decode_result(packed)), map_location="cpu")
+                decompress_s = time.perf_counter() - start
+                assert restored.keys() == state.keys()
+
+                entry["zstd"][level] = {
+                    "bytes": len(packed),
+                    "ratio": round(len(packed) / raw, 3),
+                    "compress_s": round(compress_s, 4),
+                    "load_s": round(decompress_s, 4),
+                }
+            report[label] = entry
+
+    print(f"{'model':16s} {'params':>10s} {'raw':>11s}  " + "  ".join(f"{'zstd-' + str(level):>17s}" for level in levels))
+    for label, entry in report.items():
+        cells = [f"{z['bytes'] / 1e3:8.1f} KB {z['ratio']:5.1%}" for z in entry["zstd"].values()]
+        print(f"{label:16s} {entry['params']:10d} {entry['raw_bytes'] / 1e3:8.1f} KB  " + "  ".join(f"{c:>17s}" for c in cells))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Scheduler Load Benchmark
+Boots the backend in-process (temp SQLite database, local storage) and drives it
+with a fleet of simulated agents: thousands of asyncio coroutines that register,
+heartbeat, poll /agent/request_task, "train" for a configurable time, upload a
+result and call /agent/complete_task, like worker/main.py does.
+
+Reports:
+  * throughput (completed subtasks per second)
+  * claim latency percentiles (request_task that returned a task vs. empty polls)
+  * latency and errors per endpoint
+  * duplicate assignments (one subtask handed to two agents)
+  * database lock contention ("database is locked" errors seen by SQLAlchemy)
+  * subtasks stranded in RUNNING by agents that crashed (--failure-rate)
+
+Usage: python benchmarks/bench_scheduler.py [--agents 1000] [--tasks 5000] [--task-seconds 0.5]
+                                            [--failure-rate 0.01] [--upload backend|presigned] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import configure_backend, start_backend, percentiles
+
+EMAIL = "fleet@gridx.bench"
+
+
+def result_bytes() -> bytes:
+    """A tiny real state_dict, so the aggregation that follows each job's last subtask succeeds."""
+    import io
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save({"w": torch.zeros(16)}, buffer)
+    return buffer.getvalue()
+
+
+class FleetStats:
+    """Shared by all simulated agents (one event loop, so no locking needed)."""
+
+    def __init__(self):
+        self.latency = defaultdict(list)  # endpoint -> seconds
+        self.errors = defaultdict(int)    # "endpoint status" -> count
+        self.claims = defaultdict(list)   # task_id -> agents it was handed to
+        self.completed = 0
+        self.in_flight = 0 # Tasks agents are holding right now
+        self.crashed = 0
+        self.rejected_completions = 0
+
+    def observe(self, endpoint: str, seconds: float, status: int):
+        self.latency[endpoint].append(seconds)
+        if status >= 400:
+            self.errors[f"{endpoint} {status}"] += 1
+
+
+async def call(client, stats: FleetStats, endpoint: str, method: str = "POST", url: str = None, **kwargs):
+    """Times one request (labelled `endpoint`). Returns the response, or None on a transport error."""
+    start = time.perf_counter()
+    try:
+        resp = await client.request(method, url or endpoint, **kwargs)
+    except Exception as e:
+        stats.observe(endpoint, time.perf_counter() - start, 599)
+        stats.errors[f"{endpoint} {type(e).__name__}"] += 1
+        return None
+    stats.observe(endpoint, time.perf_counter() - start, resp.status_code)
+    return resp
+
+
+async def heartbeat(client, stats: FleetStats, agent_id: str, state: dict, interval: float, stop: asyncio.Event):
+    await asyncio.sleep(random.uniform(0, interval)) # Spread the fleet out
+    while not stop.is_set() and not state["crashed"]:
+        running = [state["task"]] if state["task"] else []
+        await call(client, stats, "/agent/heartbeat",
+                   json={"id": agent_id, "status": "BUSY" if running else "IDLE", "running_tasks": running})
+        await asyncio.sleep(interval)
+
+
+async def agent(client, stats: FleetStats, index: int, args, stop: asyncio.Event):
+    agent_id = f"sim-{index:05d}"
+    state = {"task": None, "crashed": False}
+    await asyncio.sleep(random.uniform(0, args.ramp_seconds))
+
+    while not stop.is_set():
+        await call(client, stats, "/agent/register", json={"id": agent_id, "email": EMAIL})
+        state["crashed"] = False
+        beats = asyncio.create_task(heartbeat(client, stats, agent_id, state, args.heartbeat_seconds, stop))
+
+        while not stop.is_set():
+            # 1. Poll for work
+            start = time.perf_counter()
+            resp = await call(client, stats, "/agent/request_task", json={"agent_id": agent_id})
+            task = resp.json() if resp is not None and resp.status_code == 200 else {}
+            if not task.get("task_id"):
+                stats.latency["claim (empty)"].append(time.perf_counter() - start)
+                await asyncio.sleep(args.poll_seconds * random.uniform(0.5, 1.5))
+                continue
+            stats.latency["claim"].append(time.perf_counter() - start)
+            task_id = task["task_id"]
+            stats.claims[task_id].append(agent_id)
+            stats.in_flight += 1
+            state["task"] = task_id
+
+            # 2. "Train"
+            await asyncio.sleep(random.expovariate(1 / args.task_seconds) if args.task_seconds else 0)
+            if random.random() < args.failure_rate:
+                # Crash: the task is never completed; the agent comes back after a while
+                stats.crashed += 1
+                stats.in_flight -= 1
+                state.update(task=None, crashed=True)
+                break
+
+            # 3. Upload the result and report completion
+            payload = {"agent_id": agent_id, "task_id": task_id}
+            if args.upload == "presigned" and task.get("result_upload_url"):
+                put = await call(client, stats, "PUT presigned", method="PUT", url=task["result_upload_url"],
+                                 content=args.result)
+                if put is not None and put.status_code < 400:
+                    payload.update(result_key=task["result_key"], result_size=len(args.result))
+            else:
+                upload = await call(client, stats, "/agent/upload_result",
+                                    data={"agent_id": agent_id, "task_id": str(task_id)},
+                                    files={"file": ("model.pth", args.result, "application/octet-stream")})
+                if upload is not None and upload.status_code < 400:
+                    payload["result_url"] = upload.json()["url"]
+
+            done = await call(client, stats, "/agent/complete_task", json=payload)
+            if done is not None and done.status_code == 200:
+                stats.completed += 1
+            else:
+                stats.rejected_completions += 1
+            stats.in_flight -= 1
+            state["task"] = None
+
+        beats.cancel()
+        await asyncio.gather(beats, return_exceptions=True)
+        if state["crashed"]:
+            await asyncio.sleep(args.restart_seconds)
+
+
+def seed_subtasks(count: int, per_job: int = 5) -> int:
+    """Creates the owner and `count` PENDING subtasks directly, as the splitter would."""
+    from app import database, models
+
+    db = database.SessionLocal()
+    try:
+        owner = models.User(email=EMAIL, password="bench")
+        db.add(owner)
+        db.flush()
+        created = 0
+        while created < count:
+            job = models.Job(title="fleet", status="RUNNING", owner_id=owner.id,
+                             original_code_url="http://bench/train.py", original_req_url="http://bench/requirements.txt")
+            db.add(job)
+            db.flush()
+            for _ in range(min(per_job, count - created)):
+                db.add(models.Subtask(job_id=job.id, status="PENDING", chunk_file_url="http://bench/chunk.csv"))
+                created += 1
+        db.commit()
+        return owner.id
+    finally:
+        db.close()
+
+
+def count_lock_errors():
+    """Counts SQLite 'database is locked' errors raised inside the backend."""
+    from sqlalchemy import event
+    from app import database
+
+    counter = {"locked": 0, "other": 0}
+
+    @event.listens_for(database.engine, "handle_error")
+    def on_error(context):
+        key = "locked" if "locked" in str(context.original_exception).lower() else "other"
+        counter[key] += 1
+
+    return counter
+
+
+def subtask_states() -> dict:
+    from sqlalchemy import func
+    from app import database, models
+
+    db = database.SessionLocal()
+    try:
+        return dict(db.query(models.Subtask.status, func.count(models.Subtask.id)).group_by(models.Subtask.status).all())
+    finally:
+        db.close()
+
+
+async def run_fleet(base_url: str, args, stats: FleetStats) -> float:
+    import httpx
+
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.request_timeout) as client:
+        agents = [asyncio.create_task(agent(client, stats, i, args, stop)) for i in range(args.agents)]
+        start = time.perf_counter()
+        deadline = start + args.max_seconds
+        last_report = start
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(0.5)
+            # Done when nothing is left to hand out and no agent is still working
+            if stats.in_flight == 0 and (await asyncio.to_thread(subtask_states)).get("PENDING", 0) == 0:
+                break
+            if time.perf_counter() - last_report >= 5:
+                last_report = time.perf_counter()
+                print(f"   ... {stats.completed}/{args.tasks} completed, {stats.crashed} crashed "
+                      f"({last_report - start:.0f}s)", file=sys.__stdout__, flush=True)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*agents, return_exceptions=True)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=1000, help="Simulated agents")
+    parser.add_argument("--tasks", type=int, default=5000, help="PENDING subtasks to schedule")
+    parser.add_argument("--subtasks-per-job", type=int, default=5, help="Each finished job triggers an aggregation")
+    parser.add_argument("--task-seconds", type=float, default=0.5, help="Mean simulated training time (exponential)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Chance an agent crashes mid-task")
+    parser.add_argument("--restart-seconds", type=float, default=2.0, help="How long a crashed agent stays away")
+    parser.add_argument("--heartbeat-seconds", type=float, default=5.0)
+    parser.add_argument("--poll-seconds", type=float, default=1.0, help="Back-off after an empty request_task")
+    parser.add_argument("--ramp-seconds", type=float, default=2.0, help="Agents start spread over this window")
+    parser.add_argument("--upload", choices=("backend", "presigned"), default="backend",
+                        help="Results through /agent/upload_result or PUT to the presigned URL")
+    parser.add_argument("--connections", type=int, default=200, help="HTTP connection pool shared by the fleet")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--max-seconds", type=float, default=600.0, help="Give up after this long")
+    parser.add_argument("--verbose", action="store_true", help="Keep the backend's per-request prints")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    workdir, port = configure_backend()
+    start_backend(port)
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"🚀 Backend up at {base_url} (workdir: {workdir})")
+
+    seed_subtasks(args.tasks, args.subtasks_per_job)
+    args.result = result_bytes()
+    lock_errors = count_lock_errors()
+    stats = FleetStats()
+    print(f"🤖 {args.agents} agents, {args.tasks} subtasks, {args.task_seconds}s mean task, "
+          f"{args.failure_rate:.1%} crash rate, uploads via {args.upload}")
+
+    # The backend prints a line per assignment; at fleet scale that is the bottleneck
+    real_stdout = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+    try:
+        elapsed = asyncio.run(run_fleet(base_url, args, stats))
+    finally:
+        if sys.stdout is not real_stdout:
+            sys.stdout.close()
+            sys.stdout = real_stdout
+
+    duplicates = {task_id: agents for task_id, agents in stats.claims.items() if len(agents) > 1}
+    states = subtask_states()
+    report = {
+        "agents": args.agents,
+        "tasks": args.tasks,
+        "seconds": round(elapsed, 2),
+        "completed": stats.completed,
+        "throughput_per_s": round(stats.completed / elapsed, 1) if elapsed else 0.0,
+        "claim_latency": percentiles(stats.latency["claim"]),
+        "empty_poll_latency": percentiles(stats.latency["claim (empty)"]),
+        "endpoints": {endpoint: percentiles(samples) for endpoint, samples in sorted(stats.latency.items())
+                      if not endpoint.startswith("claim")},
+        "errors": dict(stats.errors),
+        "duplicate_assignments": len(duplicates),
+        "rejected_completions": stats.rejected_completions,
+        "db_lock_errors": lock_errors["locked"],
+        "db_other_errors": lock_errors["other"],
+        "crashed_tasks": stats.crashed,
+        "stranded_running": states.get("RUNNING", 0),
+        "subtask_states": states,
+    }
+
+    print(f"✅ {report['completed']}/{args.tasks} subtasks in {report['seconds']}s "
+          f"({report['throughput_per_s']}/s)")
+    print(f"   claim latency      : {report['claim_latency']}")
+    print(f"   empty poll latency : {report['empty_poll_latency']}")
+    for endpoint, entry in report["endpoints"].items():
+        if not endpoint.startswith("/agent/request_task"):
+            print(f"   {endpoint:20s}: {entry}")
+    print(f"   duplicate assignments: {report['duplicate_assignments']}, rejected completions: "
+          f"{report['rejected_completions']}, DB lock errors: {report['db_lock_errors']}")
+    print(f"   crashed: {report['crashed_tasks']}, stranded in RUNNING: {report['stranded_running']}, "
+          f"states: {states}")
+    if report["errors"]:
+        print(f"   errors: {report['errors']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    sys.stdout.flush()
+    os._exit(0) # uvicorn runs in a daemon thread
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Backend Startup Benchmark
+Cold import cost of app.main: wall time, `python -X importtime` breakdown and
+peak RSS of a fresh interpreter that imports the API and nothing else.
+
+torch and pandas are only imported by aggregation and the CSV splitter, and the
+storage client is created on first use. Pass --preload torch,pandas to
+measure what an API process would cost if it imported them eagerly.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--top 10] [--preload torch,pandas] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import PROJECT_ROOT
+
+HEAVY_MODULES = ("torch", "pandas", "numpy", "pyarrow", "supabase", "zstandard")
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+for name in {preload!r}:
+    __import__(name)
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_s": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """`import time: self | cumulative | name` lines -> {name: (self_us, cumulative_us)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_once(preload: list, env: dict) -> dict:
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(preload=preload, heavy=HEAVY_MODULES)],
+        cwd=str(PROJECT_ROOT / "backend"), env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["modules"] = parse_importtime(process.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list (self time)")
+    parser.add_argument("--preload", default="", help="Comma-separated modules to import before app.main")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+    preload = [name for name in args.preload.split(",") if name]
+
+    # Throwaway database and in-memory storage, like the other benchmarks
+    workdir = tempfile.mkdtemp(prefix="gridx_startup_")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", STORAGE_BACKEND="memory")
+
+    run_once(preload, env) # Warm the page cache and .pyc files; we measure warm-disk cold starts
+    runs = [run_once(preload, env) for _ in range(args.runs)]
+
+    last = runs[-1]
+    top = sorted(last["modules"].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    report = {
+        "preload": preload,
+        "import_s_median": round(statistics.median(r["import_s"] for r in runs), 3),
+        "import_s_min": round(min(r["import_s"] for r in runs), 3),
+        "max_rss_mb": round(statistics.median(r["max_rss_mb"] for r in runs), 1),
+        "modules_imported": len(last["modules"]),
+        "heavy_loaded": last["heavy_loaded"],
+        "slowest_modules": {name: {"self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)} for name, (s, c) in top},
+    }
+
+    label = f"app.main + {','.join(preload)}" if preload else "app.main"
+    print(f"🚀 {label}: {report['import_s_median'] * 1000:.0f} ms median import over {args.runs} runs "
+          f"(min {report['import_s_min'] * 1000:.0f} ms), {report['max_rss_mb']:.0f} MB peak RSS, "
+          f"{report['modules_imported']} modules")
+    print(f"   heavy modules loaded: {', '.join(report['heavy_loaded']) or 'none'}")
+    for name, entry in report["slowest_modules"].items():
+        print(f"   {entry['self_ms']:8.1f} ms self {entry['cumulative_ms']:8.1f} ms cumulative  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Update Encoding Benchmark
+Accuracy vs bytes on the wire for the job update encodings
+(full / delta / fp16 / int8 / topk, see backend/app/updates.py).
+
+Simulates one job: N workers start from the same reference weights and train
+an MLP on their own shard of a synthetic classification dataset. Each worker
+encodes its result the way the worker does (worker/update_codec.py plus zstd).
+The backend decodes and averages them (FedAvg), and we score the aggregated
+model on a held-out set.
+
+Usage: python benchmarks/bench_update_encoding.py [--workers 8] [--steps 100] [--hidden 512] [--json out.json]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import PROJECT_ROOT
+
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import torch
+import zstandard
+from torch import nn
+from app.aggregation import decode_result
+from app.updates import apply_update, is_update
+from worker.update_codec import encode_update
+
+FEATURES, CLASSES = 32, 10
+
+
+def make_dataset(rows: int, seed: int = 0):
+    """Labels from a fixed random two-layer teacher, so there is something to learn."""
+    generator = torch.Generator().manual_seed(seed)
+    teacher = [torch.randn(FEATURES, 64, generator=generator), torch.randn(64, CLASSES, generator=generator)]
+    x = torch.randn(rows, FEATURES, generator=generator)
+    y = (torch.tanh(x @ teacher[0]) @ teacher[1]).argmax(dim=1)
+    return x, y
+
+
+def make_model(hidden: int):
+    return nn.Sequential(nn.Linear(FEATURES, hidden), nn.ReLU(), nn.Linear(hidden, hidden), nn.ReLU(), nn.Linear(hidden, CLASSES))
+
+
+def train(model, x, y, steps: int):
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.05, momentum=0.9)
+    for _ in range(steps):
+        batch = torch.randint(0, len(x), (64,))
+        optimizer.zero_grad()
+        nn.functional.cross_entropy(model(x[batch]), y[batch]).backward()
+        optimizer.step()
+    return model
+
+
+def accuracy(model, x, y) -> float:
+    with torch.no_grad():
+        return (model(x).argmax(dim=1) == y).float().mean().item()
+
+
+def on_the_wire(payload) -> bytes:
+    """torch.save + zstd, as the worker uploads it."""
+    buffer = io.BytesIO()
+    torch.save(payload, buffer)
+    return zstandard.ZstdCompressor(level=3).compress(buffer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=4000, help="Training rows per worker")
+    parser.add_argument("--steps", type=int, default=100, help="SGD steps per worker")
+    parser.add_argument("--hidden", type=int, default=512)
+    parser.add_argument("--topk", default="0.1,0.01", help="topk ratios to try")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    x, y = make_dataset(args.rows * args.workers + 10000)
+    test_x, test_y = x[-10000:], y[-10000:]
+
+    reference_model = make_model(args.hidden)
+    reference = {k: v.clone() for k, v in reference_model.state_dict().items()}
+    params = sum(v.numel() for v in reference.values())
+    print(f"🧪 {args.workers} workers x {args.steps} steps, MLP {params} params, "
+          f"reference accuracy {accuracy(reference_model, test_x, test_y):.1%}")
+
+    # Every worker trains once; the encodings are applied to the same results
+    results = []
+    for worker in range(args.workers):
+        model = make_model(args.hidden)
+        model.load_state_dict(reference)
+        shard = slice(worker * args.rows, (worker + 1) * args.rows)
+        results.append(train(model, x[shard], y[shard], args.steps).state_dict())
+
+    configs = [("full", None), ("delta", None), ("fp16", None), ("int8", None)]
+    configs += [("topk", float(ratio)) for ratio in args.topk.split(",")]
+
+    report = {}
+    for encoding, ratio in configs:
+        label = encoding if ratio is None else f"topk-{ratio:g}"
+        wire_bytes = 0
+        decoded = []
+        for state in results:
+            payload = state if encoding == "full" else encode_update(state, reference, encoding, ratio or 0.01)
+            packed = on_the_wire(payload)
+            wire_bytes += len(packed)
+
+            # Backend side: aggregation.py's decode path
+            loaded = torch.load(io.BytesIO(decode_result(packed)), map_location="cpu")
+            decoded.append(apply_update(loaded, reference) if is_update(loaded) else loaded)
+
+        averaged = {key: torch.stack([w[key].float() for w in decoded]).mean(dim=0) for key in decoded[0]}
+        model = make_model(args.hidden)
+        model.load_state_dict(averaged)
+        report[label] = {
+            "bytes_per_worker": wire_bytes // args.workers,
+            "accuracy": round(accuracy(model, test_x, test_y), 4),
+        }
+
+    full_bytes = report["full"]["bytes_per_worker"]
+    for label, entry in report.items():
+        print(f"   {label:10s} {entry['bytes_per_worker'] / 1e3:9.1f} KB/worker "
+              f"({entry['bytes_per_worker'] / full_bytes:6.1%} of full)  accuracy {entry['accuracy']:.2%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
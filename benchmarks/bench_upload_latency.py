@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Upload Latency Benchmark
+Measures API latency for other clients while a large dataset is being uploaded
+through POST /jobs/upload. With streaming ingestion the "during upload" numbers
+should stay close to the idle baseline.
+
+Usage: python benchmarks/bench_upload_latency.py [--size-mb 2048] [--clients 8]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import configure_backend, start_backend, percentiles, SyntheticCSV
+
+
+def poll_latency(base_url: str, clients: int, stop: threading.Event, duration: float = None):
+    """Hammers a cheap read endpoint from N threads, returns per-request latencies."""
+    import httpx
+
+    samples = []
+    lock = threading.Lock()
+    deadline = time.time() + duration if duration else None
+
+    def worker():
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            while not stop.is_set() and (deadline is None or time.time() < deadline):
+                start = time.perf_counter()
+                client.get("/stats/agents/online")
+                elapsed = time.perf_counter() - start
+                with lock:
+                    samples.append(elapsed)
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=2048, help="Dataset size to upload (MB)")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent polling clients")
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    workdir, port = configure_backend()
+    start_backend(port)
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"🚀 Backend up at {base_url} (workdir: {workdir})")
+
+    import httpx
+
+    # 1. Idle baseline
+    print(f"⏱️  Baseline: {args.clients} clients for {args.baseline_seconds}s...")
+    baseline = poll_latency(base_url, args.clients, threading.Event(), args.baseline_seconds)
+
+    # 2. Same load while a big upload is in flight
+    print(f"📤 Uploading {args.size_mb} MB dataset while polling...")
+    stop = threading.Event()
+    during = []
+    poller = threading.Thread(target=lambda: during.extend(poll_latency(base_url, args.clients, stop)))
+    poller.start()
+
+    upload_start = time.perf_counter()
+    dataset = SyntheticCSV(args.size_mb * 1024 * 1024)
+    with httpx.Client(base_url=base_url, timeout=None) as client:
+        resp = client.post(
+            "/jobs/upload",
+            data={"title": "bench", "user_id": "1"},
+            files={
+                "file_code": ("train.py", b"print('bench')", "text/x-python"),
+                "file_req": ("requirements.txt", b"", "text/plain"),
+                "file_data": ("data.csv", dataset, "text/csv"),
+            },
+        )
+    upload_seconds = time.perf_counter() - upload_start
+    stop.set()
+    poller.join()
+    resp.raise_for_status()
+
+    report = {
+        "dataset_bytes": dataset.sent,
+        "upload_seconds": round(upload_seconds, 2),
+        "upload_mb_per_s": round(dataset.sent / 1024 / 1024 / upload_seconds, 1),
+        "baseline": percentiles(baseline),
+        "during_upload": percentiles(during),
+    }
+
+    print(f"✅ Upload done: {report['upload_seconds']}s ({report['upload_mb_per_s']} MB/s)")
+    print(f"   Baseline      : {report['baseline']}")
+    print(f"   During upload : {report['during_upload']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    # The splitter is still chewing on the dataset in the background; don't wait for it
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
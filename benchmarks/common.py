@@ -0,0 +1,103 @@
+"""
+Shared helpers for the Grid-X benchmarks.
+Boots the real FastAPI backend in-process against a throwaway database
+and the local storage stand-in, so nothing touches Supabase or the network.
+"""
+import os
+import sys
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def configure_backend(workdir: str = None, storage: str = "local", port: int = None):
+    """
+    Points the backend at a temp SQLite file and local storage.
+    Must run BEFORE anything imports `app` (settings are read at import time).
+    Returns (workdir, port).
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="gridx_bench_")
+    port = port or free_port()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["STORAGE_BACKEND"] = storage
+    os.environ["LOCAL_STORAGE_ROOT"] = os.path.join(workdir, "storage")
+    os.environ["LOCAL_STORAGE_URL"] = f"http://127.0.0.1:{port}/files"
+
+    backend_dir = str(PROJECT_ROOT / "backend")
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    return workdir, port
+
+
+def start_backend(port: int):
+    """Runs uvicorn in a daemon thread and waits until it accepts requests."""
+    import uvicorn
+    from app.main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("Backend did not start within 30s")
+        time.sleep(0.05)
+    return server, thread
+
+
+def percentiles(samples) -> dict:
+    """p50/p95/p99/max of a list of seconds, reported in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+class SyntheticCSV:
+    """
+    File-like object that produces roughly `size` bytes of numeric CSV on the fly,
+    so multi-GB uploads don't need a multi-GB file on disk.
+    """
+
+    def __init__(self, size: int, columns: int = 8, seed: int = 0):
+        import random
+        rng = random.Random(seed)
+        self.header = (",".join(f"f{i}" for i in range(columns)) + "\n").encode()
+        rows = [
+            ",".join(f"{rng.random():.6f}" for _ in range(columns)) + "\n"
+            for _ in range(2000)
+        ]
+        self.block = "".join(rows).encode()
+        self.size = size
+        self.sent = 0
+
+    def read(self, n: int = -1) -> bytes:
+        # Stops on the first whole block past `size`, so the CSV always ends on a row
+        if self.sent >= self.size:
+            return b""
+        out = self.header + self.block if self.sent == 0 else self.block
+        self.sent += len(out)
+        return out
@@ -28,8 +28,12 @@ fi
 echo ""
 echo "🐳 Building Docker image (this may take 5-10 minutes)..."
 cd "$(dirname "$0")"
-docker build -f Dockerfile.base -t secure-executor-base:latest .
+# Label with the Dockerfile digest so workers recognize the image and skip their own build
+DIGEST=$(sha256sum Dockerfile.base | cut -d' ' -f1)
+docker build -f Dockerfile.base --label gridx.dockerfile_digest=$DIGEST -t secure-executor-base:latest .
 
 echo ""
 echo "✅ Build complete!"
+echo "   Share it without rebuilding: docker save secure-executor-base:latest -o secure-executor-base.tar"
+echo "   (workers load it with BASE_IMAGE_TARBALL=secure-executor-base.tar)"
 docker images | grep secure-executor-base
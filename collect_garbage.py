@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Artifact Garbage Collector
+Deletes content-addressed files (cas/{sha256}) that no job references any more.
+Optionally releases the references held by given jobs first.
+"""
+
+# Load .env FIRST before importing backend modules
+from dotenv import load_dotenv
+from pathlib import Path
+
+env_file = Path(__file__).parent / '.env'
+load_dotenv(env_file)
+
+# Now import backend modules
+import sys
+sys.path.insert(0, 'backend')
+
+from app.database import SessionLocal
+from app import models
+from app.artifacts import release_job_artifacts, collect_garbage
+
+def main():
+    job_ids = [int(arg) for arg in sys.argv[1:]]
+
+    db = SessionLocal()
+    try:
+        # 1. Release the artifacts of the given jobs
+        for job_id in job_ids:
+            job = db.query(models.Job).filter(models.Job.id == job_id).first()
+            if not job:
+                print(f"⚠️  Job {job_id} not found, skipping")
+                continue
+            if not release_job_artifacts(db, job):
+                print(f"⚠️  Artifacts of job {job_id} were already released, skipping")
+                continue
+            print(f"🔓 Released artifacts of job {job_id}")
+        db.commit()
+
+        # 2. Delete everything with no references left
+        removed = collect_garbage(db)
+        print(f"🧹 Removed {removed} unreferenced artifact(s)")
+
+    except Exception as e:
+        print(f"❌ Garbage collection failed: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
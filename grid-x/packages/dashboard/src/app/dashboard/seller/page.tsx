@@ -7,7 +7,7 @@ import { useAuth } from '@/context/AuthContext';
 
 interface Agent {
   id: string;
-  status: 'IDLE' | 'BUSY' | 'OFFLINE';
+  status: 'IDLE' | 'BUSY' | 'WARMING' | 'OFFLINE';
   gpu_model: string;
   ram_total: string;
   last_heartbeat: string;
@@ -94,6 +94,7 @@ export default function SellerDashboard() {
   const getStatusLabel = (status: Agent['status']) => {
     if (status === 'BUSY') return 'Running';
     if (status === 'IDLE') return 'Inactive';
+    if (status === 'WARMING') return 'Starting';
     return 'Offline';
   };
 
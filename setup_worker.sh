@@ -67,9 +67,10 @@ BACKEND_URL=${USER_BACKEND}
 # Email MUST match a registered user on the platform
 WORKER_EMAIL=${USER_EMAIL}
 
-# Resource Limits (Optional overrides)
-# WORKER_CPU_LIMIT=2.0
-# WORKER_MEMORY_LIMIT=4g
+# Resource Limits per task slot (Optional overrides)
+# CPU_LIMIT=2.0
+# MEMORY_LIMIT=4g
+# WORKER_SLOTS=auto
 EOF
 
 echo -e "${GREEN}✅ Configuration saved to worker_config.env${NC}"
@@ -0,0 +1,123 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import storage, models
+from app.database import Base
+from app.artifacts import (
+    put_artifact, register_artifact, release_artifact, release_job_artifacts, restore_artifact, collect_garbage,
+    sha256_from_url, artifact_key
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def store():
+    store = storage.MemoryStorage(base_url="http://testserver/files")
+    storage.set_storage(store)
+    yield store
+    storage.set_storage(None)
+
+
+def test_same_content_is_uploaded_once(store):
+    first = put_artifact(b"print('train')", "text/x-python")
+    second = put_artifact(io.BytesIO(b"print('train')"), "text/x-python")
+
+    assert first["uploaded"] and not second["uploaded"]
+    assert first["url"] == second["url"]
+    assert sha256_from_url(first["url"]) == first["sha256"]
+    assert store.get(artifact_key(first["sha256"])) == b"print('train')"
+
+
+def test_refcount_and_garbage_collection(db, store):
+    artifact = put_artifact(b"a,b\n1,2\n", "text/csv")
+    register_artifact(db, artifact["sha256"], artifact["size"], "text/csv")
+    register_artifact(db, artifact["sha256"], artifact["size"], "text/csv")
+    db.commit()
+    row = db.query(models.Artifact).one()
+    assert row.ref_count == 2
+
+    release_artifact(db, artifact["url"])
+    db.commit()
+    assert collect_garbage(db) == 0
+    assert store.exists(artifact_key(artifact["sha256"]))
+
+    release_artifact(db, artifact["url"])
+    db.commit()
+    assert collect_garbage(db) == 1
+    assert not store.exists(artifact_key(artifact["sha256"]))
+    assert db.query(models.Artifact).count() == 0
+
+
+def test_reuse_survives_garbage_collection_before_commit(db, store):
+    first = put_artifact(b"x,y\n", "text/csv")
+    register_artifact(db, first["sha256"], first["size"], "text/csv")
+    db.commit()
+    release_artifact(db, first["url"])
+    db.commit()
+
+    # A new upload finds the unreferenced object and skips uploading it...
+    reused = put_artifact(b"x,y\n", "text/csv")
+    assert not reused["uploaded"]
+    # ...GC deletes it before the reference is committed...
+    assert collect_garbage(db) == 1
+    register_artifact(db, reused["sha256"], reused["size"], "text/csv")
+    db.commit()
+    # ...and restoring after the commit puts it back
+    assert restore_artifact(reused, io.BytesIO(b"x,y\n"), "text/csv")
+    assert store.get(artifact_key(reused["sha256"])) == b"x,y\n"
+    assert not restore_artifact(reused, b"x,y\n", "text/csv") # Present: nothing to do
+
+    # Referenced again: GC leaves it alone
+    assert collect_garbage(db) == 0 and db.query(models.Artifact).one().ref_count == 1
+
+
+def test_releasing_a_job_twice_keeps_shared_artifacts(db, store):
+    shared = put_artifact(b"import torch", "text/x-python")
+    chunk = put_artifact(b"a\n1\n", "text/csv")
+    for artifact in (shared, shared, chunk):
+        register_artifact(db, artifact["sha256"], artifact["size"], "text/plain")
+    # Two jobs with the same train.py (deduplicated); the first one also has a chunk
+    db.add(models.Job(id=1, title="one", original_code_url=shared["url"]))
+    db.add(models.Job(id=2, title="two", original_code_url=shared["url"]))
+    db.add(models.Subtask(id=1, job_id=1, chunk_file_url=chunk["url"]))
+    db.commit()
+
+    job = db.get(models.Job, 1)
+    assert release_job_artifacts(db, job)
+    db.commit()
+    assert not release_job_artifacts(db, job) # e.g. collect_garbage.py 1 run again
+    db.commit()
+
+    assert collect_garbage(db) == 1 # Only the chunk
+    assert store.exists(artifact_key(shared["sha256"]))
+    assert db.get(models.Artifact, shared["sha256"]).ref_count == 1
+    assert db.get(models.Job, 1).artifacts_released_at is not None
+
+
+def test_failed_delete_keeps_the_row(db, store, monkeypatch):
+    artifact = put_artifact(b"keep", "text/plain")
+    register_artifact(db, artifact["sha256"], artifact["size"], "text/plain")
+    release_artifact(db, artifact["url"])
+    db.commit()
+
+    def fail(key):
+        raise storage.StorageError("unavailable")
+
+    monkeypatch.setattr(store, "delete", fail)
+    assert collect_garbage(db) == 0
+    assert db.query(models.Artifact).count() == 1 # Retried by the next run
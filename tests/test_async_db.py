@@ -0,0 +1,147 @@
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import cache, database, models, storage
+from app.database import Base
+from app.routers import agent, front_job, hot_paths, sellers
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """hot_paths mounted ahead of the sync routers, like main.py does, on one SQLite file."""
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    # NullPool: aiosqlite connections belong to the event loop that opened them
+    AsyncSession = async_sessionmaker(create_async_engine(database.async_url(url), poolclass=NullPool),
+                                      expire_on_commit=False)
+
+    session = Session()
+    session.add(models.User(id=1, email="owner@gridx.com", password="x"))
+    long_ago = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    session.add_all([models.Agent(id=f"agent-{i}", owner_id=1, status="IDLE", last_heartbeat=long_ago) for i in range(20)])
+    session.add(models.Job(id=1, title="t", status="RUNNING", owner_id=1, original_code_url="c", original_req_url="r"))
+    session.add_all([models.Subtask(id=i, job_id=1, status="PENDING", chunk_file_url=f"chunk{i}") for i in range(1, 6)])
+    session.commit()
+    session.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(hot_paths.router)
+    app.include_router(agent.router, prefix="/agent")
+    app.include_router(front_job.router, prefix="/jobs")
+    app.include_router(sellers.router, prefix="/stats")
+    app.dependency_overrides[database.get_db] = get_db
+    app.dependency_overrides[database.get_async_db] = get_async_db
+    monkeypatch.setattr(database, "SessionLocal", Session) # finish_job's aggregation session
+    storage.set_storage(storage.MemoryStorage(base_url="http://testserver/files"))
+    cache.set_cache(cache.MemoryCache())
+    yield app
+    cache.set_cache(None)
+    storage.set_storage(None)
+
+
+def test_async_endpoints_run_a_job_to_completion(app, monkeypatch):
+    monkeypatch.setattr(agent, "aggregate_pytorch_weights", lambda job_id, db: "http://testserver/files/final.pth")
+    client = TestClient(app)
+
+    assert client.post("/agent/heartbeat", json={"id": "agent-0", "status": "IDLE"}).json()["cancel_tasks"] == []
+    assert client.post("/agent/heartbeat", json={"id": "ghost", "status": "IDLE"}).status_code == 404
+    assert [a["id"] for a in client.get("/stats/agents/online").json()] == ["agent-0"]
+
+    tasks = [client.post("/agent/request_task", json={"agent_id": "agent-0"}).json() for _ in range(6)]
+    assert sorted(t["task_id"] for t in tasks[:5]) == [1, 2, 3, 4, 5] and tasks[5]["task_id"] is None
+    first = tasks[0]["task_id"]
+    assert tasks[0]["result_key"] == f"jobs/1/results/{first}_model.pth" and tasks[0]["result_upload_url"]
+
+    resp = client.post("/agent/heartbeat", json={"id": "agent-0", "status": "BUSY", "running_tasks": [first, 99]})
+    assert resp.json()["cancel_tasks"] == [99]
+    assert client.post("/agent/complete_task", json={"agent_id": "agent-1", "task_id": first}).status_code == 400
+
+    # Reported but never uploaded: refused, the subtask stays RUNNING
+    resp = client.post("/agent/complete_task", json={"agent_id": "agent-0", "task_id": first, "result_key": tasks[0]["result_key"]})
+    assert resp.status_code == 409
+
+    for task in tasks[:5]:
+        storage.get_storage().put(task["result_key"], b"weights")
+        resp = client.post("/agent/complete_task", json={
+            "agent_id": "agent-0", "task_id": task["task_id"], "result_key": task["result_key"],
+            "timings": {"training": 1.5}})
+        assert resp.status_code == 200
+
+    status = client.get("/jobs/1").json()
+    assert status["status"] == "COMPLETED"
+    assert status["total_subtasks"] == status["completed_subtasks"] == 5
+    assert status["final_result_url"] == "http://testserver/files/final.pth"
+    assert client.get("/jobs/1/timings").json()["summary"]["phases"]["training"]["count"] == 5 # Sync route still served
+
+
+def test_concurrent_polls_never_share_a_subtask(app):
+    async def poll_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            responses = await asyncio.gather(*(
+                client.post("/agent/request_task", json={"agent_id": f"agent-{i}"}) for i in range(20)))
+        return [resp.json()["task_id"] for resp in responses]
+
+    claimed = [task_id for task_id in asyncio.run(poll_all()) if task_id is not None]
+    assert sorted(claimed) == [1, 2, 3, 4, 5]
+
+
+def test_sync_polls_claim_with_a_conditional_update_too(app):
+    sync_app = FastAPI() # ASYNC_DB=false: only the sync router
+    sync_app.include_router(agent.router, prefix="/agent")
+    sync_app.dependency_overrides = app.dependency_overrides
+
+    async def poll_all():
+        transport = httpx.ASGITransport(app=sync_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            responses = await asyncio.gather(*(
+                client.post("/agent/request_task", json={"agent_id": f"agent-{i}"}) for i in range(20)))
+        return [resp.json()["task_id"] for resp in responses]
+
+    claimed = [task_id for task_id in asyncio.run(poll_all()) if task_id is not None]
+    assert len(claimed) == len(set(claimed)) and set(claimed) <= {1, 2, 3, 4, 5}
+
+
+def test_claim_candidates_skip_lost_subtasks(app, monkeypatch):
+    monkeypatch.setattr(agent, "CLAIM_WINDOW", 2)
+    db = next(app.dependency_overrides[database.get_db]())
+    try:
+        assert [s.id for s in db.execute(agent.claim_candidates(set())).scalars()] == [1, 2]
+        assert [s.id for s in db.execute(agent.claim_candidates({1, 3})).scalars()] == [2, 4]
+    finally:
+        db.close()
+
+
+def test_async_urls_and_pool_settings():
+    assert database.async_url("sqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+    assert database.async_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert database.pool_args("sqlite://") == {}
+    assert database.pool_args("sqlite:///x.db")["pool_size"] == database.DB_POOL_SIZE
+    assert database.pool_args("sqlite:///x.db", 4, 0) == {"pool_size": 4, "max_overflow": 0,
+                                                           "pool_timeout": database.DB_POOL_TIMEOUT}
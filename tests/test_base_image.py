@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import docker
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from worker import executor
+
+
+class FakeImages:
+    """Just enough of docker's ImageCollection to see whether we build."""
+
+    def __init__(self, labels=None):
+        self.labels = labels
+        self.builds = []
+
+    def get(self, tag):
+        if self.labels is None:
+            raise docker.errors.ImageNotFound(tag)
+        return SimpleNamespace(labels=self.labels)
+
+    def build(self, **kwargs):
+        self.builds.append(kwargs)
+        self.labels = kwargs["labels"]
+
+
+@pytest.fixture
+def images(monkeypatch):
+    images = FakeImages()
+    monkeypatch.setattr(executor, "_client", SimpleNamespace(images=images))
+    return images
+
+
+def test_builds_once_then_skips(images):
+    executor.ensure_base_image()
+    assert len(images.builds) == 1
+    assert images.builds[0]["labels"] == {executor.DIGEST_LABEL: executor.dockerfile_digest()}
+    # Dockerfile.base has no COPY, so only the Dockerfile is sent as build context
+    assert images.builds[0]["path"] != executor.PROJECT_DIR
+
+    executor.ensure_base_image()
+    assert len(images.builds) == 1
+
+
+def test_rebuilds_when_dockerfile_changed(images):
+    images.labels = {executor.DIGEST_LABEL: "digest-of-an-older-dockerfile"}
+    executor.ensure_base_image()
+    assert len(images.builds) == 1
@@ -0,0 +1,127 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import cache, database, metrics, models, storage
+from app.database import Base
+from app.routers import agent, front_auth, front_job, sellers
+
+
+def lookups(name: str, result: str) -> float:
+    return metrics.CACHE_REQUESTS.value(cache=name, result=result)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    session.add(models.User(id=1, email="owner@gridx.com", password="x", credits=10))
+    session.add(models.User(id=2, email="other@gridx.com", password="x"))
+    session.add(models.Agent(id="agent-1", owner_id=1, status="IDLE"))
+    session.add(models.Job(id=1, title="t", status="RUNNING", owner_id=1, original_code_url="c", original_req_url="r",
+                       original_data_url="d"))
+    session.add_all([models.Subtask(id=i, job_id=1, status="PENDING", chunk_file_url=f"chunk{i}") for i in (1, 2)])
+    session.commit()
+    session.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(agent.router, prefix="/agent")
+    app.include_router(front_job.router, prefix="/jobs")
+    app.include_router(front_auth.router, prefix="/auth")
+    app.include_router(sellers.router, prefix="/stats")
+    app.dependency_overrides[database.get_db] = get_db
+    monkeypatch.setattr(agent, "aggregate_pytorch_weights", lambda job_id, db: "http://testserver/files/final.pth")
+    storage.set_storage(storage.MemoryStorage(base_url="http://testserver/files"))
+    cache.set_cache(cache.MemoryCache())
+    yield TestClient(app)
+    cache.set_cache(None)
+    storage.set_storage(None)
+
+
+def test_hit_and_not_modified(client):
+    misses, hits = lookups("job_status", "miss"), lookups("job_status", "hit")
+
+    first = client.get("/jobs/1")
+    second = client.get("/jobs/1")
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json() and first.json()["total_subtasks"] == 2
+    assert first.headers["etag"] == second.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+    assert lookups("job_status", "miss") == misses + 1 and lookups("job_status", "hit") == hits + 1
+
+    revalidated = client.get("/jobs/1", headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert client.get("/jobs/1", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    # response_model still shapes cached responses
+    assert client.get("/auth/wallet/1").json() == {"user_id": 1, "credits": 10, "role": "buyer"}
+    assert [a["id"] for a in client.get("/stats/agents/online").json()] == ["agent-1"]
+    assert client.get("/jobs/list/1").json()[0]["id"] == 1
+
+
+def test_writes_invalidate(client):
+    listed = client.get("/jobs/list/1").json()[0]
+    assert client.get("/jobs/1").json()["completed_subtasks"] == 0
+
+    task = client.post("/agent/request_task", json={"agent_id": "agent-1"}).json()
+    client.post("/agent/complete_task", json={"agent_id": "agent-1", "task_id": task["task_id"]})
+    assert client.get("/jobs/1").json()["completed_subtasks"] == 1
+    assert client.get("/jobs/list/1").json()[0] == listed # Still RUNNING, list not invalidated
+
+    task = client.post("/agent/request_task", json={"agent_id": "agent-1"}).json()
+    client.post("/agent/complete_task", json={"agent_id": "agent-1", "task_id": task["task_id"]})
+    status = client.get("/jobs/1").json()
+    assert status["status"] == "COMPLETED" and status["final_result_url"] == "http://testserver/files/final.pth"
+    assert client.get("/jobs/list/1").json()[0]["status"] == "COMPLETED"
+    assert client.get("/jobs/download/1", params={"user_id": 1}).json()["final_result_url"].endswith("final.pth")
+
+    client.post("/agent/register", json={"id": "agent-2", "email": "owner@gridx.com"})
+    assert len(client.get("/stats/agents/online").json()) == 2
+
+
+def test_errors_are_not_cached_and_owner_check_holds(client):
+    for task_id in (1, 2):
+        client.post("/agent/request_task", json={"agent_id": "agent-1"})
+        client.post("/agent/complete_task", json={"agent_id": "agent-1", "task_id": task_id})
+
+    assert client.get("/jobs/download/1", params={"user_id": 1}).status_code == 200
+    assert client.get("/jobs/download/1", params={"user_id": 2}).status_code == 403
+    assert client.get("/jobs/99").status_code == 404
+    assert client.get("/jobs/99").status_code == 404
+
+
+def test_memory_cache_ttl_and_lru():
+    store = cache.MemoryCache(max_entries=2)
+    entry = cache.CachedResponse(b"{}", '"x"')
+    store.set("a", entry, ttl=60)
+    store.set("b", entry, ttl=60)
+    assert store.get("a") == entry # Now most recently used
+    store.set("c", entry, ttl=60)
+    assert store.get("b") is None and store.get("a") == entry and store.size() == 2
+
+    store.set("short", entry, ttl=0.01)
+    time.sleep(0.02)
+    assert store.get("short") is None
+
+    key = cache.cache_key(store, "job_status", (1,), ["job:1"])
+    store.bump(["job:1"])
+    assert cache.cache_key(store, "job_status", (1,), ["job:1"]) != key
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import database, models, storage
+from app.database import Base
+from app.routers import agent, front_job
+
+
+@pytest.fixture
+def client():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    session.add(models.User(id=1, email="owner@gridx.com", password="x"))
+    session.add(models.Agent(id="agent-1", owner_id=1, status="IDLE"))
+    session.add(models.Job(id=1, title="t", status="RUNNING", owner_id=1, original_code_url="c", original_req_url="r"))
+    session.add_all([models.Subtask(id=i, job_id=1, status="PENDING", chunk_file_url=f"chunk{i}") for i in (1, 2)])
+    session.commit()
+    session.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(agent.router, prefix="/agent")
+    app.include_router(front_job.router, prefix="/jobs")
+    app.dependency_overrides[database.get_db] = get_db
+    storage.set_storage(storage.MemoryStorage(base_url="http://testserver/files"))
+    yield TestClient(app)
+    storage.set_storage(None)
+
+
+def heartbeat(client, running):
+    resp = client.post("/agent/heartbeat", json={"id": "agent-1", "status": "BUSY", "running_tasks": running})
+    return resp.json()["cancel_tasks"]
+
+
+def test_cancelled_job_cancels_running_tasks_on_heartbeat(client):
+    task_id = client.post("/agent/request_task", json={"agent_id": "agent-1"}).json()["task_id"]
+    assert heartbeat(client, [task_id]) == []
+
+    resp = client.post("/jobs/1/cancel", params={"user_id": 1})
+    assert resp.json()["cancelled_subtasks"] == 2
+
+    assert heartbeat(client, [task_id]) == [task_id]
+    # Nothing left to hand out, and a late completion is refused
+    assert client.post("/agent/request_task", json={"agent_id": "agent-1"}).json()["task_id"] is None
+    resp = client.post("/agent/complete_task", json={"agent_id": "agent-1", "task_id": task_id})
+    assert resp.status_code == 409
+
+
+def test_only_the_owner_can_cancel(client):
+    assert client.post("/jobs/1/cancel", params={"user_id": 2}).status_code == 403
+
+
+def fail(client, task_id, reason="timeout"):
+    return client.post("/agent/fail_task", json={"agent_id": "agent-1", "task_id": task_id, "reason": reason})
+
+
+def test_failed_task_is_requeued_then_fails_the_job(client, monkeypatch):
+    monkeypatch.setattr(agent, "TASK_MAX_ATTEMPTS", 2)
+    claim = lambda: client.post("/agent/request_task", json={"agent_id": "agent-1"}).json()["task_id"]
+    task_id = claim()
+
+    resp = fail(client, task_id)
+    assert resp.status_code == 200 and resp.json() == {"task_id": task_id, "status": "PENDING", "failures": 1}
+    # Not running anymore: a late report or completion is refused
+    assert fail(client, task_id).status_code == 409
+    assert client.post("/agent/complete_task", json={"agent_id": "agent-1", "task_id": task_id}).status_code in (400, 409)
+
+    # Second failure of the same subtask fails it, its job, and cancels the rest
+    assert sorted([claim(), claim()]) == [1, 2]
+    assert fail(client, task_id).json()["status"] == "FAILED"
+    assert claim() is None
+    assert client.get("/jobs/1", params={"user_id": 1}).json()["status"] == "FAILED"
+
+
+def test_only_the_assigned_agent_can_fail_a_task(client):
+    task_id = client.post("/agent/request_task", json={"agent_id": "agent-1"}).json()["task_id"]
+    resp = client.post("/agent/fail_task", json={"agent_id": "agent-2", "task_id": task_id, "reason": "error"})
+    assert resp.status_code == 400
+    assert fail(client, 999).status_code == 404
@@ -0,0 +1,45 @@
+import io
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+sys.path.insert(0, str(ROOT))
+
+from app.chunk_formats import CONTENT_TYPES, encode_chunk, resolve_format
+from worker.utils import CHUNK_FILENAMES, materialize_csv
+
+
+def chunk() -> pd.DataFrame:
+    return pd.DataFrame({
+        "feature_a": [0.5, -1.25, 3.0, 1e-3],
+        "feature_b": [1, 2, 3, 4],
+        "label": ["cat", "dog", "cat, tabby", "bird"],
+    })
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_columnar_chunk_reaches_train_py_as_the_same_csv(fmt, tmp_path):
+    pytest.importorskip("pyarrow")
+    assert resolve_format(fmt) == fmt
+    data, content_type = encode_chunk(chunk(), fmt)
+    assert content_type == CONTENT_TYPES[fmt]
+
+    # What the worker does with the downloaded chunk (see prepare_task)
+    chunk_path = tmp_path / CHUNK_FILENAMES[fmt]
+    chunk_path.write_bytes(data)
+    materialize_csv(str(chunk_path), fmt, str(tmp_path / "data.csv"))
+
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "data.csv"), chunk())
+
+
+def test_without_pyarrow_chunks_fall_back_to_csv(monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None) # import pyarrow -> ImportError
+    assert resolve_format("parquet") == "csv" and resolve_format("arrow") == "csv"
+
+    data, content_type = encode_chunk(chunk(), resolve_format("parquet"))
+    assert content_type == "text/csv"
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(data)), chunk())
@@ -0,0 +1,348 @@
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from worker import executor
+
+
+class FakeContainer:
+    """Just enough of docker's Container to count how often we ask the daemon."""
+
+    def __init__(self, status="running"):
+        self.status = status
+        self.reloads = 0
+        self.killed = False
+        self.attrs = {"State": {"ExitCode": 137}}
+        self.stdout = queue.Queue() # What the runner prints
+
+    def reload(self):
+        self.reloads += 1
+
+    def kill(self):
+        self.killed = True
+        self.status = "exited"
+        self.stdout.put(None)
+
+    def logs(self, **kwargs):
+        return FakeStream(self.stdout)
+
+    def remove(self, force=False):
+        self.removed = True
+
+
+class FakeStream:
+    """A followed log stream: yields what the container prints until closed."""
+
+    def __init__(self, lines: queue.Queue):
+        self.lines = lines
+
+    def __iter__(self):
+        while (chunk := self.lines.get()) is not None:
+            yield chunk
+
+    def close(self):
+        self.lines.put(None)
+
+
+class FakeContainers:
+    """docker's ContainerCollection: run() starts a FakeContainer and records its bind mounts."""
+
+    def __init__(self):
+        self.started = []
+
+    def run(self, **kwargs):
+        container = FakeContainer()
+        container.options = kwargs
+        container.workdir = next(host for host, bind in kwargs["volumes"].items() if bind["bind"] == "/app")
+        self.started.append(container)
+        return container
+
+
+def test_container_state_is_polled_once_a_second_not_every_tick(monkeypatch, tmp_path):
+    monkeypatch.setattr(executor, "CONTAINER_POLL_SECONDS", 0.5)
+    container = FakeContainer()
+    threading.Timer(1.2, lambda: setattr(container, "status", "exited")).start()
+
+    start = time.time()
+    reason = executor.supervise(executor.ContainerWatch(container), container.kill, str(tmp_path), 0, 0)
+    assert reason is None and 1.2 <= time.time() - start < 2.5
+    assert container.reloads <= 3 # A 0.05s poll would have asked ~30 times
+
+
+def test_ended_hint_checks_right_away(monkeypatch):
+    monkeypatch.setattr(executor, "CONTAINER_POLL_SECONDS", 60)
+    container = FakeContainer()
+    ended = threading.Event()
+    watch = executor.ContainerWatch(container, ended=ended.is_set)
+    assert watch() and container.reloads == 0
+
+    container.status = "exited"
+    ended.set()
+    assert not watch() and container.reloads == 1
+
+
+def test_cancel_and_deadline_do_not_wait_for_the_container_poll(monkeypatch, tmp_path):
+    monkeypatch.setattr(executor, "CONTAINER_POLL_SECONDS", 60)
+    container = FakeContainer()
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    start = time.time()
+    assert executor.supervise(executor.ContainerWatch(container), container.kill, str(tmp_path), 0, 0,
+                              cancel) == "cancelled"
+    assert container.killed and time.time() - start < 1
+
+    container = FakeContainer()
+    assert executor.supervise(executor.ContainerWatch(container), container.kill, str(tmp_path), 0.2, 0) == "timeout"
+    assert container.killed and container.reloads == 0
+
+
+@pytest.fixture
+def pool(monkeypatch, tmp_path):
+    containers = FakeContainers()
+    monkeypatch.setattr(executor, "_client", SimpleNamespace(containers=containers))
+    pool = executor.WarmPool()
+    pool.root = str(tmp_path / "pool")
+    pool.containers = containers
+    yield pool
+    pool.shutdown()
+
+
+KEY = ("deps:abc", 1.0, "512m", "256m")
+
+
+def test_warm_containers_are_reused_within_a_job_only(pool):
+    first = pool.acquire(KEY, job_id=1)
+    pool.release(first)
+    assert pool.acquire(KEY, job_id=2) is not first # Another job never gets it
+    again = pool.acquire(KEY, job_id=1)
+    assert again is first and pool.stats["reused"] == 1
+
+    pool.prewarm(*KEY)
+    fresh = pool.containers.started[-1]
+    assert pool.acquire(KEY, job_id=3).container is fresh # Unused containers go to any job
+
+
+def test_tmp_is_sized_by_the_disk_limit_of_the_key(pool):
+    small = pool.acquire(KEY, job_id=1)
+    assert small.container.options["tmpfs"] == {"/tmp": "size=256m"}
+    pool.release(small)
+
+    large = pool.acquire(KEY[:3] + ("2g",), job_id=1)
+    assert large is not small # A container sized for another disk limit is never handed out
+    assert large.container.options["tmpfs"] == {"/tmp": "size=2g"}
+
+
+def test_release_wipes_the_workspace_and_recycles(pool, monkeypatch):
+    monkeypatch.setattr(executor, "WARM_POOL_MAX_USES", 2)
+    pooled = pool.acquire(KEY, job_id=1)
+    Path(pooled.workdir, "model.pth").write_bytes(b"x")
+    os.makedirs(os.path.join(pooled.workdir, "cache", "nested"))
+    pool.release(pooled)
+    assert os.listdir(pooled.workdir) == [] and pool.idle[KEY] == [pooled]
+
+    assert pool.acquire(KEY, job_id=1) is pooled
+    pool.release(pooled) # Second use: worn out
+    assert pool.idle[KEY] == [] and pooled.container.removed and not os.path.exists(pooled.workdir)
+
+    pooled = pool.acquire(KEY, job_id=1)
+    pool.release(pooled, healthy=False)
+    assert pool.idle[KEY] == [] and pooled.container.removed
+    assert pool.stats["recycled"] == 2
+
+
+def test_workspace_that_cannot_be_cleaned_is_not_reused(pool, monkeypatch):
+    rmtree = shutil.rmtree
+    def stuck(path, ignore_errors=False):
+        if not ignore_errors:
+            raise PermissionError(path)
+        rmtree(path, ignore_errors=True)
+    monkeypatch.setattr(executor.shutil, "rmtree", stuck)
+
+    pooled = pool.acquire(KEY, job_id=1)
+    os.makedirs(os.path.join(pooled.workdir, "owned_by_sandbox"))
+    pool.release(pooled)
+    assert pool.idle[KEY] == [] and pooled.container.removed
+
+
+def test_full_pool_drops_the_longest_idle_container(pool, monkeypatch):
+    monkeypatch.setattr(executor, "WARM_POOL_MAX_IDLE", 2)
+    held = [pool.acquire(KEY, job_id=job) for job in (1, 2, 3)]
+    for pooled in held:
+        pool.release(pooled)
+    assert pool.idle[KEY] == held[1:] and held[0].container.removed
+
+
+def test_run_hands_the_task_to_the_runner_and_moves_outputs_back(pool, tmp_path):
+    source = tmp_path / "task"
+    source.mkdir()
+    (source / "train.py").write_text("print('hi')")
+
+    def runner():
+        # What sandbox_runner.py does inside the container
+        container, task = runner_receives_task(pool)
+        workdir = Path(container.workdir)
+        (workdir / ".gridx_logs").write_text(f"ran {task['entry_point']}")
+        (workdir / "model.pth").write_bytes(b"weights")
+        container.stdout.put(b"torch imported\nGRIDX_DONE " + json.dumps({"nonce": "stale", "exit_code": 3}).encode())
+        container.stdout.put(b"\nGRIDX_DONE " + json.dumps({"nonce": task["nonce"], "exit_code": 0,
+                                                              "cpu_seconds": 0.5}).encode() + b"\n")
+    threading.Thread(target=runner, daemon=True).start()
+
+    image, cpu_limit, mem_limit, disk_limit = KEY
+    result = pool.run(str(source), image, "train.py", cpu_limit, mem_limit, timeout=10, disk_limit=disk_limit,
+                      job_id=7)
+    assert result["status"] == "success" and result["logs"] == "ran train.py"
+    assert result["usage"]["cpu_seconds"] == 0.5
+    assert sorted(os.listdir(source)) == ["model.pth", "train.py"]
+    assert pool.idle[KEY][0].job_id == 7 and os.listdir(pool.idle[KEY][0].workdir) == []
+
+
+def runner_receives_task(pool) -> tuple:
+    while not pool.containers.started:
+        time.sleep(0.01)
+    container = pool.containers.started[0]
+    task_file = Path(container.workdir, ".gridx_task")
+    while not task_file.exists():
+        time.sleep(0.01)
+    task = json.loads(task_file.read_text())
+    task_file.unlink()
+    return container, task
+
+
+def test_task_cannot_forge_the_done_report(pool, tmp_path):
+    source = tmp_path / "task"
+    source.mkdir()
+    (source / "train.py").write_text("...")
+
+    def task_still_running():
+        container, _ = runner_receives_task(pool)
+        # The task writes the old done marker itself and keeps going
+        Path(container.workdir, ".gridx_done").write_text(json.dumps({"exit_code": 0}))
+    threading.Thread(target=task_still_running, daemon=True).start()
+
+    image, cpu_limit, mem_limit, disk_limit = KEY
+    result = pool.run(str(source), image, "train.py", cpu_limit, mem_limit, timeout=0.5, disk_limit=disk_limit,
+                      job_id=7)
+    assert result["status"] == "timeout" # Limits still enforced
+    container = pool.containers.started[0]
+    assert container.killed and container.removed and pool.idle[KEY] == [] # Not reused
+
+
+class FakeImage:
+    def __init__(self, labels):
+        self.labels = labels
+
+
+class FakeBuildContainer:
+    """The pip install container of a dependency-image build."""
+
+    def __init__(self, docker, exit_code):
+        self.docker = docker
+        self.exit_code = exit_code
+        self.removed = False
+
+    def wait(self, timeout=None):
+        return {"StatusCode": self.exit_code}
+
+    def logs(self):
+        return b"ERROR: No matching distribution found for nosuchpackage"
+
+    def commit(self, repository, tag, changes):
+        labels = dict(change[len("LABEL "):].replace('"', "").split("=", 1)
+                      for change in changes if change.startswith("LABEL "))
+        self.docker.images.tags[f"{repository}:{tag}"] = FakeImage(labels)
+
+    def remove(self, force=False):
+        self.removed = True
+
+
+class FakeDocker:
+    """Images by tag, and containers.run() that records pip install builds."""
+
+    def __init__(self, base_digest="1f2e3d4c5b6a", exit_code=0):
+        self.images = SimpleNamespace(tags={executor.BASE_IMAGE: FakeImage({executor.DIGEST_LABEL: base_digest})})
+        self.images.get = self.get_image
+        self.builds = []
+        self.exit_code = exit_code
+        self.containers = SimpleNamespace(run=self.run)
+
+    def get_image(self, tag):
+        if tag not in self.images.tags:
+            raise executor.docker.errors.ImageNotFound(tag)
+        return self.images.tags[tag]
+
+    def run(self, **kwargs):
+        container = FakeBuildContainer(self, self.exit_code)
+        self.builds.append((kwargs, container))
+        return container
+
+
+@pytest.fixture
+def deps(monkeypatch):
+    fake = FakeDocker()
+    monkeypatch.setattr(executor, "_client", fake)
+    monkeypatch.setattr(executor, "dependency_cache_stats",
+                        {"hits": 0, "misses": 0, "install_seconds": 0.0, "saved_seconds": 0.0})
+    return fake
+
+
+def requirements(tmp_path, name: str, text: str) -> str:
+    path = tmp_path / name
+    path.mkdir()
+    (path / "requirements.txt").write_text(text)
+    return str(path)
+
+
+def test_requirements_hash_ignores_order_comments_and_blanks(tmp_path):
+    a = requirements(tmp_path, "a", "numpy==1.26\npandas\n")
+    b = requirements(tmp_path, "b", "# data\npandas  # frames\n\nnumpy==1.26\n")
+    assert executor.requirements_hash(a) == executor.requirements_hash(b)
+    assert executor.requirements_hash(requirements(tmp_path, "c", "pandas\n")) != executor.requirements_hash(a)
+    assert executor.requirements_hash(requirements(tmp_path, "d", "# nothing\n")) is None
+    assert executor.requirements_hash(str(tmp_path)) is None # No requirements.txt
+
+
+def test_dependency_image_is_built_once_then_reused(deps, tmp_path):
+    first = executor.ensure_dependency_image(requirements(tmp_path, "a", "pandas\nnumpy\n"))
+    again = executor.ensure_dependency_image(requirements(tmp_path, "b", "numpy\npandas\n"))
+
+    assert first == again and first.startswith(executor.DEPS_IMAGE_REPO + ":")
+    assert len(deps.builds) == 1
+    build, container = deps.builds[0]
+    assert "pip install" in build["command"] and build["network_mode"] == "bridge"
+    assert container.removed
+    report = executor.dependency_cache_report()
+    assert (report["hits"], report["misses"], report["hit_rate"]) == (1, 1, 0.5)
+    assert report["saved_seconds"] == float(deps.images.tags[first].labels["gridx.install_seconds"])
+
+    # Nothing to install: the base image itself, no build
+    assert executor.ensure_dependency_image(str(tmp_path)) == executor.BASE_IMAGE
+    assert len(deps.builds) == 1
+
+
+def test_rebuilt_base_image_invalidates_dependency_images(deps, tmp_path):
+    source = requirements(tmp_path, "a", "pandas\n")
+    old = executor.ensure_dependency_image(source)
+    deps.images.tags[executor.BASE_IMAGE] = FakeImage({executor.DIGEST_LABEL: "9a8b7c6d5e4f"})
+
+    new = executor.ensure_dependency_image(source)
+    assert new != old and len(deps.builds) == 2
+
+
+def test_failed_install_raises_and_caches_nothing(deps, tmp_path):
+    deps.exit_code = 1
+    with pytest.raises(RuntimeError, match="pip install failed"):
+        executor.ensure_dependency_image(requirements(tmp_path, "a", "nosuchpackage\n"))
+    assert deps.builds[0][1].removed
+    assert list(deps.images.tags) == [executor.BASE_IMAGE]
+    assert executor.dependency_cache_report()["misses"] == 0
@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+
+def test_api_starts_without_heavy_modules(tmp_path):
+    # Fresh interpreter: the test session itself may already have torch loaded
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}", STORAGE_BACKEND="memory")
+    code = (
+        "import sys, app.main\n"
+        "print('loaded:', ','.join(m for m in ('torch', 'pandas', 'pyarrow', 'supabase') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "loaded:"
@@ -0,0 +1,122 @@
+import json
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import database, logs, metrics, models, storage
+from app.database import Base
+from app.routers import agent
+from worker import logs as worker_logs
+
+
+@pytest.fixture
+def captured():
+    """The app's loggers feed a ContextQueueHandler we can drain (no listener thread)."""
+    handler = logs.ContextQueueHandler(maxsize=100)
+    logger = logging.getLogger("app")
+    previous = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    yield handler
+    logger.removeHandler(handler)
+    logger.setLevel(previous)
+
+
+def drain(handler) -> list:
+    records = []
+    while handler.queue.qsize():
+        records.append(handler.queue.get_nowait())
+    return records
+
+
+def test_json_lines_carry_bound_ids_and_extra_fields(captured):
+    log = logging.getLogger("app.test")
+    with logs.bound(job_id=7, subtask_id=42):
+        log.info("chunk %d stored", 3, extra={"bytes": 1024})
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.exception("failed")
+
+    stored, failed = drain(captured)
+    entry = json.loads(logs.JsonFormatter({"service": "backend"}).format(stored))
+    assert entry["msg"] == "chunk 3 stored"
+    assert entry["level"] == "INFO" and entry["logger"] == "app.test" and entry["service"] == "backend"
+    assert entry["job_id"] == 7 and entry["subtask_id"] == 42 and entry["bytes"] == 1024
+    assert "job_id" not in json.loads(logs.JsonFormatter().format(failed)) # Unbound after the block
+    assert "ValueError: boom" in json.loads(logs.JsonFormatter().format(failed))["exc"]
+
+
+def test_high_frequency_events_are_sampled(monkeypatch):
+    monkeypatch.setattr(logs, "_sample_rates", {"heartbeat": 0.0, "poll": 0.5})
+    assert logs.sampled("heartbeat") is None
+    assert logs.sampled("split") == {"event": "split"} # Unlisted events are always kept
+    kept = [logs.sampled("poll") for _ in range(2000)]
+    assert 800 < sum(1 for k in kept if k) < 1200
+    assert {"event": "poll", "sample_rate": 0.5} in kept
+    assert logs.parse_sample_rates("heartbeat=0.01, poll=2") == {"heartbeat": 0.01, "poll": 1.0}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logs.ContextQueueHandler(maxsize=1)
+    before = metrics.LOG_RECORDS_DROPPED.value()
+    for _ in range(3):
+        handler.emit(logging.LogRecord("app", logging.INFO, __file__, 1, "x", None, None))
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 2
+    assert metrics.LOG_RECORDS_DROPPED.value() == before + 2
+
+
+def test_request_lines_carry_worker_correlation_ids(captured):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    session.add(models.User(id=1, email="owner@gridx.com", password="x"))
+    session.add(models.Agent(id="agent-1", owner_id=1, status="IDLE"))
+    session.add(models.Job(id=3, title="t", status="RUNNING", owner_id=1, original_code_url="c", original_req_url="r"))
+    session.add(models.Subtask(id=9, job_id=3, status="PENDING", chunk_file_url="chunk"))
+    session.commit()
+    session.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.add_middleware(logs.LogContextMiddleware)
+    app.include_router(agent.router, prefix="/agent")
+    app.dependency_overrides[database.get_db] = get_db
+    storage.set_storage(storage.MemoryStorage(base_url="http://testserver/files"))
+    try:
+        client = TestClient(app)
+        resp = client.post("/agent/request_task", json={"agent_id": "agent-1"}, headers={"X-Request-ID": "req-1"})
+        generated = client.post("/agent/request_task", json={"agent_id": "agent-1"}).headers["x-request-id"]
+    finally:
+        storage.set_storage(None)
+
+    assert resp.headers["x-request-id"] == "req-1"
+    assert len(generated) == 16
+    assigned = next(r for r in drain(captured) if r.msg == "🚀 Subtask assigned")
+    assert assigned.context == {"request_id": "req-1", "agent_id": "agent-1", "job_id": 3, "subtask_id": 9}
+
+
+def test_worker_sends_bound_ids_as_headers(monkeypatch):
+    monkeypatch.setitem(worker_logs._static, "agent_id", "agent-1")
+    assert worker_logs.headers() == {"X-Agent-ID": "agent-1"}
+    with worker_logs.bound(job_id=3, subtask_id=9):
+        assert worker_logs.headers() == {"X-Agent-ID": "agent-1", "X-Job-ID": "3", "X-Subtask-ID": "9"}
+    assert "X-Job-ID" not in worker_logs.headers()
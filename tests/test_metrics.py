@@ -0,0 +1,94 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import database, metrics, models, storage
+from app.database import Base
+from app.routers import agent, front_job
+from app.routers import metrics as metrics_router
+
+
+def sample(text: str, line_prefix: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+@pytest.fixture
+def client():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    session.add(models.User(id=1, email="owner@gridx.com", password="x"))
+    session.add(models.Agent(id="agent-1", owner_id=1, status="IDLE"))
+    session.add(models.Job(id=1, title="t", status="RUNNING", owner_id=1, original_code_url="c", original_req_url="r"))
+    session.add_all([models.Subtask(id=i, job_id=1, status="PENDING", chunk_file_url=f"chunk{i}") for i in (1, 2, 3)])
+    session.commit()
+    session.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(agent.router, prefix="/agent")
+    app.include_router(front_job.router, prefix="/jobs")
+    app.include_router(metrics_router.router)
+    app.dependency_overrides[database.get_db] = get_db
+    storage.set_storage(storage.MemoryStorage(base_url="http://testserver/files"))
+    db = Session()
+    metrics.resync_subtasks(db, force=True) # Fresh database, fresh queue sizes
+    db.close()
+    yield TestClient(app)
+    storage.set_storage(None)
+
+
+def test_histogram_exposition():
+    histogram = metrics.Histogram("demo_seconds", "demo", buckets=(0.1, 1))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    histogram.observe(5, route="/a")
+    text = histogram.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{route="/a"} 3' in text
+    assert 'demo_seconds_sum{route="/a"} 5.55' in text
+
+
+def test_scheduling_metrics_follow_state_changes(client):
+    before = client.get("/metrics").text
+    claimed = sample(before, 'gridx_task_claim_seconds_count{result="claimed"}')
+    assert sample(before, 'gridx_subtasks{state="PENDING"}') == 3
+
+    client.post("/agent/heartbeat", json={"id": "agent-1", "status": "BUSY"})
+    task_id = client.post("/agent/request_task", json={"agent_id": "agent-1"}).json()["task_id"]
+    client.post("/agent/complete_task", json={"agent_id": "agent-1", "task_id": task_id, "result_url": "http://x/model.pth"})
+    client.post("/jobs/1/cancel", params={"user_id": 1})
+
+    text = client.get("/metrics").text
+    assert sample(text, 'gridx_subtasks{state="PENDING"}') == 0
+    assert sample(text, 'gridx_subtasks{state="RUNNING"}') == 0
+    assert sample(text, 'gridx_subtasks{state="COMPLETED"}') == 1
+    assert sample(text, 'gridx_subtasks{state="CANCELLED"}') == 2
+    assert sample(text, 'gridx_task_claim_seconds_count{result="claimed"}') == claimed + 1
+    assert sample(text, 'gridx_agents_online{status="BUSY"}') >= 1
+    # Route templates, not raw paths
+    assert 'route="/jobs/{job_id}/cancel"' in text
+    assert 'route="/agent/request_task",status="200"' in text
@@ -0,0 +1,84 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from worker.executor import LogBuffer
+from worker.process_executor import ProcessExecutor
+
+
+@pytest.fixture
+def executor(tmp_path):
+    return ProcessExecutor(venv_root=str(tmp_path / "venvs"))
+
+
+def workspace(tmp_path, code: str) -> str:
+    path = tmp_path / "ws"
+    path.mkdir()
+    (path / "train.py").write_text(code)
+    return str(path)
+
+
+def test_runs_in_workspace_with_private_tmp(executor, tmp_path):
+    code = "import os, tempfile\nopen('model.pth', 'w').write(tempfile.gettempdir())\nprint('trained')\n"
+    source = workspace(tmp_path, code)
+
+    result = executor.run(source, 1.0, "512m", "train.py")
+
+    assert result["status"] == "success"
+    assert "trained" in result["logs"]
+    private_tmp = (Path(source) / "model.pth").read_text()
+    assert "gridx_tmp_" in private_tmp and not Path(private_tmp).exists() # Removed afterwards
+
+
+def test_reports_phase_timings_and_usage(executor, tmp_path):
+    code = "import time\nblob = bytearray(64 * 1024 * 1024)\nend = time.process_time() + 0.3\nwhile time.process_time() < end: pass\n"
+    result = executor.run(workspace(tmp_path, code), 1.0, "512m", "train.py")
+
+    assert set(result["timings"]) == {"dependencies", "container_start", "training"}
+    assert result["timings"]["training"] >= 0.3
+    assert result["usage"]["cpu_seconds"] >= 0.3
+    assert result["usage"]["peak_memory_bytes"] >= 64 * 1024 * 1024
+
+
+def test_failure_exit_code(executor, tmp_path):
+    result = executor.run(workspace(tmp_path, "raise SystemExit(3)"), 1.0, "512m", "train.py")
+    assert (result["status"], result["exit_code"]) == ("error", 3)
+
+
+def test_timeout_kills_the_task(executor, tmp_path):
+    result = executor.run(workspace(tmp_path, "import time\ntime.sleep(60)"), 1.0, "512m", "train.py", timeout=0.5)
+    assert result["status"] == "timeout"
+
+
+def test_cancel_event_stops_the_task(executor, tmp_path):
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    result = executor.run(workspace(tmp_path, "import time\ntime.sleep(60)"), 1.0, "512m", "train.py",
+                          cancel_event=cancel)
+    assert result["status"] == "cancelled"
+
+
+def test_cpu_seconds_limit(executor, tmp_path):
+    result = executor.run(workspace(tmp_path, "while True: pass"), 1.0, "512m", "train.py", cpu_seconds=1)
+    assert result["status"] == "cpu_limit"
+
+
+def test_limits_are_set_from_the_worker_before_the_task_starts(executor, tmp_path):
+    code = ("import resource, sys\nprint(resource.getrlimit(resource.RLIMIT_FSIZE)[0], "
+            "resource.getrlimit(resource.RLIMIT_CPU)[0], repr(sys.stdin.read()))\n")
+    result = executor.run(workspace(tmp_path, code), 1.0, "512m", "train.py", cpu_seconds=30, disk_limit="1m")
+    assert result["status"] == "success"
+    assert result["logs"].split() == [str(1024 * 1024), "30", "''"] # Empty stdin once started
+
+
+def test_log_buffer_keeps_head_and_tail():
+    logs = LogBuffer(limit=20)
+    for i in range(10):
+        logs.write(f"line{i}\n".encode())
+    text = logs.text()
+    assert text.startswith("line0") and text.endswith("line9\n")
+    assert "40 bytes of logs truncated" in text
@@ -0,0 +1,135 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import database, models, profiling, storage
+from app.database import Base
+from app.routers import agent, debug
+
+# Endpoints with known behaviour, registered the same way as the real routers
+extra = APIRouter(route_class=profiling.ProfiledRoute)
+
+
+@extra.get("/n_plus_one")
+def n_plus_one(db: Session = Depends(database.get_db)):
+    subtasks = db.query(models.Subtask).all()
+    return {"titles": [subtask.job.title for subtask in subtasks]} # One lazy load per subtask
+
+
+def slow_part():
+    time.sleep(0.2)
+
+
+@extra.get("/sleepy")
+def sleepy():
+    slow_part()
+    return {"ok": True}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    session.add(models.User(id=1, email="owner@gridx.com", password="x"))
+    session.add(models.Agent(id="agent-1", owner_id=1, status="IDLE"))
+    session.add_all([models.Job(id=i, title=f"job{i}", status="RUNNING", owner_id=1,
+                                original_code_url="c", original_req_url="r") for i in range(1, 7)])
+    session.add_all([models.Subtask(id=i, job_id=i, status="PENDING", chunk_file_url=f"chunk{i}") for i in range(1, 7)])
+    session.commit()
+    session.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    profiling.install(engine)
+    profiling.clear()
+
+    app = FastAPI()
+    app.add_middleware(profiling.ProfilingMiddleware)
+    app.include_router(agent.router, prefix="/agent")
+    app.include_router(extra)
+    app.include_router(debug.router, prefix="/debug")
+    app.dependency_overrides[database.get_db] = get_db
+    storage.set_storage(profiling.instrument_storage(storage.MemoryStorage(base_url="http://testserver/files"), force=True))
+    yield TestClient(app)
+    storage.set_storage(None)
+
+
+def latest(client, **params) -> dict:
+    return client.get("/debug/profiles", params=params).json()["profiles"][0]
+
+
+def test_sql_and_storage_are_counted_per_request(client):
+    assert client.post("/agent/request_task", json={"agent_id": "agent-1"}).json()["task_id"] is not None
+
+    profile = latest(client, route="/agent/request_task")
+    assert profile["status"] == 200
+    assert profile["sql_count"] >= 4 # Subtask, its job (lazy load), agent, update
+    assert any("FROM jobs" in query["statement"] for query in profile["queries"])
+    assert profile["storage_calls"] == 1 # Presigned result upload
+    assert profile["handler_ms"] <= profile["total_ms"]
+    assert profile["sql_ms"] <= profile["handler_ms"]
+
+
+def test_repeated_statements_are_flagged(client):
+    client.get("/n_plus_one")
+
+    repeated = latest(client, route="/n_plus_one")["repeated_queries"]
+    assert len(repeated) == 1
+    assert repeated[0]["count"] == 6 and "FROM jobs" in repeated[0]["statement"]
+
+
+def test_sampler_attributes_time_to_the_handler_stack(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MODE", "sampler")
+    client.get("/sleepy")
+
+    profile = latest(client, route="/sleepy")
+    assert profile["sampled"]
+    assert profile["handler_ms"] >= 200
+    assert "slow_part" in profile["stacks"][0]["stack"]
+    assert profile["stacks"][0]["stack"].startswith("test_profiling.py:sleepy")
+
+
+def test_cprofile_mode_reports_top_functions(client, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_MODE", "cprofile")
+    client.get("/sleepy")
+
+    functions = [entry["function"] for entry in latest(client, route="/sleepy")["functions"]]
+    assert any("slow_part" in name for name in functions)
+
+
+def test_slow_requests_and_queries_are_logged_with_stack(client, monkeypatch, caplog):
+    monkeypatch.setattr(profiling, "SLOW_REQUEST_MS", 0)
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0)
+    client.get("/n_plus_one")
+    client.post("/agent/request_task", json={"agent_id": "agent-1"})
+
+    out = caplog.text
+    assert "🐢 Slow request GET /n_plus_one -> 200" in out
+    assert "🔁 6x" in out
+    assert "🐢 Slow query" in out and "FROM jobs" in out
+    assert 'agent.py", line' in out and "in request_task" in out # Where the query came from
+
+
+def test_endpoints_run_unchanged_without_a_profile():
+    route = next(route for route in extra.routes if route.path == "/sleepy")
+    assert route.endpoint.__wrapped__ is sleepy
+    assert profiling.current() is None
+    assert route.endpoint() == {"ok": True}
@@ -0,0 +1,31 @@
+import io
+import sys
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app.aggregation import decode_result
+from worker.utils import compress_file, ZSTD_MAGIC
+
+
+def test_compressed_result_round_trips(tmp_path):
+    state = {"fc.weight": torch.zeros(64, 64), "fc.bias": torch.arange(64.0)}
+    model_path = tmp_path / "model.pth"
+    torch.save(state, model_path)
+
+    assert compress_file(str(model_path), str(tmp_path / "model.pth.zst"))
+    packed = (tmp_path / "model.pth.zst").read_bytes()
+    assert packed.startswith(ZSTD_MAGIC)
+    assert len(packed) < model_path.stat().st_size
+
+    restored = torch.load(io.BytesIO(decode_result(packed)), map_location="cpu")
+    assert torch.equal(restored["fc.bias"], state["fc.bias"])
+
+
+def test_uncompressed_results_pass_through(tmp_path):
+    buffer = io.BytesIO()
+    torch.save({"w": torch.ones(2)}, buffer)
+    assert decode_result(buffer.getvalue()) == buffer.getvalue()
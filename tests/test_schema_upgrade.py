@@ -0,0 +1,46 @@
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import database, models
+from app.database import Base
+
+# The subtasks / jobs tables as the first release created them
+BASELINE = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, password VARCHAR, role VARCHAR, credits FLOAT, created_at DATETIME)",
+    "CREATE TABLE jobs (id INTEGER PRIMARY KEY, title VARCHAR, status VARCHAR, original_code_url VARCHAR, "
+    "original_req_url VARCHAR, original_data_url VARCHAR, final_result_url VARCHAR, owner_id INTEGER, created_at DATETIME)",
+    "CREATE TABLE subtasks (id INTEGER PRIMARY KEY, job_id INTEGER, assigned_to VARCHAR, status VARCHAR, "
+    "chunk_file_url VARCHAR, result_file_url VARCHAR, completed_at DATETIME)",
+    "INSERT INTO jobs (id, title, status, owner_id) VALUES (1, 'old', 'RUNNING', 1)",
+    "INSERT INTO subtasks (id, job_id, status, chunk_file_url) VALUES (1, 1, 'PENDING', 'chunk.csv')",
+]
+
+
+def test_adds_columns_missing_from_an_old_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE:
+            conn.exec_driver_sql(statement)
+
+    Base.metadata.create_all(bind=engine) # Creates the new tables only
+    added = database.add_missing_columns(engine, Base.metadata)
+    assert {"subtasks.chunk_format", "subtasks.started_at", "subtasks.training_seconds",
+            "jobs.update_encoding"} <= set(added)
+    assert {c["name"] for c in inspect(engine).get_columns("subtasks")} == set(models.Subtask.__table__.columns.keys())
+    assert database.add_missing_columns(engine, Base.metadata) == [] # Idempotent
+
+    db = sessionmaker(bind=engine)()
+    try:
+        old = db.query(models.Subtask).filter(models.Subtask.status == "PENDING").one()
+        assert old.chunk_format == "csv" # Constant defaults fill existing rows
+        assert db.get(models.Job, 1).update_encoding == "full"
+        db.add(models.Subtask(job_id=1, status="PENDING", chunk_file_url="chunk2.csv", chunk_format="parquet"))
+        db.commit()
+        assert db.query(models.Subtask).count() == 2
+    finally:
+        db.close()
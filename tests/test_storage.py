@@ -0,0 +1,157 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import storage
+from app.storage import LocalStorage, MemoryStorage, StorageError
+
+
+@pytest.fixture(params=["local", "memory"])
+def store(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(root=str(tmp_path), base_url="http://testserver/files")
+    return MemoryStorage(base_url="http://testserver/files")
+
+
+def test_put_get_stream_delete(store):
+    url = store.put("jobs/1/chunks/chunk_0.csv", b"a,b\n1,2\n", "text/csv")
+    assert url == "http://testserver/files/jobs/1/chunks/chunk_0.csv"
+    assert store.exists("jobs/1/chunks/chunk_0.csv")
+    assert store.get("jobs/1/chunks/chunk_0.csv") == b"a,b\n1,2\n"
+    assert b"".join(store.stream("jobs/1/chunks/chunk_0.csv", chunk_size=3)) == b"a,b\n1,2\n"
+    assert store.key_from_url(url) == "jobs/1/chunks/chunk_0.csv"
+
+    store.delete("jobs/1/chunks/chunk_0.csv")
+    assert not store.exists("jobs/1/chunks/chunk_0.csv")
+    with pytest.raises(StorageError):
+        store.get("jobs/1/chunks/chunk_0.csv")
+
+
+def test_presign_round_trip(store):
+    url = store.presign("jobs/1/results/5_model.pth", method="PUT", expires_in=60)
+    query = dict(part.split("=") for part in url.split("?", 1)[1].split("&"))
+    assert storage.verify_signature("jobs/1/results/5_model.pth", "PUT", int(query["expires"]), query["sig"])
+    # Signature is bound to the method and expiry
+    assert not storage.verify_signature("jobs/1/results/5_model.pth", "GET", int(query["expires"]), query["sig"])
+    assert not storage.verify_signature("jobs/1/results/5_model.pth", "PUT", int(time.time()) - 1, query["sig"])
+
+
+def test_local_rejects_path_escape(tmp_path):
+    store = LocalStorage(root=str(tmp_path / "root"))
+    with pytest.raises(StorageError):
+        store.put("../outside.txt", b"x")
+
+
+def test_read_url_uses_active_backend():
+    store = MemoryStorage(base_url="http://testserver/files")
+    storage.set_storage(store)
+    try:
+        url = store.put("jobs/2/final_model.pth", b"weights")
+        assert storage.read_url(url) == b"weights"
+    finally:
+        storage.set_storage(None)
+
+
+def test_read_url_only_reads_files_inside_local_root(tmp_path):
+    secret = tmp_path / "secret.txt"
+    secret.write_bytes(b"not yours")
+    store = LocalStorage(root=str(tmp_path / "root"), base_url="file://")
+    storage.set_storage(store)
+    try:
+        url = store.put("jobs/2/results/1_model.pth", b"weights")
+        assert url.startswith("file://") and storage.read_url(url) == b"weights"
+        for bad in (f"file://{secret}", f"file://{tmp_path / 'root'}/../secret.txt", "ftp://host/x"):
+            with pytest.raises(StorageError):
+                storage.read_url(bad)
+    finally:
+        storage.set_storage(None)
+
+
+def test_files_router_presigned_put_and_get(tmp_path):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routers import files
+
+    app = FastAPI()
+    app.include_router(files.router, prefix="/files")
+    client = TestClient(app)
+
+    store = LocalStorage(root=str(tmp_path), base_url="http://testserver/files")
+    storage.set_storage(store)
+    try:
+        key = "jobs/3/results/7_model.pth"
+        # Unsigned uploads are rejected
+        assert client.put(f"/files/{key}", content=b"weights").status_code == 403
+
+        resp = client.put(store.presign(key, method="PUT"), content=b"weights")
+        assert resp.status_code == 200
+        assert resp.json()["size"] == 7
+        assert store.get(key) == b"weights"
+
+        # A GET signature can't be replayed as an upload
+        assert client.put(store.presign(key, method="GET"), content=b"evil").status_code == 403
+        assert client.get(store.url_for(key)).content == b"weights"
+    finally:
+        storage.set_storage(None)
+
+
+def test_files_router_serves_ranges(store):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routers import files
+
+    app = FastAPI()
+    app.include_router(files.router, prefix="/files")
+    client = TestClient(app)
+
+    storage.set_storage(store)
+    try:
+        data = bytes(range(256)) * 10
+        store.put("cas/blob", data)
+
+        resp = client.get("/files/cas/blob", headers={"Range": "bytes=0-0"})
+        assert resp.status_code == 206
+        assert resp.headers["content-range"] == f"bytes 0-0/{len(data)}"
+
+        resp = client.get("/files/cas/blob", headers={"Range": "bytes=2500-"})
+        assert resp.status_code == 206
+        assert resp.content == data[2500:]
+    finally:
+        storage.set_storage(None)
+
+
+def test_completion_requires_the_uploaded_result():
+    import hashlib
+    from fastapi import HTTPException
+    from types import SimpleNamespace
+    from app.routers import agent
+    from app.schemas import TaskComplete
+
+    store = MemoryStorage(base_url="http://testserver/files")
+    storage.set_storage(store)
+    subtask = SimpleNamespace(id=5, job_id=1, assigned_to="agent-1")
+    key = agent.result_key_for(1, 5)
+
+    def report(**kwargs):
+        return TaskComplete(agent_id="agent-1", task_id=5, result_key=key, **kwargs)
+
+    def status(data):
+        try:
+            agent.check_result_upload(subtask, data)
+        except HTTPException as e:
+            return e.status_code
+        return 200
+
+    try:
+        assert status(report()) == 409 # Never uploaded
+        store.put(key, b"weights")
+        assert status(report(result_size=7, result_sha256=hashlib.sha256(b"weights").hexdigest())) == 200
+        assert status(report(result_size=8)) == 409
+        assert status(report(result_sha256=hashlib.sha256(b"other").hexdigest())) == 409
+        assert status(TaskComplete(agent_id="agent-1", task_id=5)) == 200 # No direct upload to check
+    finally:
+        storage.set_storage(None)
@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import database, models, storage
+from app.database import Base
+from app.routers import agent, front_job, sellers
+
+
+@pytest.fixture
+def client():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    session.add(models.User(id=1, email="owner@gridx.com", password="x"))
+    session.add_all([models.Agent(id=f"agent-{i}", owner_id=1, status="IDLE") for i in (1, 2)])
+    session.add(models.Job(id=1, title="t", status="RUNNING", owner_id=1, original_code_url="c", original_req_url="r"))
+    session.add_all([models.Subtask(id=i, job_id=1, status="PENDING", chunk_file_url=f"chunk{i}") for i in (1, 2, 3)])
+    session.commit()
+    session.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(agent.router, prefix="/agent")
+    app.include_router(front_job.router, prefix="/jobs")
+    app.include_router(sellers.router, prefix="/stats")
+    app.dependency_overrides[database.get_db] = get_db
+    storage.set_storage(storage.MemoryStorage(base_url="http://testserver/files"))
+    yield TestClient(app)
+    storage.set_storage(None)
+
+
+def run_task(client, agent_id: str, report: dict):
+    task_id = client.post("/agent/request_task", json={"agent_id": agent_id}).json()["task_id"]
+    resp = client.post("/agent/complete_task", json={"agent_id": agent_id, "task_id": task_id, "result_url": "http://x/m.pth", **report})
+    assert resp.status_code == 200
+    return task_id
+
+
+def test_timings_are_stored_and_summarized(client):
+    run_task(client, "agent-1", {"timings": {"download": 2.0, "training": 6.0, "upload": 2.0, "bogus": 9.0},
+                                 "peak_memory_bytes": 1000, "cpu_seconds": 5.5})
+    run_task(client, "agent-2", {"timings": {"download": 4.0, "training": 10.0, "upload": 1.0},
+                                 "peak_memory_bytes": 3000, "cpu_seconds": 9.0})
+    run_task(client, "agent-2", {}) # Older workers report nothing
+
+    report = client.get("/jobs/1/timings").json()
+    summary = report["summary"]
+    assert summary["subtasks"] == 3
+    assert summary["phases"]["download"] == {"count": 2, "mean_seconds": 3.0, "max_seconds": 4.0, "total_seconds": 6.0, "share": 0.24}
+    assert summary["phases"]["training"]["share"] == 0.64
+    assert summary["phases"]["dependencies"]["count"] == 0
+    assert summary["phases"]["pending"]["count"] == 3 # Measured by the backend
+    assert (summary["peak_memory_bytes"], summary["cpu_seconds"]) == (3000, 14.5)
+    assert "bogus" not in report["subtasks"][0]["phases"]
+    assert report["by_agent"]["agent-1"]["phases"]["training"]["mean_seconds"] == 6.0
+    assert report["by_agent"]["agent-2"]["subtasks"] == 2
+
+    agent_report = client.get("/stats/agents/agent-2/timings").json()
+    assert agent_report["summary"]["phases"]["upload"]["total_seconds"] == 1.0
+    assert len(agent_report["subtasks"]) == 2
+    assert client.get("/stats/agents/nobody/timings").status_code == 404
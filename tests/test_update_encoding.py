@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import pytest
+import torch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app.updates import apply_update, is_update
+from worker.update_codec import encode_update
+
+
+@pytest.fixture
+def weights():
+    torch.manual_seed(0)
+    reference = {"fc.weight": torch.randn(32, 16), "bn.num_batches_tracked": torch.tensor(0)}
+    trained = {"fc.weight": reference["fc.weight"] + 0.01 * torch.randn(32, 16), "bn.num_batches_tracked": torch.tensor(5)}
+    return reference, trained
+
+
+@pytest.mark.parametrize("encoding, tolerance", [("delta", 1e-6), ("fp16", 1e-4), ("int8", 1e-3)])
+def test_dense_encodings_round_trip(weights, encoding, tolerance):
+    reference, trained = weights
+    payload = encode_update(trained, reference, encoding)
+
+    assert is_update(payload)
+    decoded = apply_update(payload, reference)
+    assert torch.allclose(decoded["fc.weight"], trained["fc.weight"], atol=tolerance)
+    assert decoded["bn.num_batches_tracked"].item() == 5 # Integer buffers are sent in full
+
+
+def test_topk_keeps_only_largest_changes(weights):
+    reference, trained = weights
+    payload = encode_update(trained, reference, "topk", topk_ratio=0.1)
+
+    assert payload["tensors"]["fc.weight"]["values"].numel() == 51
+    changed = (apply_update(payload, reference)["fc.weight"] != reference["fc.weight"]).sum().item()
+    assert changed == 51
+
+
+def test_full_encoding_ignores_the_reference(weights):
+    reference, trained = weights
+    payload = encode_update(trained, reference, "full")
+
+    assert all(entry["kind"] == "full" for entry in payload["tensors"].values())
+    assert torch.equal(apply_update(payload, reference)["fc.weight"], trained["fc.weight"])
+
+
+def test_update_without_reference_is_rejected(weights):
+    reference, trained = weights
+    with pytest.raises(ValueError):
+        apply_update(encode_update(trained, reference, "delta"), None)
@@ -0,0 +1,86 @@
+import hashlib
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app import database, models, storage
+from app.artifacts import artifact_key
+from app.database import Base
+from app.routers import front_job
+
+
+@pytest.fixture
+def app_state():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    session = Session()
+    session.add(models.User(id=1, email="owner@gridx.com", password="x"))
+    session.commit()
+    session.close()
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(front_job.router, prefix="/jobs")
+    app.dependency_overrides[database.get_db] = get_db
+    store = storage.MemoryStorage(base_url="http://testserver/files")
+    storage.set_storage(store)
+    yield TestClient(app), store, Session
+    storage.set_storage(None)
+
+
+def dataset(rows: int) -> bytes:
+    """A CSV a few MB long: several 1 MB blocks to hash, spool and upload."""
+    lines = ["feature_a,feature_b,label"]
+    lines += [f"{i * 0.001:.6f},{(i * 7919) % 1000},{i % 3}" for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def upload(client, data: bytes, title: str):
+    files = {
+        "file_code": ("train.py", b"print('train')\n", "text/x-python"),
+        "file_req": ("requirements.txt", b"pandas\n", "text/plain"),
+        "file_data": ("data.csv", data, "text/csv"),
+    }
+    resp = client.post("/jobs/upload", data={"title": title, "user_id": 1}, files=files)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_multi_block_upload_is_stored_whole_and_deduplicated(app_state):
+    client, store, Session = app_state
+    data = dataset(200_000)
+    assert len(data) > 3 * 1024 * 1024
+
+    first = upload(client, data, "first")
+    assert first["reused_files"] == 0
+    key = artifact_key(hashlib.sha256(data).hexdigest())
+    assert store.get(key) == data # Every block arrived, in order
+
+    second = upload(client, data, "second")
+    assert second["reused_files"] == 3 # Same code, requirements and dataset
+
+    db = Session()
+    try:
+        jobs = {job.id: job for job in db.query(models.Job).all()}
+        assert jobs[first["job_id"]].original_data_url == jobs[second["job_id"]].original_data_url
+        assert db.get(models.Artifact, hashlib.sha256(data).hexdigest()).ref_count == 2
+        # The splitter read the spooled copy after the request closed
+        assert db.query(models.Subtask).filter(models.Subtask.job_id == first["job_id"]).count() > 0
+    finally:
+        db.close()
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from worker import cache as cache_module
+from worker.cache import ArtifactCache
+
+
+def make_artifact(root: Path, content: bytes) -> str:
+    """Writes content at .../cas/{sha256} and returns its file:// URL."""
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = root / "cas" / sha256
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return f"file://{path}"
+
+
+def test_second_fetch_is_a_hit(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    url = make_artifact(tmp_path / "remote", b"print('train')")
+
+    assert cache.fetch(url, str(tmp_path / "a.py"))
+    assert cache.fetch(url, str(tmp_path / "b.py"))
+
+    stats = cache.report()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert (tmp_path / "b.py").read_bytes() == b"print('train')"
+
+
+def test_a_task_rewriting_its_input_does_not_touch_the_cache(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    url = make_artifact(tmp_path / "remote", b"print('train')")
+
+    assert cache.fetch(url, str(tmp_path / "a.py"))
+    assert os.stat(tmp_path / "a.py").st_ino != os.stat(cache._path(url.rsplit("/", 1)[1])).st_ino
+    (tmp_path / "a.py").write_bytes(b"print('pwned')") # Served copies are the task's own
+    assert cache.fetch(url, str(tmp_path / "b.py"))
+    assert (tmp_path / "b.py").read_bytes() == b"print('train')"
+
+
+def test_modified_cache_object_is_dropped_not_served(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    url = make_artifact(tmp_path / "remote", b"print('train')")
+    assert cache.fetch(url, str(tmp_path / "a.py"))
+
+    key = url.rsplit("/", 1)[1]
+    os.chmod(cache._path(key), 0o644)
+    Path(cache._path(key)).write_bytes(b"print('evil!')") # Same size, new ctime
+    assert cache.fetch(url, str(tmp_path / "b.py")) # Downloaded again
+    assert (tmp_path / "b.py").read_bytes() == b"print('train')"
+    assert cache.report()["misses"] == 2
+
+    # A ctime change alone (chmod) costs a re-hash, not the entry
+    os.chmod(cache._path(key), 0o444)
+    assert cache.fetch(url, str(tmp_path / "c.py"))
+    assert cache.report()["hits"] == 1
+
+
+def test_lru_eviction_by_total_bytes(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=250)
+    urls = [make_artifact(tmp_path / "remote", bytes([i]) * 100) for i in range(3)]
+
+    for i, url in enumerate(urls):
+        assert cache.fetch(url, str(tmp_path / f"file_{i}"))
+
+    stats = cache.report()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 200
+    # The oldest one is gone, so fetching it again is a miss
+    cache.fetch(urls[0], str(tmp_path / "again"))
+    assert cache.report()["misses"] == 4
+
+
+def test_corrupt_download_is_rejected(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=1024)
+    url = make_artifact(tmp_path / "remote", b"good")
+    Path(url[len("file://"):]).write_bytes(b"tampered")
+
+    assert not cache.fetch(url, str(tmp_path / "out"))
+    assert cache.report()["entries"] == 0
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: bytes = b"", etag: str = None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {"ETag": etag} if etag else {}
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+
+def test_not_modified_response_is_closed(tmp_path, monkeypatch):
+    responses = []
+
+    def get(url, headers=None, **kwargs):
+        if headers.get("If-None-Match") == '"v1"':
+            responses.append(FakeResponse(304))
+        else:
+            responses.append(FakeResponse(200, b"print('train')", etag='"v1"'))
+        return responses[-1]
+
+    monkeypatch.setattr(cache_module, "session", type("Session", (), {"get": staticmethod(get)}))
+    cache = ArtifactCache(root=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    for name in ("a.py", "b.py"):
+        assert cache.fetch("http://backend/files/train.py", str(tmp_path / name))
+
+    assert [r.status_code for r in responses] == [200, 304]
+    assert all(r.closed for r in responses)
+    assert (tmp_path / "b.py").read_bytes() == b"print('train')"
+    assert cache.report()["hits"] == 1
+
+
+def test_cache_directory_is_created_on_first_fetch(tmp_path):
+    url = make_artifact(tmp_path / "remote", b"print('train')")
+    cache_dir = tmp_path / "cache"
+    env = dict(os.environ, PYTHONPATH=str(ROOT), ARTIFACT_CACHE="true", ARTIFACT_CACHE_DIR=str(cache_dir))
+    code = ("import os, sys, worker.main\nfrom worker import cache\n"
+            "print(os.path.exists(sys.argv[1]))\n"
+            "cache.fetch_artifact(sys.argv[2], sys.argv[3])\n"
+            "print(os.path.exists(sys.argv[1]))")
+    out = subprocess.run([sys.executable, "-c", code, str(cache_dir), url, str(tmp_path / "train.py")],
+                         cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split()[-2:] == ["False", "True"] # Importing the worker touches nothing
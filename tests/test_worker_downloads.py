@@ -0,0 +1,78 @@
+import hashlib
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from worker import utils
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves one blob with Range support; drops the first full transfer halfway."""
+    data = b""
+    fail_first = False
+    requests = []
+
+    def do_GET(self):
+        size = len(self.data)
+        range_header = self.headers.get("Range")
+        type(self).requests.append(range_header)
+        start, end = 0, size - 1
+        if range_header:
+            first, _, last = range_header[len("bytes="):].partition("-")
+            start, end = int(first), int(last) if last else size - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+
+        body = self.data[start:end + 1]
+        if type(self).fail_first and not range_header:
+            type(self).fail_first = False
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(2) # Connection dies mid-transfer
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    RangeHandler.data = bytes(range(256)) * 4096 # 1 MB
+    RangeHandler.fail_first = False
+    RangeHandler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/cas/{hashlib.sha256(RangeHandler.data).hexdigest()}"
+    httpd.shutdown()
+
+
+def test_resumes_after_dropped_connection(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils.time, "sleep", lambda _: None)
+    monkeypatch.setattr(utils, "probe_size", lambda url: None) # Force the single-stream path
+    monkeypatch.setattr(utils, "DOWNLOAD_CHUNK", 64 * 1024)
+    RangeHandler.fail_first = True
+
+    assert utils.download_file(server, str(tmp_path / "data.csv"))
+    assert (tmp_path / "data.csv").read_bytes() == RangeHandler.data
+    # Second attempt asked only for the bytes we didn't have yet
+    assert RangeHandler.requests == [None, f"bytes={len(RangeHandler.data) // 2}-"]
+
+
+def test_large_files_download_in_parallel_parts(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "PARALLEL_DOWNLOAD_THRESHOLD", 1024)
+    monkeypatch.setattr(utils, "DOWNLOAD_PARTS", 4)
+
+    assert utils.download_file(server, str(tmp_path / "data.csv"))
+    assert (tmp_path / "data.csv").read_bytes() == RangeHandler.data
+    assert len([r for r in RangeHandler.requests if r and r != "bytes=0-0"]) == 4
+    assert not (tmp_path / "data.csv.part").exists()
@@ -0,0 +1,299 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from worker import logs, main
+
+# Importing worker.main routes the root logger through the worker's log queue;
+# undo that so it doesn't stamp the records other test modules inspect
+logs.shutdown_logging()
+
+
+class FakeBackend:
+    """Hands out tasks to poll_for_task() and records what the worker posts back."""
+
+    def __init__(self, count: int):
+        self.tasks = [{"task_id": i, "job_id": 1, "code_url": "c", "requirements_url": "r", "chunk_data_url": "d",
+                       "result_upload_url": f"http://storage/put/{i}", "result_key": f"jobs/1/results/{i}_model.pth"}
+                      for i in range(1, count + 1)]
+        self.count = count
+        self.lock = threading.Lock()
+        self.completed = []
+        self.failed = []
+        self.reject = set() # complete_task answers 409 for these task ids
+        self.done = threading.Event()
+        self.parked = threading.Semaphore(0)
+
+    def poll(self):
+        with self.lock:
+            if self.tasks:
+                return self.tasks.pop(0)
+        self.parked.release()
+        threading.Event().wait() # Out of work: park the thread for good
+
+    def wait_parked(self, threads: int):
+        """Every polling thread is out of work (so nothing polls once the test's patches are undone)."""
+        for _ in range(threads):
+            assert self.parked.acquire(timeout=10)
+
+    def post(self, url, json=None, **kwargs):
+        if url.endswith("/agent/fail_task"):
+            with self.lock:
+                self.failed.append((json["task_id"], json["reason"]))
+            return SimpleNamespace(raise_for_status=lambda: None, json=lambda: {"status": "PENDING"})
+        if url.endswith("/agent/complete_task"):
+            if json["task_id"] in self.reject:
+                return SimpleNamespace(status_code=409, text="Result was not uploaded")
+            with self.lock:
+                self.completed.append(json["task_id"])
+                if len(self.completed) == self.count:
+                    self.done.set()
+        return SimpleNamespace(status_code=200, raise_for_status=lambda: None, json=lambda: {"cancel_tasks": []})
+
+
+class FakeSandbox:
+    """run_in_sandbox that writes a model and records how many run at once (and where)."""
+
+    def __init__(self, seconds: float = 0.1):
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.events = []
+
+    def __call__(self, workspace, cpu_limit, mem_limit, entry_point="train.py", cancel_event=None, job_id=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.events.append(("start", os.path.basename(workspace)))
+        time.sleep(self.seconds)
+        Path(workspace, "model.pth").write_bytes(b"weights")
+        with self.lock:
+            self.running -= 1
+            self.events.append(("end", os.path.basename(workspace)))
+        return {"status": "success", "logs": "", "timings": {"training": self.seconds}}
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    def fetch(url, path):
+        Path(path).write_text(url)
+        return True
+
+    monkeypatch.setattr(main, "fetch_artifact", fetch)
+    monkeypatch.setattr(main, "get_artifact_cache", lambda: None)
+    monkeypatch.setattr(main, "upload_to_presigned_url", lambda url, path, content_type: (os.path.getsize(path), "sha"))
+    monkeypatch.setattr(main, "RESULT_COMPRESSION", "none")
+    monkeypatch.setattr(main, "get_executor", lambda: SimpleNamespace(
+        dependency_cache_report=lambda: {"hits": 0, "misses": 0, "hit_rate": 0.0, "saved_seconds": 0.0}))
+    return monkeypatch
+
+
+def start(target, *args):
+    threading.Thread(target=target, args=args, daemon=True).start()
+
+
+def wait_released(seconds: float = 5) -> bool:
+    """The uploader drops a task's lease just after reporting it complete."""
+    deadline = time.time() + seconds
+    while main.leased_tasks and time.time() < deadline:
+        time.sleep(0.01)
+    return not main.leased_tasks
+
+
+def test_worker_config_env_is_read_before_worker_modules(tmp_path):
+    (tmp_path / "worker_config.env").write_text("EXECUTOR=process\nTASK_TIMEOUT=17\nARTIFACT_CACHE=false\n")
+    env = {key: value for key, value in os.environ.items()
+           if key not in ("EXECUTOR", "TASK_TIMEOUT", "ARTIFACT_CACHE")}
+    env["PYTHONPATH"] = str(ROOT)
+    code = ("import worker.main\nfrom worker import cache, executor\n"
+            "print(executor.EXECUTOR, executor.TASK_TIMEOUT, cache.ARTIFACT_CACHE)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True,
+                         timeout=120)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split()[-3:] == ["process", "17", "False"]
+
+
+def test_slot_count_fits_cores_and_memory(monkeypatch):
+    monkeypatch.setattr(main, "WORKER_SLOTS", "auto")
+    monkeypatch.setattr(main, "CPU_LIMIT", 1.0)
+    monkeypatch.setattr(main, "MEMORY_LIMIT", "1g")
+    monkeypatch.setattr(main, "HOST_CORES", 8)
+    monkeypatch.setattr(main, "HOST_MEMORY", 4 * 1024 ** 3)
+    assert main.compute_slot_count() == 3 # 90% of 4 GB holds three 1 GB slots
+
+    monkeypatch.setattr(main, "HOST_MEMORY", 64 * 1024 ** 3)
+    assert main.compute_slot_count() == 8
+    monkeypatch.setattr(main, "HOST_CORES", 0.5)
+    assert main.compute_slot_count() == 1
+    monkeypatch.setattr(main, "WORKER_SLOTS", "2")
+    assert main.compute_slot_count() == 2
+
+
+def test_slots_run_tasks_concurrently_one_each(worker):
+    backend, sandbox = FakeBackend(6), FakeSandbox()
+    worker.setattr(main, "poll_for_task", backend.poll)
+    worker.setattr(main, "requests", SimpleNamespace(post=backend.post))
+    worker.setattr(main, "run_in_sandbox", sandbox)
+
+    for slot in range(3):
+        start(main.slot_loop, slot)
+    assert backend.done.wait(10)
+    backend.wait_parked(3)
+
+    assert sorted(backend.completed) == [1, 2, 3, 4, 5, 6]
+    assert sandbox.max_running == 3
+    # Each slot has its own workspace and never runs two tasks at once
+    for slot in range(3):
+        slot_events = [kind for kind, name in sandbox.events if name.startswith(f"sandbox_slot{slot}_")]
+        assert slot_events and slot_events == ["start", "end"] * (len(slot_events) // 2)
+    assert not main.busy_slots and not main.leased_tasks
+
+
+@pytest.mark.parametrize("status", ["timeout", "memory_limit", "error"])
+def test_unsuccessful_run_is_reported_not_uploaded(worker, status):
+    backend, uploads = FakeBackend(1), []
+    worker.setattr(main, "requests", SimpleNamespace(post=backend.post))
+    worker.setattr(main, "upload_to_presigned_url", lambda url, path, content_type: uploads.append(url))
+
+    def killed(workspace, *args, **kwargs):
+        Path(workspace, "model.pth").write_bytes(b"half-trained") # Left behind by the killed run
+        return {"status": status, "logs": "Killed", "timings": {"training": 1.0}}
+
+    worker.setattr(main, "run_in_sandbox", killed)
+    main.execute_task(backend.tasks[0])
+
+    assert backend.failed == [(1, status)]
+    assert not uploads and not backend.completed
+    assert not main.leased_tasks
+
+
+def test_rejected_result_gives_the_task_back(worker):
+    backend = FakeBackend(1)
+    backend.reject.add(1)
+    worker.setattr(main, "requests", SimpleNamespace(post=backend.post))
+    worker.setattr(main, "run_in_sandbox", FakeSandbox(seconds=0))
+
+    main.execute_task(backend.tasks[0])
+
+    assert backend.failed == [(1, "result_rejected")] and not backend.completed
+    assert not main.leased_tasks
+
+
+def test_failed_upload_gives_the_task_back(worker):
+    backend = FakeBackend(1)
+    worker.setattr(main, "requests", SimpleNamespace(post=backend.post))
+    worker.setattr(main, "run_in_sandbox", FakeSandbox(seconds=0))
+
+    def storage_down(url, path, content_type):
+        raise ConnectionError("storage unreachable")
+
+    worker.setattr(main, "upload_to_presigned_url", storage_down)
+    main.execute_task(backend.tasks[0])
+
+    assert backend.failed == [(1, "upload_failed")] and not backend.completed
+    assert not main.leased_tasks
+
+
+class Timeline:
+    """Records pipeline stages per task id, in the order they happen."""
+
+    def __init__(self, worker, run_seconds: float = 0.2, upload_seconds: float = 0.2):
+        self.events = []
+        self.lock = threading.Lock()
+        self.workspaces = {}
+        self.run_seconds = run_seconds
+        self.upload_seconds = upload_seconds
+        self.upload_gate = threading.Event()
+        self.upload_gate.set()
+        prepare = main.prepare_task
+
+        def prepare_task(task, slot=0):
+            prepared = prepare(task, slot)
+            self.workspaces[prepared["workspace"]] = task["task_id"]
+            self.record("prepared", task["task_id"])
+            return prepared
+
+        def upload(url, path, content_type):
+            task_id = int(url.rsplit("/", 1)[1])
+            self.upload_gate.wait()
+            time.sleep(self.upload_seconds)
+            self.record("uploaded", task_id)
+            return os.path.getsize(path), "sha"
+
+        worker.setattr(main, "prepare_task", prepare_task)
+        worker.setattr(main, "run_in_sandbox", self.run)
+        worker.setattr(main, "upload_to_presigned_url", upload)
+
+    def record(self, stage: str, task_id: int):
+        with self.lock:
+            self.events.append((stage, task_id))
+
+    def run(self, workspace, cpu_limit, mem_limit, entry_point="train.py", cancel_event=None, job_id=None):
+        task_id = self.workspaces[workspace]
+        self.record("start", task_id)
+        time.sleep(self.run_seconds)
+        Path(workspace, "model.pth").write_bytes(b"weights")
+        self.record("end", task_id)
+        return {"status": "success", "logs": "", "timings": {"training": self.run_seconds}}
+
+    def at(self, stage: str, task_id: int) -> int:
+        return self.events.index((stage, task_id))
+
+    def count(self, stage: str) -> int:
+        with self.lock:
+            return sum(1 for kind, _ in self.events if kind == stage)
+
+
+def test_pipeline_prefetches_and_uploads_while_the_slot_runs(worker):
+    backend = FakeBackend(3)
+    worker.setattr(main, "poll_for_task", backend.poll)
+    worker.setattr(main, "requests", SimpleNamespace(post=backend.post))
+    worker.setattr(main, "upload_queue", queue.Queue(maxsize=2))
+    timeline = Timeline(worker)
+
+    start(main.upload_loop)
+    start(main.pipelined_slot_loop, 0)
+    assert backend.done.wait(10)
+    backend.wait_parked(1)
+
+    assert backend.completed == [1, 2, 3] # One slot, one uploader: in order
+    # Task 2 was downloaded while task 1 trained, and task 1 uploaded while task 2 trained
+    assert timeline.at("prepared", 2) < timeline.at("end", 1)
+    assert timeline.at("start", 2) < timeline.at("uploaded", 1)
+    # Never two tasks in the sandbox of one slot
+    runs = [kind for kind, _ in timeline.events if kind in ("start", "end")]
+    assert runs == ["start", "end"] * 3
+    assert wait_released() and not main.busy_slots
+
+
+def test_full_upload_queue_stops_the_slot(worker):
+    backend = FakeBackend(5)
+    worker.setattr(main, "poll_for_task", backend.poll)
+    worker.setattr(main, "requests", SimpleNamespace(post=backend.post))
+    worker.setattr(main, "upload_queue", queue.Queue(maxsize=1))
+    timeline = Timeline(worker, run_seconds=0.05, upload_seconds=0)
+    timeline.upload_gate.clear() # Storage hangs
+
+    start(main.upload_loop)
+    start(main.pipelined_slot_loop, 0)
+    time.sleep(1)
+    # One result being uploaded, one queued, one waiting to be queued; the slot stops there
+    assert timeline.count("end") == 3 and timeline.count("start") == 3
+    assert timeline.count("prepared") == 4 # Plus the next one, prefetched (PREFETCH_DEPTH=1)
+
+    timeline.upload_gate.set()
+    assert backend.done.wait(10)
+    backend.wait_parked(1)
+    assert backend.completed == [1, 2, 3, 4, 5]
+    assert wait_released()
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+try:
+    import fcntl # Copy-on-write clones (Linux)
+except ImportError:
+    fcntl = None
+
+from worker.utils import download_file, session, file_sha256, sha256_from_url, parse_memory
+
+log = logging.getLogger(__name__)
+
+# ==========================================
+# LOCAL ARTIFACT CACHE
+# ==========================================
+# Every subtask of a job needs the same train.py and requirements.txt, and a
+# re-run of an experiment needs the same chunks. We keep downloaded files in a
+# persistent, size-bounded LRU directory and copy them into each task workspace
+# instead of downloading again (a copy-on-write clone where the filesystem
+# supports it). Tasks never share an inode with the cache, so a task that
+# rewrites its inputs can't change what the next task gets.
+#
+# Keys:
+#   content-addressed URLs (.../cas/{sha256}) -> the hash itself, always valid
+#   any other URL                            -> hash of the URL, revalidated with its ETag
+# Cached files are read-only. Their ctime is recorded at insert (no process can
+# set it); if it changed, the file is hashed again before it is served.
+
+ARTIFACT_CACHE = os.getenv("ARTIFACT_CACHE", "true").lower() == "true"
+ARTIFACT_CACHE_DIR = os.path.expanduser(os.getenv("ARTIFACT_CACHE_DIR", "~/.gridx/cache"))
+ARTIFACT_CACHE_MAX_BYTES = parse_memory(os.getenv("ARTIFACT_CACHE_MAX_BYTES", "5g"))
+FICLONE = 0x40049409 # ioctl: share the source's extents copy-on-write (btrfs, XFS)
+KEY_LOCK_STRIPES = 64 # Keys hash onto this many locks, so the lock table doesn't grow with the cache
+
+
+def clone_file(src, dest: str):
+    """Copies the open file src to dest, as a copy-on-write clone when the filesystem can."""
+    with open(dest, "wb") as out:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(out.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                pass # Not supported here (ext4, tmpfs, other filesystem): plain copy
+        src.seek(0)
+        shutil.copyfileobj(src, out, 1024 * 1024)
+
+
+class ArtifactCache:
+    def __init__(self, root: str = ARTIFACT_CACHE_DIR, max_bytes: int = ARTIFACT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+        self.lock = threading.Lock()
+        self.key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)] # One download per key at a time
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_downloaded": 0, "bytes_served": 0}
+
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.index = self._load_index()
+
+    # ---------- index ----------
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Drop entries whose file vanished
+        return {k: v for k, v in index.items() if os.path.exists(self._path(k))}
+
+    def _save_index(self):
+        """Caller holds self.lock."""
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, "objects", key)
+
+    def total_bytes(self) -> int:
+        with self.lock:
+            return sum(entry["size"] for entry in self.index.values())
+
+    # ---------- public API ----------
+    def fetch(self, url: str, dest: str) -> bool:
+        """
+        Puts the file behind url at dest, from cache when possible.
+        Returns False if it could not be downloaded (same contract as download_file).
+        """
+        sha256 = sha256_from_url(url)
+        key = sha256 or "url-" + hashlib.sha256(url.encode()).hexdigest()
+
+        with self.key_locks[hash(key) % len(self.key_locks)]:
+            with self.lock:
+                entry = self.index.get(key)
+
+            if entry and sha256 and self._serve(key, dest, hit=True):
+                return True
+
+            if sha256:
+                ok = self._download_content_addressed(url, key, sha256)
+            else:
+                ok = self._download_with_etag(url, key, entry)
+            if ok is None:
+                # Not cacheable (no ETag, or the conditional GET failed): plain download
+                with self.lock:
+                    self.stats["misses"] += 1
+                return download_file(url, dest)
+            if not ok:
+                return False
+            return self._serve(key, dest, hit=(ok == "not-modified")) or download_file(url, dest)
+
+    def report(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.index)
+            stats["bytes"] = sum(entry["size"] for entry in self.index.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    # ---------- internals ----------
+    def _serve(self, key: str, dest: str, hit: bool) -> bool:
+        """Copies the cached file to dest. False if the entry is gone or damaged. Caller holds the key lock."""
+        path = self._path(key)
+        with self.lock:
+            # Opened under the lock so another slot can't evict it first; once
+            # open, an eviction doesn't affect the copy
+            entry = self.index.get(key)
+            try:
+                src = open(path, "rb") if entry else None
+            except OSError:
+                src = None
+            if src is None:
+                self.index.pop(key, None)
+                return False
+
+        with src:
+            if not self._intact(src, entry):
+                log.warning(f"⚠️ Cached artifact {key} was modified, dropping it")
+                with self.lock:
+                    if self.index.get(key) is entry:
+                        del self.index[key]
+                        self._remove(key)
+                        self._save_index()
+                return False
+            clone_file(src, dest)
+
+        with self.lock:
+            entry["last_used"] = time.time()
+            self.stats["hits" if hit else "misses"] += 1
+            self.stats["bytes_served"] += entry["size"]
+            self._save_index()
+        return True
+
+    def _intact(self, src, entry: dict) -> bool:
+        """Same size and ctime as at insert, or (if the ctime moved) still the same sha256."""
+        stat = os.fstat(src.fileno())
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_ctime_ns == entry.get("ctime_ns"):
+            return True
+        digest = hashlib.sha256()
+        for block in iter(lambda: src.read(1024 * 1024), b""):
+            digest.update(block)
+        if digest.hexdigest() != entry["sha256"]:
+            return False
+        with self.lock:
+            entry["ctime_ns"] = stat.st_ctime_ns # e.g. index from before ctimes were recorded
+        return True
+
+    def _remove(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _insert(self, key: str, tmp_path: str, sha256: str, url: str, etag: str = None):
+        path = self._path(key)
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+        stat = os.stat(path)
+        size = stat.st_size
+        with self.lock:
+            self.index[key] = {"size": size, "sha256": sha256, "etag": etag, "url": url, "last_used": time.time(),
+                               "ctime_ns": stat.st_ctime_ns}
+            self.stats["bytes_downloaded"] += size
+            self._evict(keep=key)
+            self._save_index()
+
+    def _evict(self, keep: str = None):
+        """Drops least-recently-used entries until we fit in max_bytes. Caller holds self.lock."""
+        total = sum(entry["size"] for entry in self.index.values())
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue # The file we are about to serve
+            self._remove(key)
+            del self.index[key]
+            total -= entry["size"]
+            self.stats["evictions"] += 1
+
+    def _tmp_path(self, key: str) -> str:
+        return self._path(key) + f".{threading.get_ident()}.part"
+
+    def _download_content_addressed(self, url: str, key: str, sha256: str):
+        tmp_path = self._tmp_path(key)
+        # download_file verifies the hash embedded in the URL
+        if not download_file(url, tmp_path):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        self._insert(key, tmp_path, sha256, url)
+        return "downloaded"
+
+    def _download_with_etag(self, url: str, key: str, entry: dict):
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+
+        tmp_path = self._tmp_path(key)
+        try:
+            # Closed on every path (304 included) so the connection goes back to the pool
+            with session.get(url, headers=headers, stream=True, timeout=30) as response:
+                if response.status_code == 304 and entry:
+                    return "not-modified"
+                response.raise_for_status()
+
+                etag = response.headers.get("ETag")
+                if not etag:
+                    return None
+
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+            self._insert(key, tmp_path, file_sha256(tmp_path), url, etag)
+            return "downloaded"
+        except Exception as e:
+            log.warning(f"⚠️ Cache download failed for {url}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+
+_artifact_cache = None
+_artifact_cache_lock = threading.Lock()
+
+def get_artifact_cache():
+    """Returns the local ArtifactCache, creating it (and its directory) on first use. None if disabled."""
+    global _artifact_cache
+    if _artifact_cache is None and ARTIFACT_CACHE:
+        with _artifact_cache_lock:
+            if _artifact_cache is None:
+                _artifact_cache = ArtifactCache()
+    return _artifact_cache
+
+def set_artifact_cache(cache):
+    """Swap the active cache (used by tests and benchmarks)."""
+    global _artifact_cache
+    _artifact_cache = cache
+
+
+def fetch_artifact(url: str, dest: str) -> bool:
+    """Downloads url to dest through the local cache (if enabled)."""
+    artifact_cache = get_artifact_cache()
+    if artifact_cache is None:
+        return download_file(url, dest)
+    return artifact_cache.fetch(url, dest)
@@ -1,80 +1,847 @@
-import docker
 import os
+import json
+import logging
+import secrets
+import time
+import shutil
+import hashlib
 import tarfile
+import tempfile
 import threading
+from collections import defaultdict
 from typing import Optional, Tuple
 
-client = docker.from_env()
+from worker.utils import parse_memory
 
-def build_base_image(tag="secure-executor-base:latest"):
-    """Builds the base image if it doesn't exist."""
-    print(f"Building base image {tag}...")
-    # Assumes Dockerfile.base is in the parent directory of this file's execution context
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Only the Docker executor needs these; the worker imports fine without them
+try:
+    import docker
+except ImportError:
+    docker = None
+
+log = logging.getLogger(__name__)
+
+_client = None
+
+def docker_client():
+    """The Docker client, connected on first use (not at import)."""
+    global _client
+    if _client is None:
+        if docker is None:
+            raise RuntimeError("The docker package is not installed (pip install docker, or EXECUTOR=process)")
+        _client = docker.from_env()
+    return _client
+
+BASE_IMAGE = "secure-executor-base:latest"
+
+# DEPENDENCY CACHE
+# Every subtask of a job ships the same requirements.txt. Instead of running
+# `pip install` in each container, we install once into a derived image tagged
+# by the hash of the requirements and reuse it. Cached runs need no network.
+DEPENDENCY_CACHE = os.getenv("DEPENDENCY_CACHE", "true").lower() == "true"
+DEPS_IMAGE_REPO = "secure-executor-deps"
+# Network for containers whose dependencies come from the cache ("none" = offline)
+CACHED_NETWORK_MODE = os.getenv("SANDBOX_NETWORK", "none")
+_deps_locks = defaultdict(threading.Lock) # One build per requirements hash at a time
+_deps_stats_lock = threading.Lock()
+dependency_cache_stats = {"hits": 0, "misses": 0, "install_seconds": 0.0, "saved_seconds": 0.0}
+
+# LIMITS
+# Every task runs under a wall-clock deadline, an optional CPU-time budget and a
+# disk quota, and can be cancelled by the backend. Logs are streamed and capped.
+TASK_TIMEOUT = int(os.getenv("TASK_TIMEOUT", "3600"))          # Wall-clock seconds per task (0 = no limit)
+TASK_CPU_SECONDS = int(os.getenv("TASK_CPU_SECONDS", "0"))    # CPU seconds per task (0 = no limit)
+DISK_LIMIT = os.getenv("DISK_LIMIT", "1g")                    # Workspace size and /tmp size per task
+LOG_LIMIT = parse_memory(os.getenv("LOG_LIMIT", "1m"))        # Log bytes kept per task (head + tail)
+DEPS_BUILD_TIMEOUT = int(os.getenv("DEPS_BUILD_TIMEOUT", "900"))
+DISK_CHECK_SECONDS = 5
+POLL_SECONDS = 0.05           # supervise() tick: only cheap checks (cancel, deadline, runner report)
+CONTAINER_POLL_SECONDS = float(os.getenv("CONTAINER_POLL_SECONDS", "1")) # Docker API state checks
+
+# Exit codes of a process killed by RLIMIT_CPU / RLIMIT_FSIZE (128 + SIGXCPU / SIGXFSZ)
+LIMIT_EXIT_CODES = {152: "cpu_limit", -24: "cpu_limit", 153: "disk_limit", -25: "disk_limit"}
+
+class LogBuffer:
+    """Collects streamed output, keeping the first and last `limit / 2` bytes."""
+
+    def __init__(self, limit: int = LOG_LIMIT):
+        self.half = max(limit // 2, 1)
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def write(self, data: bytes):
+        if len(self.head) < self.half:
+            take = self.half - len(self.head)
+            self.head += data[:take]
+            data = data[take:]
+        self.tail += data
+        if len(self.tail) > self.half:
+            self.dropped += len(self.tail) - self.half
+            del self.tail[:len(self.tail) - self.half]
+
+    def text(self) -> str:
+        marker = f"\n... [{self.dropped} bytes of logs truncated] ...\n".encode() if self.dropped else b""
+        return (bytes(self.head) + marker + bytes(self.tail)).decode('utf-8', errors='replace')
+
+def read_log_file(path: str, limit: int = LOG_LIMIT) -> str:
+    """Reads a log file through a LogBuffer without loading the middle of a huge file."""
+    logs = LogBuffer(limit)
+    if not os.path.exists(path) or os.path.islink(path):
+        return "" # A task could swap its log for a link to a worker file
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        logs.write(f.read(logs.half))
+        if size > 2 * logs.half:
+            logs.dropped = size - 2 * logs.half
+            f.seek(size - logs.half)
+        logs.tail += f.read(logs.half)
+    return logs.text()
+
+def dir_size(path: str) -> int:
+    """Bytes used by everything under path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def task_ulimits(cpu_seconds: int, disk_bytes: int) -> list:
+    """Kernel-enforced limits for the task process: CPU seconds and largest file it can write."""
+    ulimits = []
+    if cpu_seconds:
+        ulimits.append(docker.types.Ulimit(name="cpu", soft=cpu_seconds, hard=cpu_seconds + 5))
+    if disk_bytes:
+        ulimits.append(docker.types.Ulimit(name="fsize", soft=disk_bytes, hard=disk_bytes))
+    return ulimits
+
+def supervise(is_running, stop, workdir: str, timeout: float, disk_bytes: int,
+              cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+    """
+    Waits for a task to finish, stopping it if it runs past its deadline, fills
+    more than disk_bytes of workdir, or is cancelled.
+    is_running is called every POLL_SECONDS, so it must be cheap (see ContainerWatch).
+    Returns None if it ended on its own, otherwise why it was stopped.
+    """
+    deadline = time.time() + timeout if timeout else None
+    next_disk_check = time.time() + DISK_CHECK_SECONDS
+    while is_running():
+        reason = None
+        if cancel_event is not None and cancel_event.is_set():
+            reason = "cancelled"
+        elif deadline and time.time() > deadline:
+            reason = "timeout"
+        elif disk_bytes and time.time() > next_disk_check:
+            next_disk_check = time.time() + DISK_CHECK_SECONDS
+            if dir_size(workdir) > disk_bytes:
+                reason = "disk_limit"
+        if reason:
+            log.info(f"🛑 Stopping task: {reason}")
+            stop()
+            return reason
+        if cancel_event is not None:
+            cancel_event.wait(POLL_SECONDS) # Wakes up as soon as the task is cancelled
+        else:
+            time.sleep(POLL_SECONDS)
+    return None
+
+class ContainerWatch:
+    """
+    is_running() for supervise() that asks the Docker API at most every
+    CONTAINER_POLL_SECONDS instead of on every tick. `ended` is a cheap hint
+    (e.g. the log stream closed): the first time it is true we check right away.
+    """
+
+    def __init__(self, container, states=("running",), ended=None):
+        self.container = container
+        self.states = states
+        self.ended = ended
+        self.hinted = False
+        self.next_poll = time.monotonic() + CONTAINER_POLL_SECONDS
+
+    def __call__(self) -> bool:
+        now = time.monotonic()
+        if now < self.next_poll:
+            if self.ended is None or self.hinted or not self.ended():
+                return True
+            self.hinted = True
+        self.next_poll = now + CONTAINER_POLL_SECONDS
+        self.container.reload()
+        return self.container.status in self.states
+
+# RESOURCE USAGE
+# Reported with each result (result["usage"]): peak memory and CPU seconds.
+# Pool containers and the process executor read them from the child's rusage;
+# one-shot containers are sampled through the Docker stats API.
+STATS_SECONDS = 1.0
+
+class ContainerStats:
+    """Samples a running container's memory and CPU counters in a background thread."""
+
+    def __init__(self, container):
+        self.container = container
+        self.peak_memory_bytes = 0
+        self.cpu_seconds = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+
+    def _sample(self):
+        while not self.stopped.is_set():
+            try:
+                stats = self.container.stats(stream=False, one_shot=True)
+                memory = stats.get("memory_stats", {})
+                # max_usage only exists on cgroup v1; v2 gives the current usage
+                self.peak_memory_bytes = max(self.peak_memory_bytes, memory.get("max_usage") or memory.get("usage") or 0)
+                total_usage = stats.get("cpu_stats", {}).get("cpu_usage", {}).get("total_usage")
+                if total_usage:
+                    self.cpu_seconds = total_usage / 1e9
+            except Exception:
+                pass # Container gone or daemon busy: keep the last sample
+            self.stopped.wait(STATS_SECONDS)
+
+    def stop(self) -> dict:
+        self.stopped.set()
+        self.thread.join(timeout=STATS_SECONDS + 5)
+        return {"peak_memory_bytes": self.peak_memory_bytes or None, "cpu_seconds": round(self.cpu_seconds, 3) or None}
+
+def rusage_usage(rusage) -> dict:
+    """Usage dict from a child's resource.struct_rusage (ru_maxrss is in KB on Linux)."""
+    return {"peak_memory_bytes": rusage.ru_maxrss * 1024, "cpu_seconds": round(rusage.ru_utime + rusage.ru_stime, 3)}
+
+# BASE IMAGE
+# The base image is labelled with the digest of Dockerfile.base. On startup we
+# only rebuild when the Dockerfile changed; a prebuilt image can also come from
+# a tarball (docker save) or a registry instead of being built locally.
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE_DOCKERFILE = os.path.join(PROJECT_DIR, "Dockerfile.base")
+BASE_IMAGE_TARBALL = os.getenv("BASE_IMAGE_TARBALL", "")  # e.g. secure-executor-base.tar
+BASE_IMAGE_PULL = os.getenv("BASE_IMAGE_PULL", "")        # e.g. ghcr.io/org/secure-executor-base:latest
+DIGEST_LABEL = "gridx.dockerfile_digest"
+
+def dockerfile_digest(path: str = BASE_DOCKERFILE) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _image_digest(tag: str) -> Optional[str]:
+    """Dockerfile digest the local image was built from, or None if it's missing/unlabelled."""
+    try:
+        return docker_client().images.get(tag).labels.get(DIGEST_LABEL)
+    except docker.errors.ImageNotFound:
+        return None
+
+def _fetch_prebuilt_image(tag: str, digest: str) -> bool:
+    """Tries BASE_IMAGE_TARBALL, then BASE_IMAGE_PULL. True if we now have an up-to-date image."""
+    if BASE_IMAGE_TARBALL and os.path.exists(BASE_IMAGE_TARBALL):
+        try:
+            log.info(f"📦 Loading base image from {BASE_IMAGE_TARBALL}...")
+            with open(BASE_IMAGE_TARBALL, "rb") as f:
+                for image in docker_client().images.load(f):
+                    image.tag(tag)
+            if _image_digest(tag) == digest:
+                return True
+            log.warning("⚠️ Loaded image was built from a different Dockerfile.base")
+        except Exception as e:
+            log.warning(f"⚠️ Could not load {BASE_IMAGE_TARBALL}: {e}")
+
+    if BASE_IMAGE_PULL:
+        try:
+            log.info(f"📦 Pulling base image {BASE_IMAGE_PULL}...")
+            docker_client().images.pull(BASE_IMAGE_PULL).tag(tag)
+            if _image_digest(tag) == digest:
+                return True
+            log.warning("⚠️ Pulled image was built from a different Dockerfile.base")
+        except Exception as e:
+            log.warning(f"⚠️ Could not pull {BASE_IMAGE_PULL}: {e}")
+    return False
+
+def ensure_base_image(tag=BASE_IMAGE):
+    """Makes sure `tag` matches the current Dockerfile.base, building only if needed."""
+    digest = dockerfile_digest()
+    if _image_digest(tag) == digest:
+        log.info(f"✅ Base image {tag} is up to date ({digest[:12]})")
+        return
+    if _fetch_prebuilt_image(tag, digest):
+        log.info(f"✅ Base image {tag} ready ({digest[:12]})")
+        return
+    build_base_image(tag, digest)
+
+def build_base_image(tag=BASE_IMAGE, digest: Optional[str] = None):
+    """Builds the base image from Dockerfile.base and labels it with the Dockerfile's digest."""
+    log.info(f"Building base image {tag}...")
+    digest = digest or dockerfile_digest()
+
+    with open(BASE_DOCKERFILE) as f:
+        needs_context = any(line.strip().upper().startswith(("COPY", "ADD")) for line in f)
+    context_dir = PROJECT_DIR
+    if not needs_context:
+        # Nothing is copied in: send just the Dockerfile, not the whole project
+        context_dir = tempfile.mkdtemp(prefix="gridx_build_")
+        shutil.copyfile(BASE_DOCKERFILE, os.path.join(context_dir, "Dockerfile.base"))
     
     try:
-        client.images.build(
-            path=base_dir,
+        docker_client().images.build(
+            path=context_dir,
             dockerfile="Dockerfile.base",
             tag=tag,
+            labels={DIGEST_LABEL: digest},
             rm=True
         )
-        print("Base image build complete.")
+        log.info("Base image build complete.")
     except Exception as e:
-        print(f"Error building base image: {e}")
+        log.error(f"Error building base image: {e}")
+    finally:
+        if context_dir != PROJECT_DIR:
+            shutil.rmtree(context_dir, ignore_errors=True)
 
-def run_in_sandbox(
+def requirements_hash(source_dir: str) -> Optional[str]:
+    """
+    Hash of the requirements in source_dir, ignoring comments, blank lines and order.
+    Returns None when there is nothing to install.
+    """
+    path = os.path.join(source_dir, "requirements.txt")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        lines = sorted({line.split("#", 1)[0].strip() for line in f} - {""})
+    if not lines:
+        return None
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+def ensure_dependency_image(source_dir: str, base_image: str = BASE_IMAGE) -> str:
+    """
+    Returns an image with source_dir's requirements pre-installed, building
+    (and caching) it on first use. Raises if pip install fails.
+    """
+    req_hash = requirements_hash(source_dir)
+    if req_hash is None:
+        return base_image
+
+    # Tied to the base image too: a rebuilt base invalidates its dependency images
+    tag = f"{req_hash[:16]}-{(_image_digest(base_image) or 'unlabelled')[:8]}"
+    image_name = f"{DEPS_IMAGE_REPO}:{tag}"
+
+    with _deps_locks[req_hash]:
+        # 1. Cache hit: reuse the image, credit the install time it saves
+        try:
+            image = docker_client().images.get(image_name)
+            install_seconds = float(image.labels.get("gridx.install_seconds", 0))
+            with _deps_stats_lock:
+                dependency_cache_stats["hits"] += 1
+                dependency_cache_stats["saved_seconds"] += install_seconds
+            return image_name
+        except docker.errors.ImageNotFound:
+            pass
+
+        # 2. Cache miss: pip install once (with network) and commit the result
+        log.info(f"📦 Building dependency image {image_name}...")
+        start = time.time()
+        container = docker_client().containers.run(
+            image=base_image,
+            command="pip install --no-cache-dir -r requirements.txt",
+            volumes={os.path.abspath(source_dir): {'bind': '/app', 'mode': 'ro'}},
+            working_dir="/app",
+            detach=True,
+            network_mode="bridge"
+        )
+        try:
+            try:
+                exit_code = container.wait(timeout=DEPS_BUILD_TIMEOUT).get("StatusCode", 1)
+            except Exception:
+                raise RuntimeError(f"pip install did not finish within {DEPS_BUILD_TIMEOUT}s")
+            if exit_code != 0:
+                logs = container.logs().decode('utf-8', errors='replace')
+                raise RuntimeError(f"pip install failed ({exit_code}): {logs[-500:]}")
+
+            install_seconds = time.time() - start
+            container.commit(
+                repository=DEPS_IMAGE_REPO,
+                tag=tag,
+                changes=[
+                    'CMD ["python3"]',
+                    f'LABEL gridx.install_seconds="{install_seconds:.1f}"',
+                ]
+            )
+        finally:
+            container.remove(force=True)
+
+        with _deps_stats_lock:
+            dependency_cache_stats["misses"] += 1
+            dependency_cache_stats["install_seconds"] += install_seconds
+        log.info(f"✅ Dependency image ready in {install_seconds:.1f}s")
+        return image_name
+
+def dependency_cache_report() -> dict:
+    """Hit rate and time saved by the dependency cache so far."""
+    with _deps_stats_lock:
+        stats = dict(dependency_cache_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    return stats
+
+# WARM CONTAINER POOL
+# Creating, starting and removing a container (plus importing torch inside it)
+# costs seconds per task. Instead we keep idle containers running
+# sandbox_runner.py, which has torch/pandas already imported, and hand them tasks.
+# Each container serves WARM_POOL_MAX_USES tasks, then is destroyed and replaced.
+# A container only ever serves tasks of one job: one that ran a task is reused
+# for the same job_id only, so nothing in /tmp, $HOME or memory reaches another
+# job. Between tasks the runner kills leftover processes and empties /tmp.
+WARM_POOL = os.getenv("WARM_POOL", "true").lower() == "true"
+WARM_POOL_MAX_USES = int(os.getenv("WARM_POOL_MAX_USES", "20"))
+WARM_POOL_MAX_IDLE = int(os.getenv("WARM_POOL_MAX_IDLE", "4"))        # Idle containers kept per image/limits
+WARM_POOL_IDLE_TIMEOUT = int(os.getenv("WARM_POOL_IDLE_TIMEOUT", "600")) # Seconds before an idle one is reaped
+WARM_POOL_PREWARM = os.getenv("WARM_POOL_PREWARM", "torch,pandas")
+RUNNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_runner.py")
+RUNNER_DONE_PREFIX = b"GRIDX_DONE " # sandbox_runner.DONE_PREFIX
+TASK_USER = "sandbox"               # Pool containers run the runner as root; tasks run as this user
+
+FRESH = object() # PooledContainer.job_id of a container that has not run a task yet
+
+class PooledContainer:
+    def __init__(self, container, workdir: str, key: tuple):
+        self.container = container
+        self.workdir = workdir  # Host dir bind-mounted at /app
+        self.key = key
+        self.job_id = FRESH     # Job it is bound to after its first task
+        self.uses = 0
+        self.idle_since = time.time()
+
+class RunnerReport:
+    """
+    Follows a pool container's stdout for the runner's done line of one task.
+    Only the runner writes there (the task runs as another user), unlike /app.
+    """
+
+    def __init__(self, container, nonce: str):
+        self.nonce = nonce
+        self.done = None
+        self.finished = threading.Event() # Reported, or the stream ended (container gone)
+        # Opened before the task is handed over, and only new output (tail=0)
+        self.stream = container.logs(stream=True, follow=True, stdout=True, stderr=False, tail=0)
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        buffer = b""
+        try:
+            for chunk in self.stream:
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if not line.startswith(RUNNER_DONE_PREFIX):
+                        continue
+                    try:
+                        report = json.loads(line[len(RUNNER_DONE_PREFIX):])
+                    except ValueError:
+                        continue
+                    if report.get("nonce") == self.nonce:
+                        self.done = report
+                        return
+        except Exception:
+            pass # Stream closed under us
+        finally:
+            self.finished.set()
+
+    def close(self):
+        try:
+            self.stream.close()
+        except Exception:
+            pass
+
+class WarmPool:
+    """
+    Idle, pre-started sandbox containers keyed by (image, cpu_limit, mem_limit, disk_limit).
+    A task gets an idle container of its own job, else a fresh one.
+    """
+
+    def __init__(self):
+        self.root = os.path.join(tempfile.gettempdir(), "gridx_pool")
+        self.idle = defaultdict(list)
+        self.lock = threading.Lock()
+        self.stats = {"reused": 0, "started": 0, "recycled": 0}
+
+    def _start(self, key: tuple) -> PooledContainer:
+        image, cpu_limit, mem_limit, disk_limit = key
+        os.makedirs(self.root, exist_ok=True)
+        workdir = tempfile.mkdtemp(prefix="slot_", dir=self.root)
+        os.chmod(workdir, 0o777)  # Tasks run as the non-root 'sandbox' user
+
+        container = docker_client().containers.run(
+            image=image,
+            command="python /gridx/runner.py",
+            volumes={
+                workdir: {'bind': '/app', 'mode': 'rw'},
+                RUNNER_PATH: {'bind': '/gridx/runner.py', 'mode': 'ro'},
+            },
+            working_dir="/app",
+            environment={"GRIDX_PREWARM": WARM_POOL_PREWARM, "GRIDX_TASK_USER": TASK_USER},
+            user="root", # Only the runner; it drops to TASK_USER before running a task
+            labels={"gridx.pool": "1"},
+            tmpfs={"/tmp": f"size={disk_limit}"} if disk_limit else None, # Sized per key, like the workspace
+            detach=True,
+            network_mode=CACHED_NETWORK_MODE,
+            mem_limit=mem_limit,
+            nano_cpus=int(cpu_limit * 1e9)
+        )
+        with self.lock:
+            self.stats["started"] += 1
+        return PooledContainer(container, workdir, key)
+
+    def _destroy(self, pooled: PooledContainer):
+        try:
+            pooled.container.remove(force=True)
+        except Exception:
+            pass
+        shutil.rmtree(pooled.workdir, ignore_errors=True)
+
+    def _reap_idle(self):
+        """Drops containers that sat idle too long. Caller holds the lock."""
+        now = time.time()
+        for key, containers in self.idle.items():
+            stale = [c for c in containers if now - c.idle_since > WARM_POOL_IDLE_TIMEOUT]
+            for pooled in stale:
+                containers.remove(pooled)
+                threading.Thread(target=self._destroy, args=(pooled,), daemon=True).start()
+
+    def acquire(self, key: tuple, job_id=None) -> PooledContainer:
+        with self.lock:
+            self._reap_idle()
+            idle = self.idle[key]
+            # Most recently used container of this job first, then a fresh one
+            for owner in (job_id, FRESH):
+                for i in range(len(idle) - 1, -1, -1):
+                    if idle[i].job_id == owner:
+                        pooled = idle.pop(i)
+                        if owner is not FRESH:
+                            self.stats["reused"] += 1
+                        pooled.job_id = job_id
+                        return pooled
+        pooled = self._start(key)
+        pooled.job_id = job_id
+        return pooled
+
+    def release(self, pooled: PooledContainer, healthy: bool = True):
+        pooled.uses += 1
+        # Wipe anything the task left behind before the next one moves in;
+        # if something can't be removed, the container is not reused
+        for name in os.listdir(pooled.workdir):
+            path = os.path.join(pooled.workdir, name)
+            try:
+                shutil.rmtree(path) if os.path.isdir(path) and not os.path.islink(path) else os.remove(path)
+            except OSError as e:
+                log.warning(f"⚠️ Could not clean pooled workspace, recycling the container: {e}")
+                healthy = False
+
+        evicted = None
+        with self.lock:
+            if healthy and pooled.uses < WARM_POOL_MAX_USES:
+                pooled.idle_since = time.time()
+                self.idle[pooled.key].append(pooled)
+                if len(self.idle[pooled.key]) <= WARM_POOL_MAX_IDLE:
+                    return
+                # Full: make room by dropping the container idle the longest (likely a finished job's)
+                evicted = self.idle[pooled.key].pop(0)
+            self.stats["recycled"] += 1
+        self._destroy(evicted or pooled)
+
+    def prewarm(self, image: str, cpu_limit: float, mem_limit: str, disk_limit: str = DISK_LIMIT, count: int = 1):
+        """Starts `count` idle containers ahead of the first task."""
+        key = (image, cpu_limit, mem_limit, disk_limit)
+        for _ in range(count):
+            pooled = self._start(key)
+            with self.lock:
+                self.idle[key].append(pooled)
+
+    def run(self, source_dir: str, image: str, entry_point: str, cpu_limit: float, mem_limit: str,
+            timeout: float = TASK_TIMEOUT, cpu_seconds: int = TASK_CPU_SECONDS,
+            disk_limit: str = DISK_LIMIT, cancel_event: Optional[threading.Event] = None,
+            timings: Optional[dict] = None, job_id=None) -> dict:
+        """
+        Runs entry_point from source_dir in a warm container of job_id (or a fresh one).
+        Outputs land back in source_dir.
+        """
+        timings = {} if timings is None else timings
+        start = time.time()
+        pooled = self.acquire((image, cpu_limit, mem_limit, disk_limit), job_id)
+        healthy = False
+        disk_bytes = parse_memory(disk_limit) if disk_limit else 0
+        report = None
+        try:
+            # 1. Move the task files into the container's mounted dir (same filesystem: a rename)
+            for name in os.listdir(source_dir):
+                shutil.move(os.path.join(source_dir, name), os.path.join(pooled.workdir, name))
+
+            # 2. Start the task: the runner forks a pre-warmed interpreter for it
+            #    and applies the CPU / file-size rlimits in the child
+            nonce = secrets.token_hex(8)
+            report = RunnerReport(pooled.container, nonce)
+            task_file = os.path.join(pooled.workdir, ".gridx_task")
+            with open(task_file + ".tmp", "w") as f:
+                json.dump({"entry_point": entry_point, "cpu_seconds": cpu_seconds, "fsize": disk_bytes,
+                           "nonce": nonce}, f)
+            os.replace(task_file + ".tmp", task_file)
+            timings["container_start"] = time.time() - start
+
+            # 3. Wait for the runner's report (or the container dying under us, e.g. OOM).
+            #    Stopping a task kills the whole container; it is not reused.
+            container_running = ContainerWatch(pooled.container)
+
+            def is_running():
+                return not report.finished.is_set() and container_running()
+
+            start = time.time()
+            reason = supervise(is_running, pooled.container.kill, pooled.workdir, timeout, disk_bytes, cancel_event)
+            timings["training"] = time.time() - start
+
+            usage = None
+            done = report.done
+            if reason is None and done is not None:
+                exit_code = done["exit_code"]
+                usage = {key: done.get(key) for key in ("peak_memory_bytes", "cpu_seconds")}
+                healthy = True
+            else:
+                # The task did run, so report it as failed rather than retrying it elsewhere
+                pooled.container.reload()
+                exit_code = pooled.container.attrs['State'].get('ExitCode', 1) or 1
+
+            return task_result(exit_code, read_log_file(os.path.join(pooled.workdir, ".gridx_logs")), reason, timings, usage)
+        finally:
+            if report is not None:
+                report.close()
+            # 4. Move outputs back to the task workspace (minus the protocol files)
+            try:
+                for name in os.listdir(pooled.workdir):
+                    if name.startswith(".gridx_"):
+                        continue
+                    shutil.move(os.path.join(pooled.workdir, name), os.path.join(source_dir, name))
+            finally:
+                self.release(pooled, healthy)
+
+    def remove_stale(self):
+        """Removes pool containers left behind by a previous worker process."""
+        for container in docker_client().containers.list(all=True, filters={"label": "gridx.pool=1"}):
+            try:
+                container.remove(force=True)
+            except Exception:
+                pass
+
+    def shutdown(self):
+        with self.lock:
+            containers = [c for group in self.idle.values() for c in group]
+            self.idle.clear()
+        for pooled in containers:
+            self._destroy(pooled)
+
+warm_pool = WarmPool()
+
+def task_result(exit_code: int, logs: str, reason: Optional[str] = None,
+                timings: Optional[dict] = None, usage: Optional[dict] = None) -> dict:
+    """
+    Result dict for a finished task. status: success | error | timeout | cancelled | cpu_limit | disk_limit.
+    timings: seconds per phase (dependencies, container_start, training); usage: peak_memory_bytes, cpu_seconds.
+    """
+    status = reason or LIMIT_EXIT_CODES.get(exit_code) or ("success" if exit_code == 0 else "error")
+    return {"status": status, "exit_code": exit_code, "logs": logs, "timings": timings or {}, "usage": usage or {}}
+
+def run_in_docker(
     source_dir: str,
     cpu_limit: float = 1.0,
     mem_limit: str = "512m",
-    entry_point: str = "main.py"
+    entry_point: str = "main.py",
+    timeout: float = TASK_TIMEOUT,
+    cpu_seconds: int = TASK_CPU_SECONDS,
+    disk_limit: str = DISK_LIMIT,
+    cancel_event: Optional[threading.Event] = None,
+    job_id=None
 ) -> dict:
     """
     Runs the code in source_dir inside a secure container.
+    The task is stopped after `timeout` seconds, when it writes more than
+    `disk_limit`, or when cancel_event is set; `cpu_seconds` caps its CPU time.
+    Warm containers are only shared between tasks of the same job_id.
     """
     
     # Ensure absolute path
     source_dir = os.path.abspath(source_dir)
+    timings = {}
+    limits = {"timeout": timeout, "cpu_seconds": cpu_seconds, "disk_limit": disk_limit,
+              "cancel_event": cancel_event, "timings": timings, "job_id": job_id}
     
     try:
-        print(f"running {entry_point} inside {source_dir}...")
-        
-        # Command: Install dependencies if file exists, then run script
-        # We enabled network so pip install works
-        command = f"/bin/bash -c 'if [ -f requirements.txt ]; then pip install -r requirements.txt; fi && python {entry_point}'"
-        
-        container = client.containers.run(
-            image="secure-executor-base:latest",
+        log.info(f"running {entry_point} inside {source_dir}...")
+
+        # Dependencies pre-installed in a cached image -> run offline
+        image = None
+        start = time.time()
+        if DEPENDENCY_CACHE:
+            try:
+                image = ensure_dependency_image(source_dir)
+            except Exception as e:
+                log.warning(f"⚠️ Dependency cache unavailable, installing in-container: {e}")
+        timings["dependencies"] = time.time() - start
+
+        if cancel_event is not None and cancel_event.is_set():
+            return task_result(1, "", "cancelled", timings)
+
+        if image and WARM_POOL:
+            try:
+                return warm_pool.run(source_dir, image, entry_point, cpu_limit, mem_limit, **limits)
+            except Exception as e:
+                log.warning(f"⚠️ Warm pool run failed, using a fresh container: {e}")
+
+        if image:
+            command = f"python {entry_point}"
+            network_mode = CACHED_NETWORK_MODE
+        else:
+            # Command: Install dependencies if file exists, then run script
+            # We enabled network so pip install works
+            # (the install then counts as training time: it runs inside the task)
+            image = BASE_IMAGE
+            command = f"/bin/bash -c 'if [ -f requirements.txt ]; then pip install -r requirements.txt; fi && python {entry_point}'"
+            network_mode = "bridge"
+
+        disk_bytes = parse_memory(disk_limit) if disk_limit else 0
+        start = time.time()
+        container = docker_client().containers.run(
+            image=image,
             command=command,
             volumes={source_dir: {'bind': '/app', 'mode': 'rw'}},
             working_dir="/app",
             detach=True,
-            # Hackathon Mode: Enable network so users can pip install anything
-            # Production: Disable network ("none") and pre-install packages
-            network_mode="bridge", 
+            # Cached dependencies: no network needed (SANDBOX_NETWORK, default "none")
+            # Fallback: enable network so users can pip install anything
+            network_mode=network_mode,
             mem_limit=mem_limit,
-            nano_cpus=int(cpu_limit * 1e9)
+            nano_cpus=int(cpu_limit * 1e9),
+            ulimits=task_ulimits(cpu_seconds, disk_bytes),
+            tmpfs={"/tmp": f"size={disk_limit}"} if disk_limit else None
         )
-        
-        # Wait for completion
-        container.wait()
-        
-        # Get logs and status
-        # Since wait() returns dict on newer docker-py versions, we reload container object to get attrs
-        container.reload()
-        exit_code = container.attrs['State']['ExitCode']
-        logs = container.logs()
-        
-        container.remove()
-        
-        status = "success" if exit_code == 0 else "error"
-        decoded_logs = logs.decode('utf-8', errors='replace')
-        
-        return {
-            "status": status,
-            "exit_code": exit_code,
-            "logs": decoded_logs
-        }
+        timings["container_start"] = time.time() - start
+
+        try:
+            # Stream logs as they are produced (capped), instead of buffering them all at the end
+            logs = LogBuffer()
+            def collect_logs():
+                for chunk in container.logs(stream=True, follow=True):
+                    logs.write(chunk)
+            log_thread = threading.Thread(target=collect_logs, daemon=True)
+            log_thread.start()
+
+            # The log stream ends when the container exits; in between, ask Docker once a second
+            is_running = ContainerWatch(container, ("created", "running"), ended=lambda: not log_thread.is_alive())
+            stats = ContainerStats(container)
+            start = time.time()
+            reason = supervise(is_running, container.kill, source_dir, timeout, disk_bytes, cancel_event)
+            timings["training"] = time.time() - start
+
+            container.reload()
+            exit_code = container.attrs['State']['ExitCode']
+            log_thread.join(timeout=5)
+            return task_result(exit_code, logs.text(), reason, timings, stats.stop())
+        finally:
+            container.remove(force=True)
         
     except Exception as e:
-        return {"status": "error", "message": str(e), "logs": ""}
+        return {"status": "error", "message": str(e), "logs": "", "timings": timings, "usage": {}}
+
+
+# ==========================================
+# EXECUTORS
+# ==========================================
+# How a task is actually run, selected by EXECUTOR:
+#   "docker"  -> containers (default; the isolation boundary for untrusted code)
+#   "process" -> subprocess in a per-requirements venv with rlimits/cgroups and a
+#                private temp dir (worker/process_executor.py). Starts in
+#                milliseconds and needs no Docker daemon, for local runs, tests
+#                and benchmarks. Not a security boundary.
+EXECUTOR = os.getenv("EXECUTOR", "docker").lower()
+
+class Executor:
+    """Interface every executor implements."""
+    name = "base"
+
+    def prepare(self):
+        """One-time setup when the worker starts (images, stale state)."""
+
+    def run(self, source_dir: str, cpu_limit: float, mem_limit: str, entry_point: str, **limits) -> dict:
+        """Runs entry_point in source_dir. Returns task_result() with timings and usage; limits as in run_in_sandbox."""
+        raise NotImplementedError
+
+    def dependency_cache_report(self) -> dict:
+        return {"hits": 0, "misses": 0, "install_seconds": 0.0, "saved_seconds": 0.0, "hit_rate": 0.0}
+
+    def shutdown(self):
+        """Releases anything kept between tasks."""
+
+
+class DockerExecutor(Executor):
+    name = "docker"
+
+    def prepare(self):
+        ensure_base_image() # Rebuilds only if Dockerfile.base changed
+        warm_pool.remove_stale()
+
+    def run(self, source_dir, cpu_limit, mem_limit, entry_point, **limits):
+        return run_in_docker(source_dir, cpu_limit, mem_limit, entry_point, **limits)
+
+    def dependency_cache_report(self):
+        return dependency_cache_report()
+
+    def shutdown(self):
+        warm_pool.shutdown()
+
+
+def _process_executor():
+    from worker.process_executor import ProcessExecutor # Imports helpers from this module
+    return ProcessExecutor()
+
+EXECUTORS = {
+    "docker": DockerExecutor,
+    "process": _process_executor,
+}
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> Executor:
+    """Returns the configured executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if EXECUTOR not in EXECUTORS:
+                    raise ValueError(f"Unknown EXECUTOR '{EXECUTOR}' (choose from {', '.join(EXECUTORS)})")
+                _executor = EXECUTORS[EXECUTOR]()
+                log.info(f"🧰 Executor: {_executor.name}")
+    return _executor
+
+def set_executor(executor: Optional[Executor]):
+    """Swap the active executor (used by tests and benchmarks)."""
+    global _executor
+    _executor = executor
+
+def run_in_sandbox(
+    source_dir: str,
+    cpu_limit: float = 1.0,
+    mem_limit: str = "512m",
+    entry_point: str = "main.py",
+    timeout: float = TASK_TIMEOUT,
+    cpu_seconds: int = TASK_CPU_SECONDS,
+    disk_limit: str = DISK_LIMIT,
+    cancel_event: Optional[threading.Event] = None,
+    job_id=None
+) -> dict:
+    """
+    Runs the code in source_dir with the configured executor.
+    The task is stopped after `timeout` seconds, when it writes more than
+    `disk_limit`, or when cancel_event is set; `cpu_seconds` caps its CPU time.
+    job_id scopes anything an executor reuses between tasks (warm containers).
+    """
+    return get_executor().run(
+        os.path.abspath(source_dir), cpu_limit, mem_limit, entry_point,
+        timeout=timeout, cpu_seconds=cpu_seconds, disk_limit=disk_limit, cancel_event=cancel_event,
+        job_id=job_id
+    )
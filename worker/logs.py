@@ -0,0 +1,216 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# ==========================================
+# STRUCTURED LOGGING (worker side)
+# ==========================================
+# Same line format as the backend's app/logs.py (the worker ships without the
+# backend, so it has its own copy). Records go through a bounded queue to one
+# writer thread, so download / training / upload threads never wait on stdout.
+# Every line carries agent_id. Lines written while a task is bound (see
+# main.py) also carry job_id and subtask_id, and headers() sends the same IDs
+# to the backend so its lines for that request carry them too.
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()        # json | text
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "heartbeat=0.01,poll=0.01")
+
+# Context field -> header sent to the backend
+CORRELATION_HEADERS = {"agent_id": "X-Agent-ID", "job_id": "X-Job-ID", "subtask_id": "X-Subtask-ID"}
+
+_context: contextvars.ContextVar = contextvars.ContextVar("gridx_log_context", default={})
+_sample_rates: Dict[str, float] = {}
+_static: Dict[str, str] = {}
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "context"}
+
+
+def parse_sample_rates(text: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        event, _, rate = item.partition("=")
+        rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+_sample_rates.update(parse_sample_rates(LOG_SAMPLE_RATES))
+
+
+def sampled(event: str) -> Optional[dict]:
+    """
+    Sampling for high-frequency events, decided before the LogRecord is built
+    (building it is most of a log call's cost):
+        if keep := logs.sampled("heartbeat"):
+            log.info("💓 Heartbeat", extra={**keep, "status": status})
+    Returns the extra fields to log with, or None to skip this one.
+    """
+    rate = _sample_rates.get(event, 1.0)
+    if rate >= 1.0:
+        return {"event": event}
+    if rate <= 0 or random.random() >= rate:
+        return None
+    return {"event": event, "sample_rate": rate}
+
+
+def set_sample_rate(event: str, rate: float):
+    _sample_rates[event] = min(1.0, max(0.0, rate))
+
+
+# ==========================================
+# 1. CORRELATION IDS
+# ==========================================
+@contextmanager
+def bound(**fields):
+    """Binds fields to every log line (and backend request) made in this block, in this thread."""
+    merged = dict(_context.get())
+    merged.update({name: value for name, value in fields.items() if value is not None})
+    token = _context.set(merged)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def context() -> dict:
+    return {**_static, **_context.get()}
+
+
+def headers() -> Dict[str, str]:
+    """Correlation headers for requests to the backend."""
+    fields = context()
+    return {header: str(fields[name]) for name, header in CORRELATION_HEADERS.items() if name in fields}
+
+
+# ==========================================
+# 2. HANDLER & FORMATTERS
+# ==========================================
+class ContextQueueHandler(QueueHandler):
+    """Snapshots the bound IDs on the calling thread; drops (and counts) instead of blocking."""
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE):
+        # SimpleQueue is implemented in C and takes no Python-level locks; the
+        # bound is checked with qsize(), so it can overshoot by a few records.
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.context = _context.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+            **_static,
+            **getattr(record, "context", {}),
+        }
+        entry.update({key: value for key, value in record.__dict__.items() if key not in _RESERVED})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The worker's previous console format, plus the bound IDs (LOG_FORMAT=text)."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - [%(threadName)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {**getattr(record, "context", {}),
+                  **{key: value for key, value in record.__dict__.items() if key not in _RESERVED}}
+        if fields:
+            line += "  " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+# ==========================================
+# 3. SETUP
+# ==========================================
+class StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time (tests and benchmarks swap it)."""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+
+_handler: Optional[ContextQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(agent_id: str, stream=None, fmt: str = None, level: str = None,
+                  sample_rates: Optional[Dict[str, float]] = None) -> ContextQueueHandler:
+    """Routes the root logger through the queue (idempotent) and stamps every line with agent_id."""
+    global _handler, _listener
+    with _setup_lock:
+        _static.update(service="worker", agent_id=agent_id)
+        if _handler is not None:
+            return _handler
+
+        output = logging.StreamHandler(stream) if stream is not None else StdoutHandler()
+        output.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+
+        handler = ContextQueueHandler(LOG_QUEUE_SIZE)
+        if sample_rates is not None:
+            _sample_rates.clear()
+            _sample_rates.update(sample_rates)
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level or LOG_LEVEL)
+        # Lines carry no file/line or process name, so skip finding them for every
+        # record (the logging HOWTO's "Optimization" section)
+        logging._srcfile = None
+        logging.logMultiprocessing = False
+
+        _listener = QueueListener(handler.queue, output)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        _handler = handler
+        return handler
+
+
+def shutdown_logging():
+    global _handler, _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            logging.getLogger().removeHandler(_handler)
+        _handler = _listener = None
@@ -4,21 +4,79 @@ import os
 import logging
 import uuid
 import sys
+import threading
+import json
+import shutil
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 
 # Add the parent directory to sys.path so we can import from app
 # This assumes the worker is run from the project root (e.g. python worker/main.py)
 sys.path.append(os.getcwd())
 
-from worker.utils import create_temp_workspace, clean_workspace, download_file
-from worker.executor import run_in_sandbox, build_base_image
+# Pick up worker_config.env when started directly (start_worker.sh exports it already).
+# Before the worker imports: worker.utils, worker.cache, worker.executor and
+# worker.logs read their settings from the environment at import time.
+try:
+    from dotenv import load_dotenv
+    load_dotenv("worker_config.env")
+except ImportError:
+    pass
+
+from worker.utils import (
+    create_temp_workspace, clean_workspace, download_file, upload_to_presigned_url,
+    materialize_csv, CHUNK_FILENAMES, parse_memory, detect_host_resources,
+    compress_file, backoff_delay, UPLOAD_RETRIES, UPLOAD_TIMEOUT
+)
+from worker.cache import fetch_artifact, get_artifact_cache
+from worker import logs, update_codec
+from worker.executor import run_in_sandbox, get_executor
 
 # CONFIGURATION
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 AGENT_ID = os.getenv("AGENT_ID", str(uuid.uuid4()))
 GPU_MODEL = "NVIDIA GeForce RTX 3090" # Mock
-RAM_TOTAL = "24GB"
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# SLOTS: how many sandboxed tasks run at once, and what each one gets.
+# CPU_LIMIT / MEMORY_LIMIT are per slot. WORKER_SLOTS=auto fits as many
+# slots as the host's cores and memory allow.
+CPU_LIMIT = float(os.getenv("CPU_LIMIT", "1.0"))
+MEMORY_LIMIT = os.getenv("MEMORY_LIMIT", "512m")
+WORKER_SLOTS = os.getenv("WORKER_SLOTS", "auto")
+HOST_CORES, HOST_MEMORY = detect_host_resources()
+RAM_TOTAL = f"{round(HOST_MEMORY / 1024 ** 3)}GB" if HOST_MEMORY else "Unknown"
+
+# RESULT UPLOAD: model.pth is zstd-compressed before it leaves the machine
+# ("none" to disable). The backend decompresses transparently.
+RESULT_COMPRESSION = os.getenv("RESULT_COMPRESSION", "zstd").lower()
+RESULT_COMPRESSION_LEVEL = int(os.getenv("RESULT_COMPRESSION_LEVEL", "3"))
+
+# JSON lines through a background writer thread (LOG_FORMAT=text for the console format; see worker/logs.py)
+logs.setup_logging(AGENT_ID)
+
+def task_logging(fn):
+    """
+    Binds the task's job_id / subtask_id to every log line written by fn (and
+    sends them with its backend requests). A task moves between the prefetch,
+    slot and uploader threads, so each stage binds them again.
+    """
+    @wraps(fn)
+    def wrapper(task, *args, **kwargs):
+        task_data = task.get("task", task) # task_data, or a prepared task
+        with logs.bound(job_id=task_data.get("job_id"), subtask_id=task_data.get("task_id")):
+            return fn(task, *args, **kwargs)
+    return wrapper
+
+def compute_slot_count() -> int:
+    """Number of concurrent task slots for this host."""
+    if WORKER_SLOTS != "auto":
+        return max(1, int(WORKER_SLOTS))
+
+    by_cpu = int(HOST_CORES // CPU_LIMIT)
+    # Keep ~10% of RAM for the host, Docker and the worker itself
+    by_memory = int(HOST_MEMORY * 0.9 // parse_memory(MEMORY_LIMIT)) if HOST_MEMORY else by_cpu
+    return max(1, min(by_cpu, by_memory))
 
 def register_agent():
     """Rgister this worker with the backend."""
@@ -26,7 +84,7 @@ def register_agent():
         # For Hackathon, we hardcode an email that exists in the DB.
         # In production, this would be a config.
         email = os.getenv("WORKER_EMAIL", "agent@gridx.com")
-        print(f"DEBUG: Using email for registration: {email}") # Keep one clean print
+        logging.info(f"Registering with owner email {email}")
         
         payload = {
             "id": AGENT_ID,
@@ -34,17 +92,32 @@ def register_agent():
             "gpu_model": GPU_MODEL,
             "ram_total": RAM_TOTAL
         }
-        resp = requests.post(f"{BACKEND_URL}/agent/register", json=payload)
+        resp = requests.post(f"{BACKEND_URL}/agent/register", json=payload, headers=logs.headers())
         resp.raise_for_status()
         logging.info(f"✅ Registered as {AGENT_ID}")
     except Exception as e:
         logging.warning(f"Registration warning (might already exist or user missing): {e}")
 
+# CANCELLATION
+# Every task we hold (prefetched, running or uploading) has an Event. Heartbeats
+# report their IDs and the backend answers with the ones we should drop
+# (job cancelled, task finished elsewhere, ...); setting the Event kills the sandbox.
+leased_tasks = {}
+leased_lock = threading.Lock()
+
 def send_heartbeat(status="IDLE"):
-    """Tell backend we are alive."""
+    """Tell backend we are alive (and learn which of our tasks were cancelled)."""
     try:
-        payload = {"id": AGENT_ID, "status": status}
-        requests.post(f"{BACKEND_URL}/agent/heartbeat", json=payload, timeout=2)
+        with leased_lock:
+            running = list(leased_tasks)
+        payload = {"id": AGENT_ID, "status": status, "running_tasks": running}
+        resp = requests.post(f"{BACKEND_URL}/agent/heartbeat", json=payload, timeout=2, headers=logs.headers())
+        for task_id in resp.json().get("cancel_tasks", []):
+            with leased_lock:
+                event = leased_tasks.get(task_id)
+            if event and not event.is_set():
+                logging.warning(f"🛑 Backend cancelled Task {task_id}")
+                event.set()
     except Exception:
         pass # Ignore network blips
 
@@ -52,64 +125,207 @@ def poll_for_task():
     """Ask backend for work."""
     try:
         payload = {"agent_id": AGENT_ID}
-        resp = requests.post(f"{BACKEND_URL}/agent/request_task", json=payload)
+        resp = requests.post(f"{BACKEND_URL}/agent/request_task", json=payload, headers=logs.headers())
         resp.raise_for_status()
         data = resp.json()
         
         task_id = data.get("task_id")
         if task_id:
             return data
+        if keep := logs.sampled("poll"):
+            logging.info("💤 No work available", extra=keep)
     except Exception as e:
         logging.error(f"Polling error: {e}")
     return None
 
-def execute_task(task_data):
-    """Run the assigned task."""
-    workspace = create_temp_workspace()
+@task_logging
+def prepare_task(task_data, slot: int = 0):
+    """Creates the task's workspace and downloads its files. Returns the prepared task."""
+    workspace = create_temp_workspace(prefix=f"sandbox_slot{slot}_")
     logging.info(f"🔨 Processing Task {task_data['task_id']} in {workspace}")
-    
+    cancel_event = threading.Event()
+    with leased_lock:
+        leased_tasks[task_data['task_id']] = cancel_event
+    # timings: seconds per phase, reported in complete_task (see backend app/timings.py)
+    # failure: (reason, detail) once the task can't succeed; finish_task reports it instead of completing
+    prepared = {"task": task_data, "workspace": workspace, "slot": slot, "ready": False, "cancel": cancel_event,
+                "timings": {}, "usage": {}, "failure": None}
+
     try:
-        # 1. Download Files
+        # 1. Download Files (concurrently, over the shared connection pool)
         logging.info("⬇️ Downloading files...")
-        download_file(task_data['code_url'], os.path.join(workspace, "train.py"))
-        download_file(task_data['requirements_url'], os.path.join(workspace, "requirements.txt"))
-        download_file(task_data['chunk_data_url'], os.path.join(workspace, "data.csv"))
-        
+        chunk_format = task_data.get('chunk_format') or "csv"
+        chunk_path = os.path.join(workspace, CHUNK_FILENAMES.get(chunk_format, "data.csv"))
+        downloads = [
+            (task_data['code_url'], os.path.join(workspace, "train.py")),
+            (task_data['requirements_url'], os.path.join(workspace, "requirements.txt")),
+            (task_data['chunk_data_url'], chunk_path),
+        ]
+        encoding = task_data.get('update_encoding') or "full"
+        if encoding != "full" and task_data.get('reference_url'):
+            # Send a delta from the job's reference weights instead of the full model
+            downloads.append((task_data['reference_url'], os.path.join(workspace, update_codec.REFERENCE_FILE)))
+            prepared["entry_point"] = setup_update_encoding(workspace, encoding, task_data.get('update_topk_ratio') or 0.01)
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=len(downloads)) as pool:
+            results = pool.map(lambda item: fetch_artifact(*item), downloads)
+        for (_, path), ok in zip(downloads, results):
+            if not ok:
+                logging.warning(f"⚠️ Could not download {os.path.basename(path)}")
+        logging.info(f"⬇️ Downloads finished in {time.time() - started:.1f}s")
+        if artifact_cache := get_artifact_cache():
+            stats = artifact_cache.report()
+            logging.info(f"🗄️ Artifact cache: {stats['hits']} hits / {stats['misses']} misses "
+                         f"(hit rate {stats['hit_rate']:.0%}, {stats['bytes'] / 1024 ** 2:.0f} MB cached)")
+        if chunk_format != "csv":
+            # Columnar chunk: smaller download, but train.py still expects data.csv
+            materialize_csv(chunk_path, chunk_format, os.path.join(workspace, "data.csv"))
+        prepared["timings"]["download"] = time.time() - started
+        prepared["prepared_at"] = time.time()
+        prepared["ready"] = True
+
+    except Exception as e:
+        logging.error(f"Task Preparation Failed: {e}")
+        prepared["failure"] = ("prepare_failed", str(e))
+    return prepared
+
+def setup_update_encoding(workspace: str, encoding: str, topk_ratio: float) -> str:
+    """Puts the update encoder in the workspace. Returns the entry point to run instead of train.py."""
+    entry_point = "gridx_update_codec.py"
+    shutil.copyfile(update_codec.__file__, os.path.join(workspace, entry_point))
+    with open(os.path.join(workspace, update_codec.UPDATE_CONFIG), "w") as f:
+        json.dump({"entry_point": "train.py", "encoding": encoding, "topk_ratio": topk_ratio}, f)
+    return entry_point
+
+@task_logging
+def run_task(prepared):
+    """Runs a prepared task in its sandbox."""
+    if not prepared["ready"] or prepared["cancel"].is_set():
+        return
+    # Prefetched tasks wait here for the slot; without PIPELINE this is ~0
+    prepared["timings"]["queue_wait"] = time.time() - prepared["prepared_at"]
+    try:
         # 2. Execute
         logging.info("⚙️ Running code...")
         # We assume entry point is train.py
-        result = run_in_sandbox(workspace, entry_point="train.py")
+        result = run_in_sandbox(prepared["workspace"], cpu_limit=CPU_LIMIT, mem_limit=MEMORY_LIMIT,
+                                entry_point=prepared.get("entry_point", "train.py"),
+                                cancel_event=prepared["cancel"], job_id=prepared["task"].get("job_id"))
         
         logging.info(f"Execution Result: {result['status']}")
+        prepared["timings"].update(result.get("timings") or {})
+        prepared["usage"] = result.get("usage") or {}
+        if result['status'] == "cancelled":
+            prepared["ready"] = False # Nothing to upload or report
+            return
+        if result['status'] != "success":
+            # Timeout, resource limit or crash: whatever model.pth it left is partial
+            prepared["ready"] = False
+            prepared["failure"] = (result['status'], (result.get('logs') or "")[-2000:])
+            logging.warning(f"⚠️ Task {prepared['task']['task_id']} did not succeed: {result['status']}")
+            return
+        cache = get_executor().dependency_cache_report()
+        logging.info(f"📦 Dependency cache: {cache['hits']} hits / {cache['misses']} misses "
+                     f"(hit rate {cache['hit_rate']:.0%}, {cache['saved_seconds']:.0f}s install time saved)")
         logging.info(f"Logs: {result['logs'][:200]}...") # Show first 200 chars
 
+    except Exception as e:
+        logging.error(f"Task Execution Failed: {e}")
+        prepared["ready"] = False
+        prepared["failure"] = ("error", str(e))
+
+def compress_result(model_path: str):
+    """Returns (path to upload, content type): model.pth.zst when compression is on."""
+    if RESULT_COMPRESSION != "zstd":
+        return model_path, "application/octet-stream"
+
+    compressed_path = model_path + ".zst"
+    if not compress_file(model_path, compressed_path, RESULT_COMPRESSION_LEVEL):
+        logging.warning("⚠️ zstandard not installed, uploading model.pth uncompressed")
+        return model_path, "application/octet-stream"
+
+    raw, packed = os.path.getsize(model_path), os.path.getsize(compressed_path)
+    logging.info(f"🗜️ {os.path.basename(model_path)}: {raw / 1024 ** 2:.1f} MB -> {packed / 1024 ** 2:.1f} MB zstd ({packed / max(raw, 1):.0%})")
+    return compressed_path, "application/zstd"
+
+def upload_through_backend(task_id: int, path: str, content_type: str) -> str:
+    """POSTs the result to /agent/upload_result (streamed, with retries). Returns its URL."""
+    for attempt in range(UPLOAD_RETRIES):
+        try:
+            with open(path, "rb") as f:
+                files = {'file': ('model.pth', f, content_type)}
+                upload_resp = requests.post(
+                    f"{BACKEND_URL}/agent/upload_result",
+                    files=files,
+                    data={"agent_id": AGENT_ID, "task_id": task_id},
+                    timeout=UPLOAD_TIMEOUT,
+                    headers=logs.headers()
+                )
+            upload_resp.raise_for_status()
+            url = upload_resp.json().get("url")
+            if not url:
+                raise ValueError("Backend returned no URL for the uploaded result")
+            return url
+        except Exception as e:
+            logging.warning(f"⚠️ Upload attempt {attempt+1}/{UPLOAD_RETRIES} failed: {e}")
+            if attempt == UPLOAD_RETRIES - 1:
+                raise
+            time.sleep(backoff_delay(attempt))
+
+def report_failure(prepared, reason: str, detail: str = ""):
+    """Tells the backend the task failed, so it requeues the subtask (or fails the job)."""
+    task_id = prepared["task"]['task_id']
+    payload = {"task_id": task_id, "agent_id": AGENT_ID, "reason": reason, "message": detail}
+    try:
+        resp = requests.post(f"{BACKEND_URL}/agent/fail_task", json=payload, timeout=30, headers=logs.headers())
+        resp.raise_for_status()
+        logging.warning(f"❌ Task {task_id} reported as failed ({reason}), backend moved it to {resp.json().get('status')}")
+    except Exception as e:
+        logging.error(f"Could not report failed task {task_id}: {e}")
+
+@task_logging
+def finish_task(prepared):
+    """Uploads the task's result and reports completion (or failure), then removes its workspace."""
+    task_data, workspace = prepared["task"], prepared["workspace"]
+    try:
+        if prepared["cancel"].is_set():
+            return
+        if prepared["failure"]:
+            report_failure(prepared, *prepared["failure"])
+            return
+        if not prepared["ready"]:
+            return
+
         # 3. Check for Output Model
         model_path = os.path.join(workspace, "model.pth")
+        update_path = os.path.join(workspace, update_codec.UPDATE_FILE)
+        if os.path.exists(update_path):
+            model_path = update_path # Encoded delta (see worker/update_codec.py)
         result_url = None
+        result_key = None
+        result_size = None
+        result_sha256 = None
         
         if os.path.exists(model_path):
-            logging.info("📤 Uploading model.pth...")
-            # Upload to Supabase via Backend (or direct if we had keys here)
-            # For this MVP, we will upload to a backend helper endpoint OR 
-            # (Best Practice) The backend should give us a Presigned URL.
-            # 
-            # Constraint: The current backend design relies on 'upload_bytes_to_supabase' on server side.
-            # To fix this without major refactor, we can POST the file to a new endpoint on backend 
-            # or usage the existing /front_job.ts logic but that's for jobs.
-            #
-            # QUICK FIX: We will just mock the "upload" by sending it to a generic file receiver
-            # or we create a specific endpoint in agent.py for uploading results.
-            # 
-            # Let's assume we implement a simple /agent/upload_result endpoint in the backend next.
-            # For now, I will add a placeholder call.
-            with open(model_path, "rb") as f:
-                 files = {'file': ('model.pth', f, 'application/octet-stream')}
-                 upload_resp = requests.post(
-                     f"{BACKEND_URL}/agent/upload_result", 
-                     files=files,
-                     data={"agent_id": AGENT_ID, "task_id": task_data['task_id']}
-                 )
-                 result_url = upload_resp.json().get("url")
+            started = time.time()
+            upload_path, content_type = compress_result(model_path)
+            logging.info(f"📤 Uploading {os.path.basename(upload_path)}...")
+            try:
+                if task_data.get('result_upload_url'):
+                    # Preferred: PUT straight to storage with the presigned URL from request_task.
+                    # The backend only receives the key, size and hash in complete_task.
+                    result_size, result_sha256 = upload_to_presigned_url(task_data['result_upload_url'], upload_path, content_type)
+                    result_key = task_data['result_key']
+                else:
+                    # Fallback for backends that don't presign: send the file through the backend
+                    result_url = upload_through_backend(task_data['task_id'], upload_path, content_type)
+            except Exception as e:
+                # Out of retries: give the subtask back so another agent can run it
+                logging.error(f"Task Upload Failed: {e}")
+                report_failure(prepared, "upload_failed", str(e))
+                return
+            prepared["timings"]["upload"] = time.time() - started
+            logging.info(f"📤 Uploaded {os.path.getsize(upload_path) / 1024 ** 2:.1f} MB in {time.time() - started:.1f}s")
         
         else:
             logging.warning("⚠️ No model.pth found. Task might have failed or not saved output.")
@@ -118,33 +334,169 @@ def execute_task(task_data):
         complete_payload = {
             "task_id": task_data['task_id'],
             "agent_id": AGENT_ID,
-            "result_url": result_url
+            "result_url": result_url,
+            "result_key": result_key,
+            "result_size": result_size,
+            "result_sha256": result_sha256,
+            "timings": {phase: round(seconds, 3) for phase, seconds in prepared["timings"].items()},
+            "peak_memory_bytes": prepared["usage"].get("peak_memory_bytes"),
+            "cpu_seconds": prepared["usage"].get("cpu_seconds")
         }
-        requests.post(f"{BACKEND_URL}/agent/complete_task", json=complete_payload)
-        logging.info("✅ Task Completed!")
+        logging.info("⏱️ " + ", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in prepared["timings"].items()),
+                     extra={"timings": complete_payload["timings"]})
+        complete_resp = requests.post(f"{BACKEND_URL}/agent/complete_task", json=complete_payload, timeout=30,
+                                      headers=logs.headers())
+        if complete_resp.status_code == 409 and result_key:
+            # Storage doesn't have the result we uploaded (missing, truncated or wrong hash):
+            # give the subtask back rather than leave it RUNNING
+            logging.error(f"Backend rejected the uploaded result: {complete_resp.text}")
+            report_failure(prepared, "result_rejected", complete_resp.text)
+            return
+        complete_resp.raise_for_status()
+        logging.info(f"✅ Task {task_data['task_id']} Completed!")
+        record_completion()
         
     except Exception as e:
-        logging.error(f"Task Execution Failed: {e}")
+        logging.error(f"Task Completion Failed: {e}")
     finally:
+        with leased_lock:
+            leased_tasks.pop(task_data['task_id'], None)
         clean_workspace(workspace)
 
+def execute_task(task_data, slot: int = 0):
+    """Run the assigned task in the given slot's workspace and resource share (no pipelining)."""
+    prepared = prepare_task(task_data, slot)
+    run_task(prepared)
+    finish_task(prepared)
+
+# PIPELINE
+# With PIPELINE=true each slot overlaps the stages of consecutive tasks:
+#   prefetcher : leases the next task and downloads its files while the current one trains
+#   slot       : runs prepared tasks in the sandbox, one at a time
+#   uploader   : uploads results and reports completion while the slot runs the next task
+# PREFETCH_DEPTH caps leased-but-not-started tasks per slot and UPLOAD_QUEUE_DEPTH caps
+# finished-but-not-uploaded ones, which bounds the workspaces (disk) we hold at once.
+PIPELINE = os.getenv("PIPELINE", "true").lower() == "true"
+PREFETCH_DEPTH = max(1, int(os.getenv("PREFETCH_DEPTH", "1")))
+UPLOAD_QUEUE_DEPTH = int(os.getenv("UPLOAD_QUEUE_DEPTH", "2"))
+
+upload_queue = queue.Queue(maxsize=UPLOAD_QUEUE_DEPTH)
+
+# Throughput: completed subtasks since start
+completed = {"count": 0, "since": time.time()}
+completed_lock = threading.Lock()
+
+def record_completion():
+    with completed_lock:
+        completed["count"] += 1
+        hours = max(time.time() - completed["since"], 1) / 3600
+        logging.info(f"📈 {completed['count']} subtasks done ({completed['count'] / hours:.1f}/hour)")
+
+# Slots currently running a task (drives the IDLE/BUSY heartbeat)
+busy_slots = set()
+busy_lock = threading.Lock()
+
+# Set once the executor is prepared (base image built/loaded); until then we report WARMING
+worker_ready = threading.Event()
+
+def heartbeat_loop():
+    """Reports WARMING/IDLE/BUSY for the whole agent every 5 seconds."""
+    while True:
+        with busy_lock:
+            status = "BUSY" if busy_slots else "IDLE"
+        if not worker_ready.is_set():
+            status = "WARMING"
+        send_heartbeat(status)
+        time.sleep(5)
+
+def run_prepared(prepared, slot: int):
+    """Runs one prepared task while the slot is marked BUSY."""
+    with busy_lock:
+        busy_slots.add(slot)
+    send_heartbeat("BUSY")
+    try:
+        run_task(prepared)
+    finally:
+        with busy_lock:
+            busy_slots.discard(slot)
+
+def slot_loop(slot: int):
+    """One slot: poll, run, repeat. Each slot runs at most one task at a time."""
+    while True:
+        task = poll_for_task()
+        if task:
+            prepared = prepare_task(task, slot)
+            run_prepared(prepared, slot)
+            finish_task(prepared)
+        else:
+            time.sleep(5)
+
+def prefetch_loop(slot: int, ready: queue.Queue, leases: threading.Semaphore):
+    """Leases and downloads the slot's next task(s) while the current one runs."""
+    while True:
+        leases.acquire() # Released when the slot starts the task
+        task = poll_for_task()
+        if not task:
+            leases.release()
+            time.sleep(5)
+            continue
+        ready.put(prepare_task(task, slot))
+
+def pipelined_slot_loop(slot: int):
+    """One slot with prefetch and background upload (see PIPELINE)."""
+    ready = queue.Queue()
+    leases = threading.Semaphore(PREFETCH_DEPTH)
+    threading.Thread(target=prefetch_loop, args=(slot, ready, leases), name=f"prefetch-{slot}", daemon=True).start()
+
+    while True:
+        prepared = ready.get()
+        leases.release()
+        run_prepared(prepared, slot)
+        # Blocks when UPLOAD_QUEUE_DEPTH results are already waiting (back-pressure)
+        upload_queue.put(prepared)
+
+def upload_loop():
+    """Uploads finished tasks in order, overlapping with the next task's execution."""
+    while True:
+        finish_task(upload_queue.get())
+
+def warm_up():
+    """Prepares the executor in the background (Docker: base image check/build)."""
+    started = time.time()
+    try:
+        get_executor().prepare() # Docker: rebuild the base image only if Dockerfile.base changed
+    except Exception as e:
+        logging.error(f"Executor preparation failed: {e}")
+    logging.info(f"🔥 Ready in {time.time() - started:.1f}s")
+    worker_ready.set()
+    send_heartbeat("IDLE")
+
 def main():
     logging.info("🚀 Grid-X Worker Starting...")
-    build_base_image() # Ensure docker image exists
     register_agent()
-    
+
+    slots = compute_slot_count()
+    logging.info(f"🧮 Host: {HOST_CORES} cores, {RAM_TOTAL} RAM -> {slots} slot(s) of {CPU_LIMIT} CPU / {MEMORY_LIMIT}")
+
+    # Heartbeats start right away; slots wait until the executor is ready
+    threading.Thread(target=heartbeat_loop, name="heartbeat", daemon=True).start()
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    worker_ready.wait()
+
+    if PIPELINE:
+        logging.info(f"🔀 Pipeline on: prefetch {PREFETCH_DEPTH} task(s) per slot, {UPLOAD_QUEUE_DEPTH} queued upload(s)")
+        for slot in range(slots):
+            threading.Thread(target=upload_loop, name=f"uploader-{slot}", daemon=True).start()
+    for slot in range(slots):
+        target = pipelined_slot_loop if PIPELINE else slot_loop
+        threading.Thread(target=target, args=(slot,), name=f"slot-{slot}", daemon=True).start()
+
     while True:
-        send_heartbeat("IDLE")
-        
-        task = poll_for_task()
-        if task:
-            send_heartbeat("BUSY")
-            execute_task(task)
-        
-        time.sleep(5)
+        time.sleep(1)
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
         logging.info("Shutting down worker...")
+        get_executor().shutdown()
@@ -0,0 +1,234 @@
+import logging
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from worker.executor import (
+    Executor, LogBuffer, supervise, task_result, requirements_hash, rusage_usage,
+    TASK_TIMEOUT, TASK_CPU_SECONDS, DISK_LIMIT
+)
+from worker.utils import parse_memory
+
+log = logging.getLogger(__name__)
+
+# ==========================================
+# PROCESS EXECUTOR (EXECUTOR=process)
+# ==========================================
+# Runs the task as a plain subprocess instead of a container:
+#   * dependencies go into a venv per requirements hash, built once, reused after
+#   * the process gets its own session (killed as a group), a private temp/home
+#     dir and a minimal environment (no worker secrets)
+#   * limits: RLIMIT_CPU / RLIMIT_FSIZE always; memory and CPU share through a
+#     cgroup v2 when one is writable, otherwise RLIMIT_AS if PROCESS_MEMORY_RLIMIT
+#     (off by default: virtual-size limits break torch and other big libraries)
+# There is no network or filesystem isolation. Use it for trusted code only.
+
+VENV_ROOT = os.path.expanduser(os.getenv("PROCESS_VENV_ROOT", "~/.gridx/venvs"))
+# Let venvs see the host's site-packages (torch, pandas) so they only install what's missing
+VENV_SYSTEM_SITE_PACKAGES = os.getenv("PROCESS_VENV_SYSTEM_SITE", "true").lower() == "true"
+PROCESS_MEMORY_RLIMIT = os.getenv("PROCESS_MEMORY_RLIMIT", "false").lower() == "true"
+CGROUP_ROOT = os.getenv("PROCESS_CGROUP_ROOT", "/sys/fs/cgroup/gridx")
+PIP_INSTALL_TIMEOUT = int(os.getenv("DEPS_BUILD_TIMEOUT", "900"))
+# The child starts as this shell, which waits for a line on stdin before exec'ing
+# the task. The worker puts it in its cgroup and sets its rlimits in between, so
+# no Python runs in the child after fork (preexec_fn is unsafe with threads).
+START_GATE = 'read -r _ && exec "$0" "$@"'
+
+
+def cgroups_available() -> bool:
+    """True if we can create cgroup v2 children under CGROUP_ROOT with the cpu and memory controllers."""
+    if not os.path.exists("/sys/fs/cgroup/cgroup.controllers"):
+        return False # cgroup v1 or not Linux
+    try:
+        os.makedirs(CGROUP_ROOT, exist_ok=True)
+        with open(os.path.join(CGROUP_ROOT, "cgroup.subtree_control"), "w") as f:
+            f.write("+cpu +memory")
+        return True
+    except OSError:
+        return False
+
+
+class ProcessExecutor(Executor):
+    name = "process"
+
+    def __init__(self, venv_root: str = VENV_ROOT):
+        self.venv_root = venv_root
+        self.venv_locks = defaultdict(threading.Lock) # One venv build per requirements hash at a time
+        self.stats_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "install_seconds": 0.0, "saved_seconds": 0.0}
+        self.install_seconds = {} # requirements hash -> seconds its venv took to build
+        self.use_cgroups = cgroups_available()
+
+    # ---------- dependencies ----------
+    def python_for(self, source_dir: str) -> str:
+        """Interpreter with source_dir's requirements installed (building the venv on first use)."""
+        req_hash = requirements_hash(source_dir)
+        if req_hash is None:
+            return sys.executable
+
+        venv_dir = os.path.join(self.venv_root, req_hash[:16])
+        python = os.path.join(venv_dir, "bin", "python")
+        with self.venv_locks[req_hash]:
+            if os.path.exists(os.path.join(venv_dir, ".gridx_ready")):
+                with self.stats_lock:
+                    self.stats["hits"] += 1
+                    self.stats["saved_seconds"] += self.install_seconds.get(req_hash, 0.0)
+                return python
+
+            log.info(f"📦 Building venv {venv_dir}...")
+            start = time.time()
+            shutil.rmtree(venv_dir, ignore_errors=True) # Half-built by a crashed run
+            command = [sys.executable, "-m", "venv", venv_dir]
+            if VENV_SYSTEM_SITE_PACKAGES:
+                command.append("--system-site-packages")
+            subprocess.run(command, check=True, capture_output=True)
+            install = subprocess.run(
+                [python, "-m", "pip", "install", "--no-cache-dir", "-q", "-r", os.path.join(source_dir, "requirements.txt")],
+                capture_output=True, timeout=PIP_INSTALL_TIMEOUT
+            )
+            if install.returncode != 0:
+                shutil.rmtree(venv_dir, ignore_errors=True)
+                raise RuntimeError(f"pip install failed ({install.returncode}): {install.stderr.decode(errors='replace')[-500:]}")
+            open(os.path.join(venv_dir, ".gridx_ready"), "w").close()
+
+            install_seconds = time.time() - start
+            with self.stats_lock:
+                self.install_seconds[req_hash] = install_seconds
+                self.stats["misses"] += 1
+                self.stats["install_seconds"] += install_seconds
+            log.info(f"✅ Venv ready in {install_seconds:.1f}s")
+            return python
+
+    def dependency_cache_report(self) -> dict:
+        with self.stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
+
+    # ---------- limits ----------
+    def _create_cgroup(self, cpu_limit: float, mem_bytes: int) -> Optional[str]:
+        if not self.use_cgroups:
+            return None
+        try:
+            path = tempfile.mkdtemp(prefix="task_", dir=CGROUP_ROOT)
+            with open(os.path.join(path, "memory.max"), "w") as f:
+                f.write(str(mem_bytes))
+            with open(os.path.join(path, "cpu.max"), "w") as f:
+                f.write(f"{int(cpu_limit * 100000)} 100000")
+            return path
+        except OSError as e:
+            log.warning(f"⚠️ cgroup setup failed, running without memory/CPU share limits: {e}")
+            return None
+
+    @staticmethod
+    def _remove_cgroup(path: Optional[str]):
+        if path:
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _limit_child(pid: int, cpu_seconds: int, disk_bytes: int, mem_bytes: int, cgroup: Optional[str]):
+        """Runs in the worker: limits the child waiting at START_GATE (kept across its exec)."""
+        if cgroup:
+            with open(os.path.join(cgroup, "cgroup.procs"), "w") as f:
+                f.write(str(pid))
+        elif PROCESS_MEMORY_RLIMIT and mem_bytes:
+            resource.prlimit(pid, resource.RLIMIT_AS, (mem_bytes, mem_bytes))
+        if cpu_seconds:
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        if disk_bytes:
+            resource.prlimit(pid, resource.RLIMIT_FSIZE, (disk_bytes, disk_bytes))
+
+    # ---------- run ----------
+    def run(self, source_dir: str, cpu_limit: float, mem_limit: str, entry_point: str,
+            timeout: float = TASK_TIMEOUT, cpu_seconds: int = TASK_CPU_SECONDS,
+            disk_limit: str = DISK_LIMIT, cancel_event: Optional[threading.Event] = None,
+            job_id=None) -> dict:
+        # job_id is unused: nothing here outlives the task but the venv
+        source_dir = os.path.abspath(source_dir)
+        private_tmp = tempfile.mkdtemp(prefix="gridx_tmp_")
+        cgroup = None
+        timings = {}
+        try:
+            log.info(f"running {entry_point} inside {source_dir} (process)...")
+            start = time.time()
+            python = self.python_for(source_dir)
+            timings["dependencies"] = time.time() - start
+            if cancel_event is not None and cancel_event.is_set():
+                return task_result(1, "", "cancelled", timings)
+
+            disk_bytes = parse_memory(disk_limit) if disk_limit else 0
+            mem_bytes = parse_memory(mem_limit) if mem_limit else 0
+            cgroup = self._create_cgroup(cpu_limit, mem_bytes)
+            env = {
+                "PATH": os.path.dirname(python) + os.pathsep + "/usr/local/bin:/usr/bin:/bin",
+                "HOME": private_tmp,
+                "TMPDIR": private_tmp,
+                "LANG": os.environ.get("LANG", "C.UTF-8"),
+                "PYTHONUNBUFFERED": "1",
+            }
+
+            start = time.time()
+            process = subprocess.Popen(
+                ["/bin/sh", "-c", START_GATE, python, entry_point],
+                cwd=source_dir,
+                env=env,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True, # Own process group: a kill takes its children too
+            )
+            try:
+                self._limit_child(process.pid, cpu_seconds, disk_bytes, mem_bytes, cgroup)
+                os.write(process.stdin.fileno(), b"go\n") # Unbuffered: nothing left to flush on close
+            except Exception:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                raise
+            finally:
+                process.stdin.close() # The task itself sees an empty stdin
+
+            timings["container_start"] = time.time() - start
+
+            # Stream logs as they are produced (capped)
+            logs = LogBuffer()
+            def collect_logs():
+                for chunk in iter(lambda: process.stdout.read1(64 * 1024), b""):
+                    logs.write(chunk)
+            log_thread = threading.Thread(target=collect_logs, daemon=True)
+            log_thread.start()
+
+            def stop():
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            def is_running():
+                # WNOWAIT: look without reaping, so wait4 below still gets the child's rusage
+                return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None
+
+            start = time.time()
+            reason = supervise(is_running, stop, source_dir, timeout, disk_bytes, cancel_event)
+            _, status, rusage = os.wait4(process.pid, 0)
+            timings["training"] = time.time() - start
+            exit_code = process.returncode = os.waitstatus_to_exitcode(status)
+            log_thread.join(timeout=5)
+            return task_result(exit_code, logs.text(), reason, timings, rusage_usage(rusage))
+
+        except Exception as e:
+            return {"status": "error", "message": str(e), "logs": "", "timings": timings, "usage": {}}
+        finally:
+            self._remove_cgroup(cgroup)
+            shutil.rmtree(private_tmp, ignore_errors=True)
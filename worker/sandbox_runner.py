@@ -0,0 +1,158 @@
+"""
+In-container runner for the warm container pool (see executor.WarmPool).
+
+Runs as the main process of a pooled sandbox container. It imports the heavy
+libraries once (GRIDX_PREWARM, e.g. "torch,pandas"), then waits for the worker
+to drop a task file into /app. Each task runs in a forked child, so it starts
+with those imports already done and cannot leave state in the runner. When it
+exits, anything it left running is killed and /tmp is emptied before the worker
+is told the task is done.
+
+The runner runs as root and the child switches to GRIDX_TASK_USER before it
+runs anything, so the task can't write to the runner's stdout, signal it or
+pretend to be it.
+
+Protocol:
+    /app/.gridx_task <- worker writes {"entry_point": "train.py", "cpu_seconds": N, "fsize": N,
+                        "nonce": "..."} to start a task (0 = no CPU-time / file-size limit)
+    /app/.gridx_logs -> child's stdout/stderr
+    runner stdout    -> "GRIDX_DONE {"nonce": ..., "exit_code": N, "cpu_seconds": S,
+                        "peak_memory_bytes": B}" when the child exits (from its rusage).
+                        Not a file in /app: the task could write one itself.
+"""
+import importlib
+import json
+import os
+import pwd
+import resource
+import runpy
+import shutil
+import signal
+import sys
+import time
+
+WORKDIR = "/app"
+TMPDIR = "/tmp"
+TASK_FILE = os.path.join(WORKDIR, ".gridx_task")
+LOG_FILE = os.path.join(WORKDIR, ".gridx_logs")
+DONE_PREFIX = "GRIDX_DONE "
+TASK_USER = os.getenv("GRIDX_TASK_USER", "")
+POLL_SECONDS = 0.02
+
+
+def prewarm():
+    for name in filter(None, os.getenv("GRIDX_PREWARM", "").split(",")):
+        try:
+            importlib.import_module(name.strip())
+        except ImportError:
+            pass
+
+
+def apply_limits(cpu_seconds: int, fsize: int):
+    """Same rlimits the worker sets on one-shot containers (see executor.task_ulimits)."""
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    if fsize:
+        resource.setrlimit(resource.RLIMIT_FSIZE, (fsize, fsize))
+
+
+def drop_privileges():
+    """Child: become TASK_USER (when the runner is root)."""
+    if os.getuid() != 0 or not TASK_USER:
+        return
+    user = pwd.getpwnam(TASK_USER)
+    os.setgroups([])
+    os.setgid(user.pw_gid)
+    os.setuid(user.pw_uid)
+    os.environ["HOME"] = user.pw_dir
+
+
+def run_child(entry_point: str, cpu_seconds: int = 0, fsize: int = 0):
+    """Forked child: behave like `python entry_point` run from /app."""
+    drop_privileges() # Before touching /app: the log file is opened as the task user
+    apply_limits(cpu_seconds, fsize)
+    log_fd = os.open(LOG_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.chdir(WORKDIR)
+    sys.path.insert(0, WORKDIR)
+    sys.argv = [entry_point]
+
+    code = 0
+    try:
+        runpy.run_path(entry_point, run_name="__main__")
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+
+def clean_up():
+    """
+    Kills every process but the runner (the task's leftovers) and empties /tmp.
+    Processes are only swept when the runner is PID 1, i.e. alone in the container's PID namespace.
+    """
+    me = os.getpid()
+    for _ in range(10 if me == 1 else 0): # Repeat: a process may fork while we kill its siblings
+        others = [int(p) for p in os.listdir("/proc") if p.isdigit() and int(p) != me]
+        if not others:
+            break
+        for pid in others:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        # We are PID 1 in the container: orphans are ours to reap
+        time.sleep(POLL_SECONDS)
+        try:
+            while os.waitpid(-1, os.WNOHANG)[0]:
+                pass
+        except ChildProcessError:
+            pass
+    if os.path.lexists(TASK_FILE):
+        os.remove(TASK_FILE) # Written by the task, not the worker
+    for name in os.listdir(TMPDIR):
+        path = os.path.join(TMPDIR, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def main():
+    prewarm()
+    while True:
+        if not os.path.exists(TASK_FILE) or os.path.islink(TASK_FILE):
+            time.sleep(POLL_SECONDS)
+            continue
+
+        with open(TASK_FILE) as f:
+            task = json.load(f)
+        os.remove(TASK_FILE)
+
+        pid = os.fork()
+        if pid == 0:
+            run_child(task["entry_point"], task.get("cpu_seconds", 0), task.get("fsize", 0))
+
+        _, status, usage = os.wait4(pid, 0)
+        exit_code = os.waitstatus_to_exitcode(status)
+        clean_up() # Before reporting: nothing may still write to /app once the worker moves outputs
+
+        print(DONE_PREFIX + json.dumps({
+            "nonce": task.get("nonce"),
+            "exit_code": exit_code,
+            "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3),
+            "peak_memory_bytes": usage.ru_maxrss * 1024, # ru_maxrss is in KB on Linux
+        }), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Model-update encoder. Runs inside the sandbox, where torch is installed.
+
+When a job ships reference weights and an update encoding (see backend
+app/updates.py), the worker copies this file into the workspace and runs it
+as the entry point. It runs the job's train.py. Then, instead of uploading the
+full model.pth, it writes model.update.pth, which holds the difference from
+reference_model.pth:
+    delta -> fp32 delta (lossless)
+    fp16  -> delta in half precision
+    int8  -> delta quantized to int8 with one scale per tensor
+    topk  -> only the largest |delta| entries (topk_ratio of each tensor), fp16 values
+
+Config comes from .gridx_update.json in the workspace:
+    {"entry_point": "train.py", "encoding": "int8", "topk_ratio": 0.01}
+If encoding fails, model.pth is still there and the worker uploads it as-is.
+"""
+import json
+import os
+import runpy
+import sys
+
+UPDATE_CONFIG = ".gridx_update.json"
+REFERENCE_FILE = "reference_model.pth"
+MODEL_FILE = "model.pth"
+UPDATE_FILE = "model.update.pth"
+UPDATE_FORMAT_VERSION = 1
+ENCODINGS = ("full", "delta", "fp16", "int8", "topk")
+
+
+def encode_tensor(value, reference, encoding: str, topk_ratio: float) -> dict:
+    import torch
+
+    if encoding == "full" or reference is None or not value.is_floating_point() or value.shape != reference.shape:
+        # Integer buffers (e.g. BatchNorm's num_batches_tracked) and new tensors go as-is,
+        # and "full" never looks at the reference
+        return {"kind": "full", "tensor": value}
+
+    delta = value.float() - reference.float()
+    if encoding == "delta":
+        return {"kind": "delta", "tensor": delta}
+    if encoding == "fp16":
+        return {"kind": "delta", "tensor": delta.half()}
+    if encoding == "int8":
+        scale = delta.abs().max().item() / 127 or 1.0
+        quantized = (delta / scale).round().clamp(-127, 127).to(torch.int8)
+        return {"kind": "int8", "tensor": quantized, "scale": scale}
+    if encoding == "topk":
+        flat = delta.flatten()
+        k = max(1, int(flat.numel() * topk_ratio))
+        indices = flat.abs().topk(k).indices
+        index_dtype = torch.int32 if flat.numel() < 2 ** 31 else torch.int64
+        return {"kind": "topk", "indices": indices.to(index_dtype), "values": flat[indices].half(),
+                "shape": list(delta.shape)}
+    raise ValueError(f"Unknown update encoding: {encoding}")
+
+
+def encode_update(state: dict, reference: dict, encoding: str, topk_ratio: float = 0.01) -> dict:
+    """Turns a trained state_dict into an update payload relative to `reference`."""
+    return {
+        "__gridx_update__": UPDATE_FORMAT_VERSION,
+        "encoding": encoding,
+        "tensors": {
+            name: encode_tensor(value, reference.get(name), encoding, topk_ratio)
+            for name, value in state.items()
+        },
+    }
+
+
+def encode_files(model_path: str, reference_path: str, update_path: str, encoding: str, topk_ratio: float):
+    import torch
+
+    state = torch.load(model_path, map_location="cpu")
+    reference = torch.load(reference_path, map_location="cpu")
+    torch.save(encode_update(state, reference, encoding, topk_ratio), update_path)
+
+
+def main():
+    with open(UPDATE_CONFIG) as f:
+        config = json.load(f)
+
+    # 1. Train, exactly as if train.py were the entry point
+    entry_point = config.get("entry_point", "train.py")
+    sys.argv = [entry_point]
+    try:
+        runpy.run_path(entry_point, run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise
+
+    # 2. Encode the result against the job's reference weights
+    if os.path.exists(MODEL_FILE) and os.path.exists(REFERENCE_FILE):
+        try:
+            encode_files(MODEL_FILE, REFERENCE_FILE, UPDATE_FILE, config["encoding"], config.get("topk_ratio", 0.01))
+            print(f"🧮 Encoded update ({config['encoding']}): {os.path.getsize(MODEL_FILE)} -> "
+                  f"{os.path.getsize(UPDATE_FILE)} bytes")
+        except Exception as e:
+            print(f"⚠️ Update encoding failed, sending full model: {e}")
+            if os.path.exists(UPDATE_FILE):
+                os.remove(UPDATE_FILE)
+
+
+if __name__ == "__main__":
+    main()
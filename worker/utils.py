@@ -1,11 +1,21 @@
+import logging
 import requests
 import tempfile
 import os
 import shutil
+import hashlib
+import random
+import re
+import threading
+import requests.adapters
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, unquote
 
-def create_temp_workspace() -> str:
+log = logging.getLogger(__name__)
+
+def create_temp_workspace(prefix: str = "sandbox_") -> str:
     """Creates a temporary directory for a specific execution job."""
-    temp_dir = tempfile.mkdtemp(prefix="sandbox_")
+    temp_dir = tempfile.mkdtemp(prefix=prefix)
     return temp_dir
 
 def clean_workspace(path: str):
@@ -15,24 +25,267 @@ def clean_workspace(path: str):
 
 import time
 
-def download_file(url: str, save_path: str):
-    """Downloads a file from a URL to a local path with RETRY logic."""
+# Backend stores job files under their content hash: .../cas/{sha256}
+SHA256_IN_URL = re.compile(r"/cas/([0-9a-f]{64})(?:$|\?)")
+
+def sha256_from_url(url: str):
+    """Returns the content hash embedded in an artifact URL, or None."""
+    match = SHA256_IN_URL.search(url or "")
+    return match.group(1) if match else None
+
+# DOWNLOADS
+# One pooled session for every download/upload (keeps connections alive across
+# tasks and slots), big read buffers, HTTP Range to resume a broken transfer,
+# and parallel ranged parts for large files.
+DOWNLOAD_CHUNK = 1024 * 1024                                                    # 1 MB reads
+PARALLEL_DOWNLOAD_THRESHOLD = int(os.getenv("PARALLEL_DOWNLOAD_THRESHOLD", str(64 * 1024 * 1024)))
+DOWNLOAD_PARTS = int(os.getenv("DOWNLOAD_PARTS", "4"))
+
+session = requests.Session()
+session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=32))
+session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=32))
+
+def probe_size(url: str):
+    """
+    Asks for the first byte to learn the total size and whether Range works.
+    Returns the size in bytes, or None if the server doesn't do ranges.
+    """
+    try:
+        response = session.get(url, headers={"Range": "bytes=0-0"}, timeout=30)
+        content_range = response.headers.get("Content-Range", "")
+        response.close()
+        if response.status_code == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            return int(total) if total.isdigit() else None
+    except Exception:
+        pass
+    return None
+
+def _advance(progress: dict, lock: threading.Lock, n: int):
+    """Counts n more bytes and logs every 25% of a file whose size we know."""
+    with lock:
+        progress["bytes"] += n
+        total = progress["total"]
+        if total and progress["bytes"] >= progress["next_mark"] * total and progress["next_mark"] <= 1:
+            elapsed = max(time.time() - progress["start"], 1e-6)
+            log.info(f"⏳ {progress['name']}: {progress['next_mark']:.0%} "
+                  f"({progress['bytes'] / 1024 ** 2 / elapsed:.1f} MB/s)")
+            progress["next_mark"] += 0.25
+
+def _fetch_range(url: str, path: str, start: int, end: int, progress: dict, lock: threading.Lock):
+    """Downloads bytes [start, end] into path at offset start, resuming after failures."""
+    offset = start
     MAX_RETRIES = 3
     for attempt in range(MAX_RETRIES):
         try:
-            # Added timeout=30 seconds
-            response = requests.get(url, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
+            headers = {"Range": f"bytes={offset}-{end}"}
+            with session.get(url, headers=headers, stream=True, timeout=30) as response:
+                if response.status_code != 206:
+                    raise ValueError(f"Expected 206 for range, got {response.status_code}")
+                with open(path, "r+b") as f:
+                    f.seek(offset)
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK):
                         f.write(chunk)
-            return True
-            
+                        offset += len(chunk)
+                        _advance(progress, lock, len(chunk))
+            if offset > end:
+                return
+            raise ValueError("Connection closed early")
         except Exception as e:
-            print(f"⚠️ Download attempt {attempt+1}/{MAX_RETRIES} failed: {e}")
+            log.warning(f"⚠️ Part {start}-{end} attempt {attempt+1}/{MAX_RETRIES} failed at byte {offset}: {e}")
             if attempt == MAX_RETRIES - 1:
-                print(f"❌ Final Download Error: {e}")
-                return False
+                raise
+            time.sleep(2) # Wait before retry (then resume from `offset`)
+
+def _download_parallel(url: str, path: str, size: int, progress: dict, lock: threading.Lock):
+    """Splits the file into DOWNLOAD_PARTS ranges fetched concurrently."""
+    with open(path, "wb") as f:
+        f.truncate(size)
+    part_size = -(-size // DOWNLOAD_PARTS)
+    ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [pool.submit(_fetch_range, url, path, start, end, progress, lock) for start, end in ranges]
+        for future in futures:
+            future.result()
+
+def _download_resumable(url: str, path: str, progress: dict, lock: threading.Lock):
+    """Single stream; on failure resumes from the bytes already on disk via Range."""
+    MAX_RETRIES = 3
+    for attempt in range(MAX_RETRIES):
+        try:
+            have = os.path.getsize(path) if os.path.exists(path) else 0
+            headers = {"Range": f"bytes={have}-"} if have else {}
+            with session.get(url, headers=headers, stream=True, timeout=30) as response:
+                if response.status_code == 416:
+                    return # We already have everything
+                response.raise_for_status()
+                # 200 means the server ignored Range: start over
+                mode = "ab" if response.status_code == 206 else "wb"
+                with open(path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                        f.write(chunk)
+                        _advance(progress, lock, len(chunk))
+            return
+        except Exception as e:
+            log.warning(f"⚠️ Download attempt {attempt+1}/{MAX_RETRIES} failed: {e}")
+            if attempt == MAX_RETRIES - 1:
+                raise
             time.sleep(2) # Wait before retry
+
+def download_file(url: str, save_path: str):
+    """
+    Downloads a file from a URL to a local path with RETRY logic.
+    Resumes with HTTP Range after a failure, fetches large files in parallel
+    parts, and logs size and throughput. Returns False if it could not be fetched.
+    """
+    # Local storage backend with a shared filesystem hands out file:// URLs
+    if url.startswith("file://"):
+        try:
+            shutil.copyfile(unquote(urlparse(url).path), save_path)
+            expected = sha256_from_url(url)
+            if expected and file_sha256(save_path) != expected:
+                raise ValueError(f"Checksum mismatch for {url}")
+            return True
+        except Exception as e:
+            log.error(f"❌ Local Copy Error: {e}")
+            return False
+
+    part_path = save_path + ".part"
+    lock = threading.Lock()
+    start = time.time()
+    try:
+        size = probe_size(url)
+        progress = {"name": os.path.basename(save_path), "bytes": 0, "total": size,
+                    "next_mark": 0.25, "start": start}
+        if size is not None and size >= PARALLEL_DOWNLOAD_THRESHOLD and DOWNLOAD_PARTS > 1:
+            _download_parallel(url, part_path, size, progress, lock)
+        else:
+            _download_resumable(url, part_path, progress, lock)
+
+        # Content-addressed URLs let us verify what we got
+        expected = sha256_from_url(url)
+        if expected and file_sha256(part_path) != expected:
+            raise ValueError(f"Checksum mismatch for {url}")
+        os.replace(part_path, save_path)
+
+        elapsed = max(time.time() - start, 1e-6)
+        total = os.path.getsize(save_path)
+        log.info(f"⬇️ {progress['name']}: {total / 1024 ** 2:.1f} MB in {elapsed:.1f}s "
+              f"({progress['bytes'] / 1024 ** 2 / elapsed:.1f} MB/s)")
+        return True
+
+    except Exception as e:
+        log.error(f"❌ Final Download Error: {e}")
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        return False
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with jitter: ~1s, 2s, 4s, ... capped at `cap`."""
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "5"))
+UPLOAD_TIMEOUT = (10, 300) # (connect, read) seconds
+
+def upload_to_presigned_url(url: str, file_path: str, content_type: str = "application/octet-stream"):
+    """
+    PUTs a file straight to storage using a presigned URL, streaming it from disk.
+    Retries with exponential backoff. Returns (size, sha256) so the backend can
+    record what was uploaded.
+    """
+    size = os.path.getsize(file_path)
+    sha256 = file_sha256(file_path)
+
+    for attempt in range(UPLOAD_RETRIES):
+        try:
+            with open(file_path, 'rb') as f:
+                response = session.put(
+                    url,
+                    data=f,
+                    headers={"Content-Type": content_type, "Content-Length": str(size)},
+                    timeout=UPLOAD_TIMEOUT
+                )
+            response.raise_for_status()
+            return size, sha256
+
+        except Exception as e:
+            log.warning(f"⚠️ Upload attempt {attempt+1}/{UPLOAD_RETRIES} failed: {e}")
+            if attempt == UPLOAD_RETRIES - 1:
+                raise
+            time.sleep(backoff_delay(attempt))
+
+
+# RESULT COMPRESSION
+# model.pth is zstd-compressed before upload. The backend recognizes the zstd
+# frame magic and decompresses transparently (backend/app/aggregation.py).
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def compress_file(src_path: str, dst_path: str, level: int = 3) -> bool:
+    """
+    Streams src_path through zstd into dst_path without loading it into memory.
+    Returns False (and writes nothing) when zstandard isn't installed.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        return False
+
+    compressor = zstandard.ZstdCompressor(level=level, threads=-1)
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        # Passing the size records it in the frame header
+        compressor.copy_stream(src, dst, size=os.path.getsize(src_path))
+    return True
+
+
+# Columnar chunk formats the backend may send (see backend/app/chunk_formats.py)
+CHUNK_FILENAMES = {"csv": "data.csv", "parquet": "data.parquet", "arrow": "data.arrow"}
+
+def materialize_csv(chunk_path: str, chunk_format: str, csv_path: str):
+    """
+    Writes data.csv from a parquet / Arrow IPC chunk so train.py scripts that
+    expect CSV keep working. The columnar file stays in the workspace for
+    scripts that can load it directly (Arrow files can be memory-mapped).
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    if chunk_format == "parquet":
+        import pyarrow.parquet as pq
+        table = pq.read_table(chunk_path)
+    else:
+        with pa.memory_map(chunk_path) as source:
+            table = pa.ipc.open_file(source).read_all()
+    pa_csv.write_csv(table, csv_path)
+
+
+# Docker-style memory sizes: "512m", "2g", "1024k", "1073741824"
+MEMORY_UNITS = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+def parse_memory(value: str) -> int:
+    """Converts a Docker memory string to bytes."""
+    value = str(value).strip().lower()
+    if value and value[-1] in MEMORY_UNITS:
+        return int(float(value[:-1]) * MEMORY_UNITS[value[-1]])
+    return int(value)
+
+def detect_host_resources():
+    """Returns (usable CPU cores, total memory in bytes) of this machine."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    try:
+        memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        memory = 0 # Unknown (e.g. Windows): don't limit slots by memory
+    return cores, memory